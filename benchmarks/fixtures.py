@@ -0,0 +1,210 @@
+"""Fixtures served by the stand-in server of the benchmarks.
+
+By default, the object pages, search pages and spectra are synthesised
+with the same markup as the Wiserep pages. Pages and spectra recorded
+from Wiserep with ``record_fixtures`` are served instead when available.
+"""
+import os
+import json
+
+import numpy as np
+
+spectra_path = "/sites/default/files/spectra/bench"
+
+object_template = """<!DOCTYPE html>
+<html lang="en">
+<head><title>SN {name} | WISeREP</title></head>
+<body>
+<div class="field"><span class="name">Type</span><div class="value"><b>{sn_type}</b></div></div>
+<div class="field"><span class="name">Redshift</span><div class="value"><b>{redshift:.6f}</b></div></div>
+<div class="field"><span class="name">Host Name</span><div class="value"><b>NGC{host}</b></div></div>
+<div class="field"><span class="name">RA/DEC (J2000)</span><b><div class="value">{coords}</div></b><div class="alter-value">{coords_deg}</div></div>
+<table class="specs-table">
+<thead><tr><th>Select</th><th>Spec. ID</th><th>Obs-date</th><th>Telescope</th><th>Instrument</th><th>Group</th><th>Reducer</th><th>Spectrum ascii File</th><th>Spectrum fits File</th></tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+<table class="tns-reports">
+ <thead><tr><th>Report</th><th>Type</th></tr></thead>
+<tbody>
+<tr><td>AT{name}</td><td class="cell-objtype_name">{sn_type}</td></tr>
+</tbody>
+</table>
+</body>
+</html>
+"""
+
+spectrum_row = (
+    '<tr><td><input type="checkbox"></td><td>{spec_id}</td><td>2020-01-{day:02d} 03:21:36</td>'
+    "<td>ESO-NTT</td><td>EFOSC2</td><td>ePESSTO</td><td>Bench</td>"
+    '<td><a href="/spectra/view?asciifile=https%3A//www.wiserep.org{path}/{basename}.dat">'
+    "{basename}.dat</a></td>"
+    '<td><a href="https://www.wiserep.org{path}/{basename}.fits">{basename}.fits</a></td></tr>'
+)
+
+search_row = (
+    '<tr><td><a href="/object/{obj_id}" title="Click to Object page">'
+    'SN {name}</a></td><td><a href="/object/{obj_id}">Spectra</a></td></tr>'
+)
+
+
+def target_names(n_targets):
+    """Names of the synthetic targets."""
+    return [f"2099b{i:05d}" for i in range(n_targets)]
+
+
+def _sexagesimal(ra, dec):
+    """Coordinates in degrees to sexagesimal format."""
+    ra_h = ra / 15
+    sign = "-" if dec < 0 else "+"
+    dec = abs(dec)
+    return (
+        f"{int(ra_h):02d}:{int(ra_h * 60 % 60):02d}:{ra_h * 3600 % 60:06.3f} "
+        f"{sign}{int(dec):02d}:{int(dec * 60 % 60):02d}:{dec * 3600 % 60:05.2f}"
+    )
+
+
+def fits_file(wave, flux):
+    """Minimal FITS file with a 1D spectrum (linear wavelength solution)."""
+    cards = [
+        "SIMPLE  =                    T",
+        "BITPIX  =                  -32",
+        "NAXIS   =                    1",
+        f"NAXIS1  = {len(flux):20d}",
+        f"CRVAL1  = {wave[0]:20.4f}",
+        f"CDELT1  = {wave[1] - wave[0]:20.4f}",
+        "CRPIX1  =                  1.0",
+        "END",
+    ]
+    header = "".join(card.ljust(80) for card in cards).encode("ascii")
+    header += b" " * (-len(header) % 2880)
+    data = np.asarray(flux, dtype=">f4").tobytes()
+    data += b"\0" * (-len(data) % 2880)
+    return header + data
+
+
+class FixtureSet:
+    """Pages and spectra of a set of targets.
+
+    Parameters
+    ----------
+    n_targets: int
+        Number of targets.
+    n_spectra: int, default ``1``
+        Number of spectra (ASCII and FITS) of each target.
+    n_points: int, default ``2000``
+        Number of points of each spectrum.
+    page_size: int, default ``50``
+        Number of targets of each search page.
+    recorded_dir: str, optional
+        Directory with fixtures saved by ``record_fixtures``. Its targets
+        are served instead of the first synthetic ones.
+    """
+
+    def __init__(self, n_targets, n_spectra=1, n_points=2000, page_size=50, recorded_dir=None):
+        self.n_spectra = n_spectra
+        self.page_size = page_size
+        self.recorded = {}
+        self.recorded_dir = recorded_dir
+        if recorded_dir is not None:
+            with open(os.path.join(recorded_dir, "targets.json")) as fp:
+                self.recorded = json.load(fp)
+
+        names = list(self.recorded.keys())[:n_targets]
+        names += target_names(n_targets - len(names))
+        self.names = names
+        self.ids = {name: 100000 + i for i, name in enumerate(names)}
+        self.names_by_id = {obj_id: name for name, obj_id in self.ids.items()}
+
+        rng = np.random.default_rng(42)
+        wave = np.linspace(3500, 9500, n_points)
+        flux = 1e-15 * (1 + 0.1 * rng.standard_normal(n_points))
+        flux_err = 0.05 * np.abs(flux)
+        lines = [f"{w:.4f} {f:.6e} {e:.6e}" for w, f, e in zip(wave, flux, flux_err)]
+        self.ascii_spectrum = ("\n".join(lines) + "\n").encode()
+        self.fits_spectrum = fits_file(wave, flux)
+
+    def object_page(self, name):
+        """HTML of a target's page."""
+        if name in self.recorded:
+            with open(os.path.join(self.recorded_dir, "objects", f"{name}.html"), "rb") as fp:
+                return fp.read()
+
+        i = self.ids[name]
+        ra, dec = (i * 7.919) % 360, ((i * 3.141) % 170) - 85
+        rows = "\n".join(
+            spectrum_row.format(
+                spec_id=i * 100 + j,
+                day=j % 28 + 1,
+                path=spectra_path,
+                basename=f"{name}_{j}",
+            )
+            for j in range(self.n_spectra)
+        )
+        html = object_template.format(
+            name=name,
+            sn_type=["SN Ia", "SN II", "SN Ib", "SN Ic"][i % 4],
+            redshift=0.001 + (i % 1000) / 10000,
+            host=i % 8000,
+            coords=_sexagesimal(ra, dec),
+            coords_deg=f"{ra:.5f} {dec:+.5f}",
+            rows=rows,
+        )
+        return html.encode()
+
+    def search_page(self, page):
+        """HTML of a search page (an empty table after the last page)."""
+        names = self.names[page * self.page_size : (page + 1) * self.page_size]
+        rows = "\n".join(
+            search_row.format(name=name, obj_id=self.ids[name]) for name in names
+        )
+        # long enough not to be parsed as a target name
+        html = f"<html><body><h1>Search results</h1>\n<table>\n{rows}\n</table></body></html>"
+        return html.encode()
+
+    def spectrum_file(self, basename):
+        """Content of a spectrum file, or None if not found."""
+        if self.recorded_dir is not None:
+            recorded_file = os.path.join(self.recorded_dir, "spectra", basename)
+            if os.path.isfile(recorded_file):
+                with open(recorded_file, "rb") as fp:
+                    return fp.read()
+        if basename.endswith(".fits"):
+            return self.fits_spectrum
+        return self.ascii_spectrum
+
+
+def record_fixtures(iau_names, recorded_dir):
+    """Saves the object pages and spectra of some targets from Wiserep,
+    so they can be replayed by the stand-in server.
+
+    Parameters
+    ----------
+    iau_names: list
+        IAU names of the targets, e.g. ``['2004eo', 'ASASSN-14jg']``.
+    recorded_dir: str
+        Output directory.
+    """
+    from wiserep_api.api import get_target_response, download_file
+    from wiserep_api.parsing import parse_target_page
+
+    os.makedirs(os.path.join(recorded_dir, "objects"), exist_ok=True)
+    os.makedirs(os.path.join(recorded_dir, "spectra"), exist_ok=True)
+
+    targets = {}
+    for name in iau_names:
+        response = get_target_response(name)
+        if response is None:
+            print(f"Could not load the webpage of {name}")
+            continue
+        with open(os.path.join(recorded_dir, "objects", f"{name}.html"), "w") as fp:
+            fp.write(response.text)
+        record = parse_target_page(response.text)
+        for url in record.ascii_urls + record.fits_urls:
+            outfile = os.path.join(recorded_dir, "spectra", os.path.basename(url))
+            download_file("https://" + url, outfile)
+        targets[name] = response.url
+
+    with open(os.path.join(recorded_dir, "targets.json"), "w") as fp:
+        json.dump(targets, fp, indent=2)
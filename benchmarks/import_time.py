@@ -0,0 +1,97 @@
+"""Import-time benchmark of wiserep_api.
+
+Each statement runs several times in a fresh interpreter, which reports
+the time it took and the heavy dependencies that were loaded. The
+median times are compared with a budget, so the script can be used as
+a check that a cheap lookup does not pull in pandas, numpy or astropy::
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 20 --budget 0.15 --output import.json
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# statements timed in a fresh interpreter, and whether they may load
+# the heavy dependencies
+statements = {
+    "import wiserep_api": False,
+    "from wiserep_api import get_target_property": False,
+    "from wiserep_api import download_target_spectra": True,
+}
+heavy_modules = ["pandas", "numpy", "astropy"]
+
+child_code = """
+import sys, json, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "loaded": loaded}}))
+"""
+
+
+def time_statement(statement, repeat=10):
+    """Times a statement in ``repeat`` fresh interpreters.
+
+    Returns
+    -------
+    elapsed: list
+        Times in seconds.
+    loaded: list
+        Heavy dependencies loaded by the statement.
+    """
+    code = child_code.format(statement=statement, heavy_modules=heavy_modules)
+    elapsed, loaded = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        elapsed.append(result["elapsed"])
+        loaded = result["loaded"]
+    return elapsed, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark of wiserep_api.")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="number of fresh interpreters per statement")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="maximum median time (seconds) of the light statements")
+    parser.add_argument("--output", default=None, help="save the results in JSON format")
+    args = parser.parse_args(argv)
+
+    print(f"{'statement':<50}{'median (ms)':>12}{'min (ms)':>10}  loaded")
+    results = []
+    failed = False
+    for statement, heavy in statements.items():
+        elapsed, loaded = time_statement(statement, args.repeat)
+        median = statistics.median(elapsed)
+        results.append(
+            {"statement": statement, "median": median, "min": min(elapsed), "loaded": loaded}
+        )
+        print(f"{statement:<50}{median * 1000:>12.1f}{min(elapsed) * 1000:>10.1f}  "
+              f"{', '.join(loaded) or '-'}")
+
+        if heavy is False:
+            if len(loaded) > 0:
+                print(f"  -> should not load {', '.join(loaded)}", file=sys.stderr)
+                failed = True
+            if args.budget is not None and median > args.budget:
+                print(f"  -> over the budget of {args.budget * 1000:.0f} ms", file=sys.stderr)
+                failed = True
+
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+        print(f"Results saved in {args.output}")
+
+    if failed is True:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Offline benchmarks of wiserep_api.
+
+The package is run against a local stand-in of Wiserep (see ``server.py``)
+that replays synthetic or recorded pages and spectra (see ``fixtures.py``),
+so the results do not depend on the network and can be reproduced.
+
+Each benchmark and number of targets runs in a separate process, which
+reports the throughput (targets per second), the p50/p99 latency and the
+peak resident memory. The results are saved in JSON format and can be
+compared with those of a previous run::
+
+    python benchmarks/run_benchmarks.py --scales 1,100,10000 --output new.json
+    python benchmarks/run_benchmarks.py --latency 0.05 --compare new.json
+
+Benchmarks:
+
+- ``parse``: parsing of object pages (no requests).
+- ``properties``: ``get_targets_properties`` (latency per request).
+- ``search``: ``download_sn_list`` (latency per search page).
+- ``spectra``: ``download_many_target_spectra`` (latency per target).
+- ``snid_prep``: ``create_snid_inputs`` on downloaded spectra (latency per
+  target). The download is not timed, but the peak memory includes it.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+from fixtures import FixtureSet, record_fixtures
+from server import StandInServer
+
+benchmark_names = ["parse", "properties", "search", "spectra", "snid_prep"]
+
+
+def _request_latencies(category):
+    """Collects the latencies of the requests of a category."""
+    from wiserep_api.metrics import add_callback
+
+    latencies = []
+
+    def callback(event):
+        if event["kind"] == "request" and event["category"] == category:
+            latencies.append(event["elapsed"])
+
+    add_callback(callback)
+    return latencies
+
+
+def bench_parse(names, fixtures, workdir, workers):
+    from wiserep_api.parsing import parse_target_page
+    from wiserep_api.properties import get_class_from_record
+    from wiserep_api.coords import parse_coords_deg
+
+    pages = [fixtures.object_page(name).decode() for name in names]
+    latencies = []
+    errors = 0
+    for html in pages:
+        start = time.perf_counter()
+        record = parse_target_page(html)
+        if get_class_from_record(record) is None:
+            errors += 1
+        parse_coords_deg(record.coords_deg)
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def bench_properties(names, fixtures, workdir, workers):
+    from wiserep_api.properties import get_targets_properties
+
+    latencies = _request_latencies("object")
+    properties_df = get_targets_properties(names, workers=workers)
+    errors = int((properties_df.status != "ok").sum())
+    return latencies, errors
+
+
+def bench_search(names, fixtures, workdir, workers):
+    from wiserep_api.search import download_sn_list
+
+    latencies = _request_latencies("search")
+    os.chdir(workdir)
+    sne_list = download_sn_list("SN Ia", workers=workers, resume=False)
+    errors = len(names) - len(sne_list or [])
+    return latencies, errors
+
+
+def bench_spectra(names, fixtures, workdir, workers):
+    from wiserep_api.spectra import download_many_target_spectra
+
+    spectra_dir = os.path.join(workdir, "spectra")
+    results_df = download_many_target_spectra(names, workers=workers, spectra_dir=spectra_dir)
+    errors = int((results_df.status != "ok").sum())
+    return list(results_df.elapsed), errors
+
+
+def setup_snid_prep(names, fixtures, workdir, workers):
+    from wiserep_api.spectra import download_many_target_spectra
+
+    spectra_dir = os.path.join(workdir, "spectra")
+    download_many_target_spectra(names, workers=workers, spectra_dir=spectra_dir, file_type="ascii")
+
+
+def bench_snid_prep(names, fixtures, workdir, workers):
+    from wiserep_api.snid import create_snid_inputs
+
+    spectra_dir = os.path.join(workdir, "spectra")
+    latencies = []
+    errors = 0
+    for name in names:
+        start = time.perf_counter()
+        try:
+            create_snid_inputs(os.path.join(spectra_dir, name))
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_child(args):
+    """Runs a single benchmark and saves its result."""
+    from wiserep_api.api import set_client
+    from wiserep_api.index import set_name_index
+
+    fixtures = FixtureSet(
+        args.scale, args.n_spectra, args.n_points, recorded_dir=args.recorded_dir
+    )
+    set_client(base_url=args.base_url, pool_maxsize=args.workers, retries=2)
+    set_name_index()
+    bench_func = globals()[f"bench_{args.child}"]
+    # untimed preparation (if any)
+    setup_func = globals().get(f"setup_{args.child}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        try:
+            if setup_func is not None:
+                setup_func(fixtures.names, fixtures, workdir, args.workers)
+            start = time.perf_counter()
+            latencies, errors = bench_func(fixtures.names, fixtures, workdir, args.workers)
+            wall_time = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    # kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / 1024**2 if sys.platform == "darwin" else peak_rss / 1024
+
+    result = {
+        "benchmark": args.child,
+        "n_targets": args.scale,
+        "wall_time": wall_time,
+        "throughput": args.scale / wall_time,
+        "p50": float(np.percentile(latencies, 50)) if len(latencies) > 0 else None,
+        "p99": float(np.percentile(latencies, 99)) if len(latencies) > 0 else None,
+        "n_latencies": len(latencies),
+        "peak_rss_mb": peak_rss_mb,
+        "errors": errors,
+    }
+    with open(args.result_file, "w") as fp:
+        json.dump(result, fp)
+
+
+def run_benchmark(benchmark, scale, base_url, args):
+    """Runs a benchmark in a new process and returns its result."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fp:
+        result_file = fp.name
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--child", benchmark,
+        "--scale", str(scale),
+        "--base-url", base_url,
+        "--workers", str(args.workers),
+        "--n-spectra", str(args.n_spectra),
+        "--n-points", str(args.n_points),
+        "--result-file", result_file,
+    ]
+    if args.recorded_dir is not None:
+        command += ["--recorded-dir", args.recorded_dir]
+    try:
+        # the package prints its progress
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            print(process.stderr, file=sys.stderr)
+            return None
+        with open(result_file) as fp:
+            return json.load(fp)
+    finally:
+        os.remove(result_file)
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value * 1000:.2f}"
+
+
+def compare_results(results, previous_file):
+    """Prints the change of throughput and latency from a previous run."""
+    with open(previous_file) as fp:
+        previous = {
+            (result["benchmark"], result["n_targets"]): result
+            for result in json.load(fp)["results"]
+        }
+    print(f"\nComparison with {previous_file}:")
+    print(f"{'benchmark':<12}{'targets':>9}{'throughput':>13}{'p50':>10}{'p99':>10}")
+    for result in results:
+        old = previous.get((result["benchmark"], result["n_targets"]))
+        if old is None:
+            continue
+        ratios = [result["throughput"] / old["throughput"]]
+        for key in ["p50", "p99"]:
+            if result[key] and old[key]:
+                ratios.append(result[key] / old[key])
+            else:
+                ratios.append(float("nan"))
+        print(
+            f"{result['benchmark']:<12}{result['n_targets']:>9}"
+            f"{ratios[0]:>12.2f}x{ratios[1]:>9.2f}x{ratios[2]:>9.2f}x"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of wiserep_api.")
+    parser.add_argument("--benchmarks", default=",".join(benchmark_names),
+                        help="comma-separated benchmarks to run")
+    parser.add_argument("--scales", default="1,100,10000",
+                        help="comma-separated numbers of targets")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="latency of the server per response (seconds)")
+    parser.add_argument("--bandwidth", type=float, default=None,
+                        help="bandwidth of the server per response (bytes/second)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--n-spectra", type=int, default=1,
+                        help="number of spectra per target")
+    parser.add_argument("--n-points", type=int, default=2000,
+                        help="number of points per spectrum")
+    parser.add_argument("--recorded-dir", default=None,
+                        help="directory with recorded fixtures (see --record)")
+    parser.add_argument("--record", nargs="+", default=None, metavar="NAME",
+                        help="record the pages and spectra of these targets from "
+                        "Wiserep into --recorded-dir and exit")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None,
+                        help="results of a previous run to compare with")
+    # internal options of the benchmark processes
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        run_child(args)
+        return
+
+    if args.record is not None:
+        if args.recorded_dir is None:
+            parser.error("--record requires --recorded-dir")
+        record_fixtures(args.record, args.recorded_dir)
+        return
+
+    benchmarks = args.benchmarks.split(",")
+    scales = [int(scale) for scale in args.scales.split(",")]
+    for benchmark in benchmarks:
+        if benchmark not in benchmark_names:
+            parser.error(f"unknown benchmark: {benchmark}")
+
+    print(f"{'benchmark':<12}{'targets':>9}{'targets/s':>12}{'p50 (ms)':>11}"
+          f"{'p99 (ms)':>11}{'RSS (MB)':>10}{'errors':>8}")
+    results = []
+    for scale in scales:
+        fixtures = FixtureSet(
+            scale, args.n_spectra, args.n_points, recorded_dir=args.recorded_dir
+        )
+        with StandInServer(fixtures, args.latency, args.bandwidth) as server:
+            for benchmark in benchmarks:
+                result = run_benchmark(benchmark, scale, server.base_url, args)
+                if result is None:
+                    print(f"{benchmark:<12}{scale:>9}  failed")
+                    continue
+                results.append(result)
+                print(
+                    f"{benchmark:<12}{scale:>9}{result['throughput']:>12.1f}"
+                    f"{_format_ms(result['p50']):>11}{_format_ms(result['p99']):>11}"
+                    f"{result['peak_rss_mb']:>10.1f}{result['errors']:>8}"
+                )
+
+    import wiserep_api
+
+    output = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "wiserep_api": wiserep_api.__version__,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "settings": {
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+            "workers": args.workers,
+            "n_spectra": args.n_spectra,
+            "n_points": args.n_points,
+            "recorded_dir": args.recorded_dir,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as fp:
+        json.dump(output, fp, indent=2)
+    print(f"Results saved in {args.output}")
+
+    if args.compare is not None:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Local stand-in for Wiserep used by the benchmarks.
+
+It answers the same URLs used by the package (search pages, object
+pages and spectra files) from a ``FixtureSet``, with a configurable
+latency and bandwidth per response.
+"""
+import os
+import time
+import threading
+import http.server
+from urllib.parse import urlparse, parse_qs, unquote
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _route(self):
+        """Returns the status code, headers and body of a request."""
+        fixtures = self.server.fixtures
+        parsed_url = urlparse(self.path)
+        path = unquote(parsed_url.path)
+
+        if path.startswith("/search"):
+            page = int(parse_qs(parsed_url.query).get("page", ["0"])[0])
+            return 200, {}, fixtures.search_page(page)
+
+        if path.startswith("/iauname/"):
+            name = path[len("/iauname/"):]
+            if name in fixtures.ids:
+                return 302, {"Location": f"/object/{fixtures.ids[name]}"}, b""
+            return 404, {}, b""
+
+        if path.startswith("/object/"):
+            obj_id = path[len("/object/"):]
+            if obj_id.isdigit() and int(obj_id) in fixtures.names_by_id:
+                return 200, {}, fixtures.object_page(fixtures.names_by_id[int(obj_id)])
+            return 404, {}, b""
+
+        if "/spectra/" in path:
+            body = fixtures.spectrum_file(os.path.basename(path))
+            if body is not None:
+                return 200, {"ETag": f'"{len(body)}"'}, body
+
+        return 404, {}, b""
+
+    def _respond(self, send_body=True):
+        time.sleep(self.server.latency)
+        status, headers, body = self._route()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body is False:
+            return
+
+        bandwidth = self.server.bandwidth
+        chunk_size = 2**16
+        try:
+            for start in range(0, len(body), chunk_size):
+                chunk = body[start : start + chunk_size]
+                self.wfile.write(chunk)
+                if bandwidth is not None:
+                    time.sleep(len(chunk) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # many simultaneous connections with high worker counts
+    request_queue_size = 128
+
+
+class StandInServer:
+    """Local HTTP server that replays Wiserep fixtures.
+
+    Parameters
+    ----------
+    fixtures: FixtureSet
+        Pages and spectra to serve.
+    latency: float, default ``0``
+        Delay in seconds before each response.
+    bandwidth: float, optional
+        Bandwidth in bytes per second of each response. Unlimited
+        by default.
+    """
+
+    def __init__(self, fixtures, latency=0.0, bandwidth=None):
+        self.httpd = _ThreadingServer(("127.0.0.1", 0), StandInHandler)
+        self.httpd.fixtures = fixtures
+        self.httpd.latency = latency
+        self.httpd.bandwidth = bandwidth
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """URL of the server, to be used as ``WiserepClient(base_url=...)``."""
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -29,6 +29,8 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=requirements,
+    extras_require={"aio": ["httpx"]},
+    entry_points={"console_scripts": ["wiserep=wiserep_api.cli:main"]},
     package_data={"wiserep_api": ["static/*"]},
     include_package_data=True,
 )
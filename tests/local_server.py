@@ -0,0 +1,76 @@
+"""Local HTTP server for the tests that download from Wiserep.
+
+The request handlers of the tests subclass ``QuietHandler`` (or
+``FlakyHandler`` to check the retries) and are served by ``LocalServer``.
+"""
+import threading
+import http.server
+
+
+class QuietHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler that does not log the requests."""
+
+    def send_body(self, body, status=200, headers=None):
+        """Sends a complete response (HEAD requests get no body)."""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timeout tests)
+
+    def log_message(self, *args):
+        pass
+
+
+class FlakyHandler(QuietHandler):
+    """Request handler whose first ``max_failures`` requests (with a path
+    starting with ``flaky_prefix``) fail with a 503 error.
+
+    ``failures`` counts the failed requests, and must be reset by the tests.
+    """
+
+    failures = 0
+    max_failures = 1
+    flaky_prefix = "/"
+
+    def fail(self):
+        """Sends a 503 error if the request should fail.
+
+        Returns
+        -------
+        failed: bool
+            Whether the error was sent.
+        """
+        handler = type(self)
+        if self.path.startswith(self.flaky_prefix) and handler.failures < self.max_failures:
+            handler.failures += 1
+            self.send_body(b"", status=503, headers={"Retry-After": "0"})
+            return True
+        return False
+
+
+class LocalServer:
+    """HTTP server running in a background thread, on a free local port.
+
+    Parameters
+    ----------
+    handler: type
+        Request handler class, e.g. a ``QuietHandler`` subclass.
+    """
+
+    def __init__(self, handler):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.url = f"http://{self.host}"
+
+    def close(self):
+        """Stops the server."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,168 @@
+import os
+import time
+import gzip
+import asyncio
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+from tests.local_server import LocalServer, FlakyHandler
+
+try:
+    from wiserep_api import aio
+except ImportError:
+    aio = None
+
+content = b"SIMPLE  =                    T" + bytes(2850)
+ascii_content = b"# wave flux\n4000.0 1.5e-15\n4001.0 1.6e-15\n4002.0 1.7e-15\n"
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class Handler(FlakyHandler):
+    max_failures = 2
+    flaky_prefix = "/flaky"
+
+    def do_GET(self):
+        if self.fail() is True:
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(1)
+        if self.path.endswith(".txt"):
+            body = ascii_content
+        elif self.path.endswith(".html"):
+            with open(os.path.join(data_dir, "object_page.html"), "rb") as fp:
+                body = fp.read()
+        else:
+            body = content
+        headers = {"ETag": '"v1"'}
+        if self.path.startswith("/gzip"):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self.send_body(body, headers=headers)
+
+
+@unittest.skipIf(aio is None, "httpx is not installed")
+class TestAsyncAPI(unittest.TestCase):
+    def setUp(self):
+        Handler.failures = 0
+        self.server = LocalServer(Handler)
+        self.base_url = self.server.url
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def run_async(self, coroutine_func):
+        async def main():
+            aio.set_client(retries=3, backoff_factor=0)
+            try:
+                return await coroutine_func()
+            finally:
+                await aio.get_client().aclose()
+
+        return asyncio.run(main())
+
+    def test_download_file(self):
+        outfile = os.path.join(self.tmp_dir.name, "spectrum.fits")
+        file_info = self.run_async(
+            lambda: aio.download_file(self.base_url + "/flaky/spectrum.fits", outfile)
+        )
+        sha256 = hashlib.sha256(content).hexdigest()
+        assert file_info == {"size": len(content), "sha256": sha256, "etag": '"v1"'}
+        assert Handler.failures == 2, "The failed requests were not retried"
+
+    def test_download_gzip(self):
+        # the file is saved decoded, as with the synchronous API
+        outfile = os.path.join(self.tmp_dir.name, "spectrum.fits")
+        file_info = self.run_async(
+            lambda: aio.download_file(self.base_url + "/gzip/spectrum.fits", outfile)
+        )
+        assert file_info["size"] == len(content)
+        assert file_info["sha256"] == hashlib.sha256(content).hexdigest()
+        with open(outfile, "rb") as fp:
+            assert fp.read() == content
+
+    def test_client_per_loop(self):
+        async def get_client():
+            return aio.get_client()
+
+        old_client = asyncio.run(get_client())
+
+        async def new_loop():
+            client = aio.get_client()
+            await asyncio.sleep(0)  # the previous client is closed in the background
+            return client
+
+        client = asyncio.run(new_loop())
+        assert client is not old_client
+        assert old_client.client.is_closed, "The client of the previous loop was not closed"
+        asyncio.run(client.aclose())
+
+    def test_download_ascii_spectrum(self):
+        outfile = os.path.join(self.tmp_dir.name, "spectrum.txt")
+        wave, flux, flux_err = self.run_async(
+            lambda: aio.download_ascii_spectrum(self.base_url + "/spectrum.txt", outfile)
+        )
+        assert list(wave) == [4000.0, 4001.0, 4002.0]
+        assert os.path.isfile(outfile)
+
+    def test_timeout(self):
+        async def download():
+            response = await aio.get_response(self.base_url + "/slow", timeout=0.2)
+            assert response is None, "The request should have timed out"
+
+            outfile = os.path.join(self.tmp_dir.name, "spectrum.fits")
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    aio.download_file(self.base_url + "/slow/spectrum.fits", outfile),
+                    timeout=0.2,
+                )
+            assert os.listdir(self.tmp_dir.name) == [], "Partial files were left behind"
+
+        self.run_async(download)
+
+    def test_target_properties(self):
+        async def get_target_response(iau_name, verbose=False):
+            return await aio.get_response(self.base_url + "/object.html")
+
+        with mock.patch.object(aio, "get_target_response", get_target_response):
+            redshift, coords = self.run_async(
+                lambda: aio.get_target_property("2004eo", ["redshift", "coords"])
+            )
+            target_class = self.run_async(lambda: aio.get_target_class("2004eo"))
+        assert redshift == 0.015718
+        assert coords.startswith("20:32:54")
+        assert target_class == "SN Ia"
+
+    def test_spectra_failure(self):
+        # a download fails while the others are still running
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            record = aio.parse_target_page(fp.read())
+        host = self.server.host
+        record.fits_urls = [f"{host}/slow/spectrum_{i}.fits" for i in range(3)]
+        record.fits_urls.append(f"{host}/broken.fits")
+        spectra_dir = os.path.join(self.tmp_dir.name, "spectra")
+
+        async def download_file(url, outfile, *args, **kwargs):
+            if "broken" in url:
+                raise OSError("disk full")
+            return await original(url, outfile, *args, **kwargs)
+
+        async def download():
+            with self.assertRaises(OSError):
+                await aio.download_target_spectra(
+                    "2004eo", file_type="fits", record=record, spectra_dir=spectra_dir
+                )
+            # the other downloads were cancelled, not left running
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            assert len(tasks) == 0, "Downloads were left running"
+            assert os.listdir(os.path.join(spectra_dir, "2004eo")) == []
+
+        original = aio.download_file
+        with mock.patch.object(aio, "download_file", download_file):
+            self.run_async(download)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import time
+import hashlib
+import tempfile
+import unittest
+from wiserep_api.api import (
+    RateLimiter,
+    WiserepClient,
+    get_client,
+    set_client,
+    map_targets,
+    download_file,
+)
+from tests.local_server import LocalServer, QuietHandler
+
+content = b"SIMPLE  =                    T" + bytes(2850)
+
+
+class FileHandler(QuietHandler):
+    def do_GET(self):
+        self.send_body(content, headers={"ETag": '"v1"'})
+
+
+class TestClient(unittest.TestCase):
+    def test_rate_limiter(self):
+        limiter = RateLimiter(rate=20)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait("www.wiserep.org")
+        elapsed = time.monotonic() - start
+        assert elapsed >= 0.19, "The requests were not spaced out"
+
+    def test_shared_client(self):
+        client = set_client(timeout=10, retries=2, rate_limit=5)
+        assert get_client() is client, "The shared client was not replaced"
+        assert client.timeout == 10
+        adapter = client.session.get_adapter("https://www.wiserep.org")
+        assert adapter.max_retries.total == 2
+        assert 503 in adapter.max_retries.status_forcelist
+        set_client(WiserepClient())
+
+    def test_base_url(self):
+        client = WiserepClient(base_url="http://127.0.0.1:8000/")
+        assert (
+            client._rewrite_url("https://www.wiserep.org/object/1234")
+            == "http://127.0.0.1:8000/object/1234"
+        )
+        # spectra are requested with plain HTTP
+        assert (
+            client._rewrite_url("http://www.wiserep.org/sites/default/files/spectra/sn.dat")
+            == "http://127.0.0.1:8000/sites/default/files/spectra/sn.dat"
+        )
+        assert client._rewrite_url("https://example.org/a") == "https://example.org/a"
+
+    def test_map_targets(self):
+        def func(name, suffix=""):
+            if name == "bad":
+                raise ValueError("bad target")
+            return name + suffix
+
+        results = {
+            name: (output, error)
+            for name, output, error, _ in map_targets(
+                func, ["2004eo", "bad"], workers=2, suffix="!"
+            )
+        }
+        assert results["2004eo"] == ("2004eo!", None)
+        assert results["bad"][0] is None
+        assert "bad target" in results["bad"][1]
+
+    def test_map_targets_stop(self):
+        started = []
+
+        def func(name):
+            started.append(name)
+            time.sleep(0.1)
+            return name
+
+        results = map_targets(func, [str(i) for i in range(40)], workers=2)
+        next(results)
+        results.close()
+        time.sleep(0.3)
+        # the queued targets are cancelled instead of run
+        assert len(started) <= 6, f"{len(started)} targets were processed"
+
+
+class TestDownloadFile(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer(FileHandler)
+        self.url = self.server.url + "/spectrum.fits"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.outfile = os.path.join(self.tmp_dir.name, "spectrum.fits")
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_download(self):
+        sha256 = hashlib.sha256(content).hexdigest()
+        file_info = download_file(self.url, self.outfile, sha256=sha256)
+        assert file_info == {"size": len(content), "sha256": sha256, "etag": '"v1"'}
+        with open(self.outfile, "rb") as fp:
+            assert fp.read() == content, "The file was not downloaded byte for byte"
+
+    def test_failed_checks(self):
+        file_info = download_file(self.url, self.outfile, expected_size=10)
+        assert file_info is None, "The size check should have failed"
+        file_info = download_file(self.url, self.outfile, sha256="0" * 64)
+        assert file_info is None, "The checksum check should have failed"
+        assert os.listdir(self.tmp_dir.name) == [], "Partial files were left behind"
+
+
+if __name__ == "__main__":
+    unittest.main()
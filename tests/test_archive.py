@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from wiserep_api.archive import build_archive, SpectraArchive
+
+
+def write_target(spectra_dir, target, spectra):
+    obj_dir = os.path.join(spectra_dir, target)
+    os.makedirs(obj_dir)
+    rows = []
+    for spec_id, (basename, wave) in spectra.items():
+        spec_df = pd.DataFrame({"wave": wave, "flux": wave * 1e-18, "flux_err": wave * 1e-20})
+        spec_df.to_csv(os.path.join(obj_dir, basename), index=False)
+        rows.append(
+            {
+                "Spec. ID": spec_id,
+                "Obs-date": "2004-09-20 03:21:36",
+                "Telescope": "ESO-NTT",
+                "Instrument": "EMMI",
+                "Spectrum ascii File": basename,
+                "Spectrum fits File": "",
+            }
+        )
+    pd.DataFrame(rows).to_csv(os.path.join(obj_dir, "downloaded_spectra_info.csv"), index=False)
+
+
+class TestArchive(unittest.TestCase):
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spectra_dir = os.path.join(tmp_dir, "spectra")
+            archive_dir = os.path.join(tmp_dir, "archive")
+            write_target(
+                spectra_dir,
+                "2004eo",
+                {
+                    1001: ("2004eo_1.dat", np.linspace(4000, 9000, 50)),
+                    1002: ("2004eo_2.dat", np.linspace(3500, 8000, 30)),
+                },
+            )
+            write_target(spectra_dir, "2011fe", {2001: ("2011fe_1.dat", np.arange(3000.0, 3010.0))})
+
+            n_spectra = build_archive(spectra_dir, archive_dir)
+            assert n_spectra == 3
+            assert sorted(os.listdir(tmp_dir)) == ["archive", "spectra"]
+
+            archive = SpectraArchive(archive_dir)
+            assert len(archive) == 3
+            assert archive.targets == ["2004eo", "2011fe"]
+            assert isinstance(archive.wave, np.memmap), "The arrays are not memory-mapped"
+            assert archive.wave.dtype == np.float32
+
+            wave, flux, flux_err = archive.get_spectrum(1002)
+            np.testing.assert_allclose(wave, np.linspace(3500, 8000, 30), rtol=1e-6)
+            np.testing.assert_allclose(flux, wave * 1e-18, rtol=1e-6)
+            assert archive.get_spectrum("9999") is None
+
+            spectra = archive.get_target("2011fe")
+            assert len(spectra) == 1
+            np.testing.assert_array_equal(spectra[0][0], np.arange(3000.0, 3010.0))
+            target_index = archive.get_target_index("2004eo")
+            assert list(target_index.spec_id) == ["1001", "1002"]
+            assert list(target_index.instrument) == ["EMMI", "EMMI"]
+
+
+if __name__ == "__main__":
+    unittest.main()
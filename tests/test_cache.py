@@ -0,0 +1,57 @@
+import os
+import time
+import tempfile
+import unittest
+import requests
+from wiserep_api.cache import ResponseCache
+
+
+def make_response(content, etag=None):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    if etag is not None:
+        response.headers["ETag"] = etag
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hit_and_revalidation(self):
+        cache = ResponseCache(self.path, ttl=0.1)
+        url = "https://www.wiserep.org/object/1"
+        cache.put(url, make_response(b"<html>2004eo</html>", etag='"abc"'))
+
+        entry = cache.get(url)
+        assert cache.is_fresh(entry), "A new entry should be fresh"
+        response = cache.to_response(entry)
+        assert response.text == "<html>2004eo</html>"
+        assert response.from_cache is True
+
+        time.sleep(0.15)
+        entry = cache.get(url)
+        assert not cache.is_fresh(entry), "The entry should have expired"
+        assert cache.validation_headers(entry) == {"If-None-Match": '"abc"'}
+        cache.touch(url)
+        assert cache.is_fresh(cache.get(url)), "The entry was not refreshed"
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(self.path, max_size=25)
+        for i in range(3):
+            cache.put(f"https://www.wiserep.org/object/{i}", make_response(b"0123456789"))
+            time.sleep(0.01)
+        assert cache.get("https://www.wiserep.org/object/0") is None
+        assert cache.get("https://www.wiserep.org/object/2") is not None
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from wiserep_api.catalog import Catalog, angular_separation
+from wiserep_api.parsing import parse_target_page
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+def make_row(name, sn_type, redshift, ra, dec):
+    return {
+        "name": name,
+        "obj_id": None,
+        "aliases": "",
+        "type": sn_type,
+        "spec_type": 3,
+        "redshift": redshift,
+        "host": "",
+        "ra": ra,
+        "dec": dec,
+        "n_spectra": 2,
+        "updated": time.time(),
+    }
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.catalog = Catalog(os.path.join(self.tmp_dir.name, "catalog.sqlite"))
+        self.catalog._store(
+            [
+                make_row("2004eo", "SN Ia", 0.0157, 308.22579, 9.92853),
+                make_row("2011fe", "SN Ia", 0.0008, 210.77421, 54.27372),
+                make_row("2017cbv", "SN Ia", 0.0040, 225.86754, -29.87514),
+                make_row("2013ej", "SN II", 0.0022, 24.20067, 15.75861),
+                make_row("near_ra_0", "SN Ia", 0.0300, 359.9, 10.0),
+            ]
+        )
+
+    def tearDown(self):
+        self.catalog.close()
+        self.tmp_dir.cleanup()
+
+    def test_crossmatch(self):
+        matches_df = self.catalog.crossmatch([308.2258, 100.0], [9.9285, 10.0])
+        assert matches_df.name[0] == "2004eo"
+        assert matches_df.name.isna()[1]
+        assert matches_df.separation[0] < 1 / 3600
+        assert np.isnan(matches_df.separation[1])
+
+    def test_type_and_redshift(self):
+        objects_df = self.catalog.query(types="SN Ia", z_max=0.01)
+        assert sorted(objects_df.name) == ["2011fe", "2017cbv"]
+
+    def test_cone_search(self):
+        objects_df = self.catalog.query(ra=308.0, dec=10.0, radius=2.0)
+        assert list(objects_df.name) == ["2004eo"]
+        np.testing.assert_almost_equal(
+            objects_df.separation[0], angular_separation(308.0, 10.0, 308.22579, 9.92853)
+        )
+
+        # the search region crosses RA = 0
+        objects_df = self.catalog.query(ra=0.5, dec=10.0, radius=1.0)
+        assert list(objects_df.name) == ["near_ra_0"]
+
+    def test_update(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            record = parse_target_page(fp.read())
+        fetched = []
+
+        def get_target_record(iau_name, verbose=False):
+            fetched.append(iau_name)
+            return record
+
+        # names listed by the incremental sync: only the new one is downloaded
+        sync_result = (["2023ixf"], [], ["2023ixf", "2017cbv", "2011fe", "2004eo"])
+        with mock.patch("wiserep_api.catalog.sync_sn_list", return_value=sync_result) as sync:
+            with mock.patch("wiserep_api.catalog.get_target_record", get_target_record):
+                n_updated = self.catalog.update(spec_types=["SN Ia"])
+        sync.assert_called_once_with(3)
+        assert fetched == ["2023ixf"]
+        assert n_updated == 1
+        objects_df = self.catalog.query(ra=308.0, dec=10.0, radius=2.0)
+        assert sorted(objects_df.name) == ["2004eo", "2023ixf"]
+
+
+if __name__ == "__main__":
+    unittest.main()
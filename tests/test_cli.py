@@ -0,0 +1,147 @@
+import io
+import os
+import json
+import time
+import _thread
+import contextlib
+import tempfile
+import unittest
+from unittest import mock
+from wiserep_api.cli import main, read_names
+from wiserep_api.api import set_client
+from wiserep_api.index import set_name_index
+from wiserep_api.parsing import parse_target_page
+from tests.local_server import LocalServer, QuietHandler
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class ObjectPageHandler(QuietHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.path.startswith("/iauname/2004eo"):
+            with open(os.path.join(data_dir, "object_page.html"), "rb") as fp:
+                self.send_body(fp.read())
+        else:
+            self.send_body(b"", status=404)
+
+
+class TestReadNames(unittest.TestCase):
+    def test_read_names(self):
+        stdin = io.StringIO('2004eo\n# comment\n\n{"name": "2011fe"}\n{"target": "2004eo"}\n')
+        assert read_names(input_files=["-"], stdin=stdin) == ["2004eo", "2011fe"]
+        assert read_names(["2020xne"], stdin=io.StringIO("2004eo\n")) == ["2020xne"]
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer(ObjectPageHandler)
+        self.base_url = self.server.url
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        ObjectPageHandler.requests.clear()
+        set_name_index()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+        set_client()
+
+    def run_props(self, *extra_args):
+        output_file = os.path.join(self.tmp_dir.name, "props.jsonl")
+        args = ["props", "2004eo", "unknown-sn", "--base-url", self.base_url,
+                "--output-dir", self.tmp_dir.name, "-o", output_file, "-q"]
+        returncode = main(args + list(extra_args))
+        with open(output_file) as fp:
+            return returncode, [json.loads(line) for line in fp]
+
+    def test_props_resume(self):
+        returncode, entries = self.run_props()
+        assert returncode == 1, "The unknown target should fail"
+        entries = {entry["target"]: entry for entry in entries}
+        assert entries["2004eo"]["status"] == "ok"
+        assert entries["2004eo"]["redshift"] == 0.015718
+        assert entries["unknown-sn"]["status"] == "not found"
+
+        # the completed target is not requested again
+        ObjectPageHandler.requests.clear()
+        returncode, entries = self.run_props()
+        assert len(entries) == 3
+        assert entries[-1]["target"] == "unknown-sn"
+        assert not any("2004eo" in path for path in ObjectPageHandler.requests)
+
+        # other properties change the results, so the target is processed again
+        returncode, entries = self.run_props("--properties", "type")
+        # the targets are written as they finish
+        entries = {entry["target"]: entry for entry in entries[3:]}
+        assert sorted(entries) == ["2004eo", "unknown-sn"]
+        assert entries["2004eo"]["type"] == "SN Ia"
+        assert "redshift" not in entries["2004eo"]
+
+        journal_files = os.listdir(os.path.join(self.tmp_dir.name, ".wiserep_journal"))
+        assert len(journal_files) == 2
+
+    def test_journal_options(self):
+        journal_file = os.path.join(self.tmp_dir.name, "journal.jsonl")
+        self.run_props("--journal", journal_file)
+        # a journal written with other options is not resumed
+        returncode, entries = self.run_props("--journal", journal_file, "--properties", "type")
+        assert returncode == 1
+        assert len(entries) == 2
+
+    def test_invalid_properties(self):
+        with self.assertRaises(SystemExit) as context:
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.run_props("--properties", "type,mass")
+        assert context.exception.code == 2
+
+    def test_snid_no_spectra(self):
+        os.makedirs(os.path.join(self.tmp_dir.name, "spectra", "2004eo"))
+        output_file = os.path.join(self.tmp_dir.name, "snid.jsonl")
+        args = ["snid", "2004eo", "--output-dir", self.tmp_dir.name, "-o", output_file, "-q"]
+        assert main(args) == 1
+        assert main(args) == 1, "The target should not be journaled as completed"
+        with open(output_file) as fp:
+            entries = [json.loads(line) for line in fp]
+        assert [entry["status"] for entry in entries] == ["not found", "not found"]
+
+    def test_interrupt(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            record = parse_target_page(fp.read())
+        names = [f"target-{i}" for i in range(40)]
+        processed = []
+        interrupted = []
+
+        def get_target_record(iau_name, verbose=False):
+            processed.append(iau_name)
+            if len(processed) == 6 and not interrupted:
+                interrupted.append(iau_name)
+                _thread.interrupt_main()  # as a Ctrl-C
+            time.sleep(0.05)
+            return record
+
+        output_file = os.path.join(self.tmp_dir.name, "props.jsonl")
+        args = ["props", *names, "--workers", "2", "--output-dir", self.tmp_dir.name,
+                "-o", output_file, "-q"]
+        with mock.patch("wiserep_api.properties.get_target_record", get_target_record):
+            with contextlib.redirect_stderr(io.StringIO()):
+                start = time.monotonic()
+                returncode = main(args)
+            assert returncode == 130
+            assert time.monotonic() - start < 1, "The queued targets were processed"
+            time.sleep(0.2)
+            assert len(processed) < 12, "The queued targets were not cancelled"
+
+            # the run is resumed with the remaining targets
+            processed.clear()
+            returncode = main(args)
+        assert returncode == 0
+        with open(output_file) as fp:
+            entries = [json.loads(line) for line in fp]
+        assert set(entry["target"] for entry in entries) == set(names)
+        assert len(processed) < len(names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+from wiserep_api.coords import (
+    parse_coords,
+    parse_coords_deg,
+    crossmatch,
+    angular_separation,
+)
+
+
+class TestParseCoords(unittest.TestCase):
+    def test_parse_coords(self):
+        ra, dec = parse_coords(
+            ["20:32:54.190 +09:55:42.71", "00:10:00.000 -00:30:00.00", "", "bad value"]
+        )
+        # correctly shaped but not numeric: only that row is invalid
+        ra_bad, dec_bad = parse_coords(["20:32:54.190 +09:55:42.71", "aa:bb:cc dd:ee:ff"])
+        np.testing.assert_allclose(ra_bad[0], 308.22579, atol=1e-5)
+        assert np.isnan(ra_bad[1]) and np.isnan(dec_bad[1])
+        np.testing.assert_allclose(ra[:2], [308.22579, 2.5], atol=1e-5)
+        np.testing.assert_allclose(dec[:2], [9.92853, -0.5], atol=1e-5)
+        assert np.isnan(ra[2:]).all() and np.isnan(dec[2:]).all()
+
+    def test_parse_coords_deg(self):
+        ra, dec = parse_coords_deg(["308.22579 +9.92853", "", "1.0 x"])
+        np.testing.assert_allclose(ra[0], 308.22579)
+        np.testing.assert_allclose(dec[0], 9.92853)
+        assert np.isnan(ra[1:]).all() and np.isnan(dec[1:]).all()
+
+        ra, dec = parse_coords_deg("308.22579 +9.92853")
+        assert ra.shape == (1,)
+
+
+class TestCrossmatch(unittest.TestCase):
+    def test_crossmatch(self):
+        rng = np.random.default_rng(42)
+        cat_ra = rng.uniform(0, 360, 1000)
+        cat_dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 1000)))
+
+        # slightly shifted copies of some catalog objects, a far away and a NaN position
+        ra = np.append(cat_ra[:10] + 1e-4, [np.nan, 0.0])
+        dec = np.append(cat_dec[:10], [10.0, 90.0])
+        cat_dec[cat_dec > 89] = 0
+
+        indices, separations = crossmatch(ra, dec, cat_ra, cat_dec, max_sep=1e-3)
+        np.testing.assert_array_equal(indices[:10], np.arange(10))
+        np.testing.assert_allclose(
+            separations[:10],
+            angular_separation(ra[:10], dec[:10], cat_ra[:10], cat_dec[:10]),
+            atol=1e-9,
+        )
+        np.testing.assert_array_equal(indices[10:], [-1, -1])
+        assert np.isnan(separations[10:]).all()
+
+        # without a maximum separation every position has a match
+        indices, _ = crossmatch(ra[11:], dec[11:], cat_ra, cat_dec)
+        assert indices[0] == np.argmax(cat_dec)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,20 @@
 import os
 import glob
 import shutil
+import tempfile
 import unittest
 import numpy as np
 import warnings
 from astropy.utils.exceptions import AstropyWarning
-from wiserep_api import download_target_spectra
+from wiserep_api import download_target_spectra, SpectraQuery
+from wiserep_api.parsing import parse_target_page
+from wiserep_api.spectra import (
+    read_ascii_spectrum,
+    _fetch_spectrum,
+    _load_download_manifest,
+    _save_download_manifest,
+)
+from tests.local_server import LocalServer, QuietHandler
 
 if os.path.isdir('spectra') is True:
     shutil.rmtree('spectra')
@@ -57,5 +66,120 @@ class TestDownloadSpectra(unittest.TestCase):
         np.testing.assert_equal(len(fits_files), 2, err_msg)
 
 
+class TestReadSpectrum(unittest.TestCase):
+    def test_header(self):
+        lines = ["SIMPLE  =                    T", "BITPIX  =                  -32", "END",
+                 "3000.0 1.0e-15 1.0e-17", "3001.0 2.0e-15 2.0e-17", "", "3002.0 3.0e-15 3.0e-17"]
+        wave, flux, flux_err = read_ascii_spectrum(lines, block_size=2)
+        np.testing.assert_array_equal(wave, [3000.0, 3001.0, 3002.0])
+        np.testing.assert_array_equal(flux_err, [1.0e-17, 2.0e-17, 3.0e-17])
+
+    def test_two_columns(self):
+        lines = ["# wave flux", "4000 1", "4001 2 # comment"]
+        wave, flux, flux_err = read_ascii_spectrum(lines, dtype=np.float32)
+        assert wave.dtype == np.float32
+        np.testing.assert_array_equal(flux, [1, 2])
+        assert np.isnan(flux_err).all(), "The flux errors should be NaN"
+
+    def test_inline_comments(self):
+        lines = ["4000 1 # first", "4001 2", "4002 3"]
+        wave, flux, flux_err = read_ascii_spectrum(lines)
+        np.testing.assert_array_equal(wave, [4000, 4001, 4002])
+        np.testing.assert_array_equal(flux, [1, 2, 3])
+
+    def test_mixed_columns(self):
+        # rows without flux error are kept, with NaN
+        lines = ["4000 1 0.1", "4001 2", "4002 3 0.3"]
+        wave, flux, flux_err = read_ascii_spectrum(lines)
+        np.testing.assert_array_equal(wave, [4000, 4001, 4002])
+        np.testing.assert_array_equal(flux_err, [0.1, np.nan, 0.3])
+
+    def test_no_data(self):
+        lines = ["<html>", "<body>Not found</body>", "</html>"]
+        wave, flux, flux_err = read_ascii_spectrum(lines)
+        assert len(wave) == 0
+
+
+class SpectrumHandler(QuietHandler):
+    content = b"4000 1.0 0.1\n4001 2.0 0.2\n"
+    requests = []
+
+    def do_HEAD(self):
+        self.send_body(self.content, headers={"ETag": '"v1"'})
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        self.do_HEAD()
+
+
+class TestSkipExisting(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer(SpectrumHandler)
+        self.host = self.server.host
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        SpectrumHandler.requests.clear()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_skip_and_dedup(self):
+        manifest = {}
+        outfiles = []
+        for basename in ["spec_a.dat", "spec_b.dat"]:
+            outfile = os.path.join(self.tmp_dir.name, basename)
+            url = f"{self.host}/{basename}"
+            assert _fetch_spectrum(url, outfile, "ascii", manifest, skip_existing=True)
+            outfiles.append(outfile)
+        assert os.path.samefile(*outfiles), "Identical spectra should be hard-linked"
+        _save_download_manifest(manifest, self.tmp_dir.name)
+
+        # second run: nothing is downloaded again
+        manifest = _load_download_manifest(self.tmp_dir.name)
+        for outfile in outfiles:
+            url = f"{self.host}/{os.path.basename(outfile)}"
+            assert _fetch_spectrum(url, outfile, "ascii", manifest, skip_existing=True)
+        np.testing.assert_equal(len(SpectrumHandler.requests), 2, "Files were downloaded again")
+
+    def test_query_dry_run(self):
+        data_dir = os.path.join(os.path.dirname(__file__), "data")
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            record = parse_target_page(fp.read())
+        # serve the spectra locally
+        record.ascii_urls = [f"{self.host}/{os.path.basename(url)}" for url in record.ascii_urls]
+        record.fits_urls = [f"{self.host}/{os.path.basename(url)}" for url in record.fits_urls]
+        spectra_dir = os.path.join(self.tmp_dir.name, "spectra")
+        query = SpectraQuery(instruments=["wfccd"])
+
+        plan = download_target_spectra(
+            "2004eo", record=record, spectra_dir=spectra_dir, query=query, dry_run=True
+        )
+        assert list(plan.file) == ["2004eo_2004-09-25_WFCCD.dat"]
+        np.testing.assert_equal(plan["size"].sum(), len(SpectrumHandler.content))
+        assert len(SpectrumHandler.requests) == 0, "Nothing should be downloaded"
+        assert os.path.isdir(spectra_dir) is False
+
+        spectra = {}
+        files = download_target_spectra(
+            "2004eo", record=record, spectra_dir=spectra_dir, query=query, spectra=spectra
+        )
+        assert files == ["2004eo_2004-09-25_WFCCD.dat"]
+        # arrays of the downloaded spectra, e.g. for SNID
+        spectrum_file = os.path.join(spectra_dir, "2004eo", files[0])
+        np.testing.assert_array_equal(spectra[spectrum_file][1], [1.0, 2.0])
+        assert len(SpectrumHandler.requests) == 1
+
+    def test_error_page(self):
+        # a page without data is not a successful download
+        content = SpectrumHandler.content
+        SpectrumHandler.content = b"<html><body>Not found</body></html>\n"
+        try:
+            outfile = os.path.join(self.tmp_dir.name, "spec.dat")
+            assert not _fetch_spectrum(f"{self.host}/spec.dat", outfile, "ascii", {})
+            assert os.path.isfile(outfile) is False
+        finally:
+            SpectrumHandler.content = content
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import unittest
+import subprocess
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded_modules(statement):
+    """Heavy dependencies loaded by a statement in a fresh interpreter."""
+    code = (
+        f"import sys; {statement}; "
+        "print(','.join(m for m in ('pandas', 'numpy', 'astropy') if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env
+    ).stdout
+    return [name for name in output.strip().split(",") if name != ""]
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_light_imports(self):
+        assert _loaded_modules("import wiserep_api") == []
+        assert _loaded_modules("from wiserep_api import get_target_property") == []
+        assert _loaded_modules("import wiserep_api.search as s; s.spectral_types") == []
+
+    def test_public_names(self):
+        import wiserep_api
+
+        for name in wiserep_api.__all__:
+            assert getattr(wiserep_api, name) is not None, name
+        assert wiserep_api.spectra.download_target_spectra is wiserep_api.download_target_spectra
+        with self.assertRaises(AttributeError):
+            wiserep_api.not_a_function
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from wiserep_api import index
+from wiserep_api.api import set_client
+from wiserep_api.index import NameIndex, get_name_index, set_name_index
+from wiserep_api.properties import get_target_record
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self):
+        name_index = NameIndex(os.path.join(self.tmp_dir.name, "names.sqlite"))
+        name_index.add("2004eo", 1234, iau_name="2004eo")
+        name_index.add_many([("PESSTO-123", 1234, None), ("2011fe", 5678, None)])
+
+        assert name_index.get_id("2004eo") == "1234"
+        assert name_index.get_id("2017cbv") is None
+        assert name_index.get_url("PESSTO-123") == "https://www.wiserep.org/object/1234"
+        assert name_index.get_names(1234) == ["2004eo", "PESSTO-123"]
+        name_index.close()
+
+    def test_export_import(self):
+        name_index = NameIndex()
+        name_index.add_many([("2004eo", 1234, "2004eo"), ("ZTF19abcdefg", 5678, "2019xyz")])
+        csv_file = os.path.join(self.tmp_dir.name, "names.csv")
+        name_index.export_csv(csv_file)
+
+        new_index = NameIndex()
+        new_index.import_csv(csv_file)
+        assert len(new_index) == 2
+        assert new_index.get_id("ZTF19abcdefg") == "5678"
+
+    def test_object_page(self):
+        name_index = set_name_index()
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            # e.g. a cached response, whose URL is the requested one
+            response = mock.Mock(text=fp.read(), url="https://www.wiserep.org/iauname/2004eo")
+        with mock.patch("wiserep_api.properties.get_target_response", return_value=response):
+            get_target_record("2004eo")
+        assert name_index.get_names(7998) == ["2004eo", "CSP04eo", "PESSTO-123"]
+
+    def test_next_to_cache(self):
+        cache_file = os.path.join(self.tmp_dir.name, "wiserep_cache.sqlite")
+        set_client(cache=cache_file)
+        try:
+            with mock.patch.object(index, "_name_index", None):
+                name_index = get_name_index()
+                assert name_index.path == os.path.join(self.tmp_dir.name, "wiserep_names.sqlite")
+                name_index.close()
+        finally:
+            set_client()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import json
+import tempfile
+import unittest
+from wiserep_api.api import WiserepClient
+from wiserep_api.cache import ResponseCache
+from wiserep_api.parsing import parse_target_page
+from wiserep_api.metrics import (
+    endpoint_category,
+    capture_metrics,
+    add_callback,
+    remove_callback,
+)
+from tests.local_server import LocalServer, FlakyHandler
+
+content = b"4000.0 1.5e-15\n4001.0 1.6e-15\n"
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class Handler(FlakyHandler):
+    def do_GET(self):
+        if self.fail() is False:
+            self.send_body(content)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        Handler.failures = 0
+        self.server = LocalServer(Handler)
+        self.url = self.server.url + "/spectra/sn.dat"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_endpoint_category(self):
+        base_url = "https://www.wiserep.org"
+        assert endpoint_category(base_url + "/search?&page=0&type[]=3") == "search"
+        assert endpoint_category(base_url + "/object/1234") == "object"
+        assert endpoint_category(base_url + "/iauname/2004eo") == "object"
+        assert endpoint_category(base_url + "/sites/default/files/spectra/sn.fits") == "fits"
+        assert endpoint_category(base_url + "/sites/default/files/spectra/sn.dat") == "ascii"
+        assert endpoint_category(base_url + "/about") == "other"
+
+    def test_requests(self):
+        cache = ResponseCache(os.path.join(self.tmp_dir.name, "cache.sqlite"))
+        client = WiserepClient(backoff_factor=0, cache=cache)
+        events = []
+        add_callback(events.append)
+        try:
+            with capture_metrics() as metrics:
+                client.get(self.url)
+                client.get(self.url)  # served from the cache
+        finally:
+            remove_callback(events.append)
+            client.close()
+
+        ascii_metrics = metrics.snapshot()["requests"]["ascii"]
+        assert ascii_metrics["count"] == 2
+        assert ascii_metrics["retries"] == 1, "The retry was not counted"
+        assert ascii_metrics["bytes"] == 2 * len(content)
+        assert ascii_metrics["cache_hits"] == 1
+        assert ascii_metrics["cache_hit_ratio"] == 0.5
+        assert ascii_metrics["latency"]["p50"] is not None
+        assert [event["from_cache"] for event in events] == [False, True]
+
+        text = metrics.to_prometheus()
+        assert 'wiserep_requests_total{category="ascii"} 2' in text
+        assert 'wiserep_request_duration_seconds_count{category="ascii"} 2' in text
+        json_file = os.path.join(self.tmp_dir.name, "metrics.json")
+        metrics.to_json(json_file)
+        with open(json_file) as fp:
+            assert json.load(fp)["requests"]["ascii"]["count"] == 2
+
+    def test_parse_time(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            html = fp.read()
+        with capture_metrics() as metrics:
+            record = parse_target_page(html)
+            _ = record.spectra_table
+        parse_metrics = metrics.snapshot()["parse"]
+        assert parse_metrics["object_page"]["count"] == 1
+        assert parse_metrics["spectra_table"]["time"] > 0
+
+
+if __name__ == "__main__":
+    unittest.main()
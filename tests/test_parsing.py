@@ -0,0 +1,95 @@
+import io
+import os
+import unittest
+import pandas as pd
+from wiserep_api.parsing import parse_target_page, read_spectra_table
+from wiserep_api.properties import get_class_from_record
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestParsing(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            self.record = parse_target_page(fp.read())
+
+    def test_properties(self):
+        record = self.record
+        assert record.type == "SN Ia"
+        assert record.redshift == 0.015718
+        assert record.host == "NGC6928"
+        assert record.coords == "20:32:54.190 +09:55:42.71"
+        assert record.coords_deg == "308.22579 +9.92853"
+        assert record.tns_classifications == ["SN Ia"]
+        assert record.internal_names == ["PESSTO-123", "CSP04eo"]
+        assert record.obj_id == "7998"
+        assert get_class_from_record(record) == "SN Ia"
+
+    def test_missing_redshift(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            html = fp.read()
+        for value, expected in [("", ""), ("-", "nan"), ("0.05?", "nan")]:
+            record = parse_target_page(html.replace("0.015718", value))
+            assert str(record.redshift) == expected
+            # the other properties are still available
+            assert record.type == "SN Ia"
+            assert record.host == "NGC6928"
+
+    def test_spectra(self):
+        record = self.record
+        assert len(record.ascii_urls) == 2, "Number of ASCII URLs does not match"
+        assert record.ascii_urls[0].endswith("2004eo_2004-09-20_EMMI.dat")
+        assert len(record.fits_urls) == 1, "Number of FITS URLs does not match"
+        assert record.fits_urls[0].endswith("2004eo_2004-09-20_EMMI.fits")
+
+        spec_table = record.spectra_table
+        assert list(spec_table["Spec. ID"]) == [1001, 1002]
+        assert "Spectrum ascii File" in spec_table.columns
+        assert str(spec_table["Obs-date"].dtype).startswith("datetime64")
+        assert list(spec_table["Instrument"]) == ["EMMI", "WFCCD"]
+
+    def test_spectra_table_layout(self):
+        # filter row above the column names, cells spanning several
+        # columns, links and a nested table inside a cell
+        html = (
+            "<table><tr><td>Search</td></tr></table>"
+            '<table class="specs-table"><thead>'
+            '<tr><th colspan="3">Spectra</th></tr>'
+            "<tr><th>Spec. ID</th><th>Obs-date</th><th>Instrument</th></tr>"
+            "</thead><tbody>"
+            '<tr><td>7</td><td>2020-01-02</td><td><a href="#">EFOSC2</a></td></tr>'
+            '<tr><td>8</td><td></td><td><table><tr><td>SPRAT</td></tr></table></td></tr>'
+            '<tr><td colspan="2">9</td><td>A &amp; B</td></tr>'
+            "</tbody></table>"
+        )
+        spec_table = read_spectra_table(html)
+        assert list(spec_table.columns) == ["Spec. ID", "Obs-date", "Instrument"]
+        assert list(spec_table["Spec. ID"]) == [7, 8, 9]
+        assert list(spec_table["Instrument"]) == ["EFOSC2", "SPRAT", "A & B"]
+        # partially empty or invalid dates are kept as text
+        assert spec_table["Obs-date"][1] != spec_table["Obs-date"][1]
+
+    def test_spectra_table_sections(self):
+        # header row of ``td`` cells and body row starting with a ``th`` cell:
+        # the rows are split by section, as in ``pandas.read_html``
+        with open(os.path.join(data_dir, "spectra_table_sections.html")) as fp:
+            html = fp.read()
+        spec_table = read_spectra_table(html)
+        assert list(spec_table.columns) == ["Spec. ID", "Obs-date", "Instrument"]
+        assert list(spec_table["Spec. ID"]) == [2001, 2002, 2003]
+        assert list(spec_table["Instrument"]) == ["EFOSC2", "SPRAT", "FLOYDS"]
+
+        try:
+            html_table = pd.read_html(io.StringIO(html))[0]
+        except ImportError:
+            return  # lxml is not installed
+        assert list(html_table.columns) == list(spec_table.columns)
+        assert list(html_table["Spec. ID"]) == list(spec_table["Spec. ID"])
+
+    def test_no_spectra_table(self):
+        with self.assertRaises(ValueError):
+            read_spectra_table("<html><table><tr><td>1</td></tr></table></html>")
+
+
+if __name__ == "__main__":
+    unittest.main()
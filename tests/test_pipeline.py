@@ -0,0 +1,49 @@
+import time
+import unittest
+from wiserep_api.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_stages(self):
+        def split_stage(item):
+            # fan-out: one item per character
+            for char in item:
+                yield char
+
+        def upper_stage(char):
+            if char == "x":
+                raise ValueError("bad item")
+            yield char.upper()
+
+        pipeline = Pipeline(queue_size=2)
+        pipeline.add_stage("split", split_stage).add_stage("upper", upper_stage, workers=3)
+        outputs = list(pipeline.run(["ab", "cx", "d"]))
+
+        assert sorted(outputs) == ["A", "B", "C", "D"]
+        stats = pipeline.stats
+        assert stats["split"].items_in == 3 and stats["split"].items_out == 5
+        assert stats["upper"].items_in == 5 and stats["upper"].items_out == 4
+        assert len(stats["upper"].errors) == 1, "The error was not recorded"
+
+    def test_backpressure(self):
+        produced = []
+
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        def slow_stage(item):
+            time.sleep(0.01)
+            yield item
+
+        pipeline = Pipeline(queue_size=2).add_stage("slow", slow_stage)
+        for i, _ in enumerate(pipeline.run(source())):
+            if i == 4:
+                break
+        # the source is never far ahead of the slow stage
+        assert len(produced) < 20, "The source did not wait for the slow stage"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,18 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
-from wiserep_api import get_target_property, get_target_class
+import pandas as pd
+from wiserep_api import get_target_property, get_target_class, get_targets_properties
+from wiserep_api.parsing import parse_target_page
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
 
 
 class TestProperties(unittest.TestCase):
@@ -24,6 +36,63 @@ class TestProperties(unittest.TestCase):
 
         assert values==expected_props, "The values retrieved do not match the expected ones" 
 
+    def test_bulk_properties(self):
+        properties_df = get_targets_properties(['2004eo', '2017ixi'], workers=2)
+        assert list(properties_df.target) == ['2004eo', '2017ixi']
+        assert (properties_df.status == 'ok').all(), "Some targets failed"
+
+        row = properties_df.iloc[0]
+        np.testing.assert_string_equal(row['type'], 'SN Ia')
+        np.testing.assert_almost_equal(row['redshift'], 0.015718)
+        np.testing.assert_almost_equal(row['ra'], 308.22579)
+        np.testing.assert_almost_equal(row['dec'], 9.92853)
+
+
+class TestBulkPropertiesOffline(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(data_dir, "object_page.html")) as fp:
+            self.record = parse_target_page(fp.read())
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_properties(self, **kwargs):
+        def get_target_record(iau_name, verbose=False):
+            if iau_name == "broken":
+                raise ConnectionError("connection reset")
+            return self.record if iau_name == "2004eo" else None
+
+        # a generator of names, as given by iter_sn_list
+        names = (name for name in ["2004eo", "unknown", "broken"])
+        with mock.patch("wiserep_api.properties.get_target_record", get_target_record):
+            return get_targets_properties(names, workers=2, **kwargs)
+
+    def test_typed_columns(self):
+        properties_df = self.get_properties()
+        assert list(properties_df.target) == ["2004eo", "unknown", "broken"]
+        assert list(properties_df.status) == ["ok", "not found", "failed"]
+        assert properties_df["type"].dtype == "category"
+        assert properties_df["redshift"].dtype == float
+        np.testing.assert_almost_equal(properties_df["ra"][0], 308.22579)
+        assert np.isnan(properties_df["dec"][1])
+
+    def test_chunked_output(self):
+        # Parquet requires pyarrow
+        extensions = ["csv"] if pyarrow is None else ["csv", "parquet"]
+        for extension in extensions:
+            output = os.path.join(self.tmp_dir.name, f"properties.{extension}")
+            properties_df = self.get_properties(output=output, chunk_size=1)
+            if extension == "csv":
+                output_df = pd.read_csv(output)
+            else:
+                output_df = pd.read_parquet(output)
+            assert sorted(output_df.target) == sorted(properties_df.target)
+            np.testing.assert_almost_equal(
+                output_df.set_index("target").loc["2004eo", "redshift"], 0.015718
+            )
+
+
 class TestClassification(unittest.TestCase):
     def test_classification(self):
         sn_type = get_target_class("2004eo")
@@ -1,11 +1,25 @@
 import os
+import tempfile
 import unittest
-from wiserep_api import print_spectral_types, download_sn_list
+from unittest import mock
+from wiserep_api import print_spectral_types, download_sn_list, sync_sn_list
 
-if os.path.isfile("SNIa-CSM_wiserep.txt") is True:
-    os.remove("SNIa-CSM_wiserep.txt")
 
-class TestSearch(unittest.TestCase):
+class TemporaryDirectoryTestCase(unittest.TestCase):
+    """Runs the tests in a temporary directory, where the search lists
+    and manifests are written."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+
+class TestSearch(TemporaryDirectoryTestCase):
     def test_search(self):
         print_spectral_types()
         download_sn_list("SN Ia-CSM")
@@ -14,5 +28,71 @@ class TestSearch(unittest.TestCase):
             "SNIa-CSM_wiserep.txt"
         ), "The downloaded list was not found"
 
+
+class TestResumableSearch(TemporaryDirectoryTestCase):
+    def test_resume(self):
+        pages = {0: ["2004eo", "2011fe"], 1: ["2014J"], 2: ["2017cbv"], 3: []}
+        fetched = []
+
+        def fetch_page(spec_type, page):
+            fetched.append(page)
+            return pages.get(page, [])
+
+        def failing_fetch_page(spec_type, page):
+            if page == 2:
+                return None
+            return fetch_page(spec_type, page)
+
+        # the pages before the failed one (in the same window) are checkpointed
+        with mock.patch("wiserep_api.search._fetch_page", failing_fetch_page):
+            sne_list = download_sn_list("SN Ia", workers=3)
+        assert sne_list is None, "The search should have been interrupted"
+
+        fetched.clear()
+        with mock.patch("wiserep_api.search._fetch_page", fetch_page):
+            sne_list = download_sn_list("SN Ia", workers=2)
+        assert 0 not in fetched and 1 not in fetched, "Finished pages were downloaded again"
+        assert sne_list == ["2004eo", "2011fe", "2014J", "2017cbv"]
+        assert os.path.isfile("SNIa_wiserep.txt"), "The downloaded list was not found"
+
+    def test_incremental_sync(self):
+        def search_page(entries):
+            rows = [
+                f'<tr><td><a href="/object/{obj_id}" title="Click to Object page">'
+                f'{name}</a></td><td><a href="/object/{obj_id}">Spectra</a></td></tr>'
+                for name, obj_id in entries
+            ]
+            return "<html><body><table>" + "".join(rows) + "</table></body></html>"
+
+        pages = [[("2017cbv", 3), ("2014J", 2)], [("2011fe", 1)], []]
+        requested = []
+
+        def get_response(url, **kwargs):
+            page = int(url.split("page=")[1].split("&")[0])
+            requested.append(page)
+            return mock.Mock(text=search_page(pages[page]))
+
+        with mock.patch("wiserep_api.search.get_response", get_response):
+            added, removed, sne_list = sync_sn_list("SN Ia")
+            assert sne_list == ["2017cbv", "2014J", "2011fe"]
+
+            pages = [[("2023ixf", 4), ("2017cbv", 3)], [("2014J", 2)], [("2011fe", 1)], []]
+            requested.clear()
+            added, removed, sne_list = sync_sn_list("SN Ia")
+        assert requested == [0], "Only the first page should be downloaded"
+        assert added == ["2023ixf"] and removed == []
+        assert sne_list == ["2023ixf", "2017cbv", "2014J", "2011fe"]
+
+        # the sort order is not honoured: every page is downloaded
+        pages = [[("2024ggi", 6), ("2025abc", 7), ("2017cbv", 3)], [("2011fe", 1)], []]
+        requested.clear()
+        with mock.patch("wiserep_api.search.get_response", get_response):
+            with self.assertWarns(UserWarning):
+                added, removed, sne_list = sync_sn_list("SN Ia")
+        assert requested == [0, 1, 2]
+        assert added == ["2024ggi", "2025abc"]
+        assert removed == ["2023ixf", "2014J"]
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import pandas as pd
+from wiserep_api.selection import SpectraQuery, select_urls
+
+
+class TestSelection(unittest.TestCase):
+    def setUp(self):
+        self.spec_table = pd.DataFrame(
+            {
+                "Spec. ID": [1, 2, 3, 4],
+                "Obs-date": pd.to_datetime(
+                    ["2020-01-01 22:00", "2020-01-02 03:00", "2020-01-05 01:00", "2020-02-01 01:00"]
+                ),
+                "Telescope": ["ESO-NTT", "ESO-NTT", "LT", "ESO-NTT"],
+                "Instrument": ["EFOSC2", "EFOSC2", "SPRAT", "EFOSC2"],
+                "Spectrum ascii File": ["a.dat", "b.dat", "c.dat", "d.dat"],
+                "Spectrum fits File": ["a.fits", None, None, "d.fits"],
+            }
+        )
+
+    def test_dates_and_instruments(self):
+        query = SpectraQuery(start_date="2020-01-02", end_date="2020-01-31", telescopes=["eso-ntt"])
+        assert list(query.select(self.spec_table)["Spec. ID"]) == [2]
+
+        query = SpectraQuery(instruments=["SPRAT", "EFOSC2"], file_type="fits")
+        assert list(query.select(self.spec_table)["Spec. ID"]) == [1, 4]
+
+    def test_one_per_night(self):
+        # the first two spectra are taken during the same night
+        query = SpectraQuery(one_per_night=True)
+        assert list(query.select(self.spec_table)["Spec. ID"]) == [1, 3, 4]
+
+        query = SpectraQuery(one_per_night=True, predicate=lambda row: row["Spec. ID"] != 1)
+        assert list(query.select(self.spec_table)["Spec. ID"]) == [2, 3, 4]
+
+    def test_select_urls(self):
+        selected_table = SpectraQuery(instruments=["SPRAT"]).select(self.spec_table)
+        urls = ["www.wiserep.org/spectra/c.dat", "www.wiserep.org/spectra/d.dat"]
+        assert select_urls(urls, selected_table, "ascii") == urls[:1]
+        assert select_urls(urls, selected_table, "fits") == []
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+from wiserep_api.snid import (
+    run_snid_many,
+    best_snid_per_spectrum,
+    best_snid_per_target,
+    write_snid_input,
+    clean_snid_output,
+)
+
+# stand-in for SNID that writes an output file like the real one
+fake_snid = """
+import os, sys
+stem = os.path.splitext(sys.argv[-1])[0]
+print(os.getcwd())
+open("snid.param", "w").write("params")
+if "fail" in stem:
+    sys.exit(1)
+with open(stem + "_snid.output", "w") as f:
+    f.write("### SNID output file ###\\n")
+    f.write("#no. sn type lap rlap z zerr age age_flag grade\\n")
+    f.write("1 sn1994D Ia-norm 0.85 12.3 0.0150 0.0040 2.1 0 good\\n")
+    f.write("2 sn1981B Ia-norm 0.80 10.1 0.0160 0.0050 3.0 0 good\\n")
+    f.write("3 sn1999em IIP 0.40 3.2 0.0300 0.0100 10.0 0 bad\\n")
+"""
+
+
+class TestRunSnid(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        script = os.path.join(self.tmp_dir.name, "fake_snid.py")
+        with open(script, "w") as f:
+            f.write(fake_snid)
+        self.command = f"{sys.executable} {script}"
+
+        self.directories = []
+        for target in ["2004eo", "2011fe"]:
+            directory = os.path.join(self.tmp_dir.name, "spectra", target)
+            os.makedirs(directory)
+            for name in [f"{target}_a", f"{target}_b", "fail"]:
+                with open(os.path.join(directory, f"{name}.dat"), "w") as f:
+                    f.write("wave,flux,flux_err\n4000,1.0,0.1\n4001,2.0,0.2\n")
+            self.directories.append(directory)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parallel_runs(self):
+        results = run_snid_many(self.directories, self.command, workers=4)
+        np.testing.assert_equal(len(results), 6, "Number of SNID jobs does not match")
+
+        succeeded = [result for result in results if result.error is None]
+        np.testing.assert_equal(len(succeeded), 4, "Number of successful fits does not match")
+        for result in succeeded:
+            assert os.path.isfile(result.output), "SNID output not found"
+        for directory in self.directories:
+            files = os.listdir(directory)
+            assert "snid.param" not in files, "SNID files were left in the directory"
+            assert not any(file.endswith(".snid") for file in files)
+
+    def test_results_db(self):
+        results_db = os.path.join(self.tmp_dir.name, "snid_results.sqlite")
+        run_snid_many(self.directories, self.command, workers=2, results_db=results_db)
+        run_snid_many(self.directories, self.command, workers=2, results_db=results_db)
+
+        best_df = best_snid_per_spectrum(results_db)
+        np.testing.assert_equal(len(best_df), 4, "Number of spectra does not match")
+        assert (best_df.template == "sn1994D").all()
+
+        best_df = best_snid_per_target(results_db)
+        assert list(best_df.target) == ["2004eo", "2011fe"]
+        np.testing.assert_almost_equal(best_df.rlap.values, [12.3, 12.3])
+
+    def test_shared_basenames(self):
+        # spectra of different targets with the same file name
+        results_db = os.path.join(self.tmp_dir.name, "snid_results.sqlite")
+        for directory in self.directories:
+            with open(os.path.join(directory, "spectrum.dat"), "w") as f:
+                f.write("wave,flux,flux_err\n4000,1.0,0.1\n4001,2.0,0.2\n")
+        run_snid_many(self.directories, self.command, workers=2, results_db=results_db)
+
+        best_df = best_snid_per_spectrum(results_db)
+        shared_df = best_df[best_df.spectrum == "spectrum"]
+        assert list(shared_df.target) == ["2004eo", "2011fe"]
+
+    def test_directory_names(self):
+        # "snid" and "output" in the directories do not exclude the spectra
+        directory = os.path.join(self.tmp_dir.name, "snid_output", "2004eo")
+        os.makedirs(directory)
+        with open(os.path.join(directory, "2004eo_a.dat"), "w") as f:
+            f.write("wave,flux,flux_err\n4000,1.0,0.1\n4001,2.0,0.2\n")
+        results = run_snid_many([directory], self.command)
+        assert [result.error for result in results] == [None]
+
+    def test_spectra_arrays(self):
+        # arrays of a spectrum that is not on disk
+        spectrum_file = os.path.join(self.directories[0], "memory.dat")
+        spectra = {spectrum_file: (np.array([4000.0, 4001.0]), np.array([1.0, 2.0]))}
+        results = run_snid_many([], self.command, spectra=spectra)
+        assert [result.spectrum for result in results] == [spectrum_file]
+        assert results[0].error is None
+        assert os.path.isfile(os.path.join(self.directories[0], "memory_snid.output"))
+
+        # files of the directories with arrays are not fitted twice
+        spectrum_file = os.path.join(self.directories[0], ".", "2004eo_a.dat")
+        spectra = {spectrum_file: spectra.popitem()[1]}
+        results = run_snid_many(self.directories[:1], self.command, spectra=spectra)
+        assert len(results) == 3
+
+    def test_scratch_dir(self):
+        scratch_dir = os.path.join(self.tmp_dir.name, "scratch")
+        os.makedirs(scratch_dir)
+        results = run_snid_many(self.directories[:1], self.command, scratch_dir=scratch_dir)
+        for result in results:
+            assert os.path.dirname(result.stdout.strip()) == scratch_dir
+        assert os.listdir(scratch_dir) == [], "The scratch directories were not removed"
+
+
+class TestSnidFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_snid_input(self):
+        snid_file = os.path.join(self.tmp_dir.name, "spectrum.snid")
+        wave = np.array([4000.0, 4001.0, 4002.0, 4003.0])
+        flux = np.array([1.5e-15, np.nan, np.inf, 2.0])
+        write_snid_input(snid_file, wave, flux)
+        with open(snid_file) as f:
+            assert f.read() == "4000\t1.5e-15\n4003\t2\n"
+
+    def test_clean_snid_output(self):
+        snid_output = os.path.join(self.tmp_dir.name, "spectrum_snid.output")
+        with open(snid_output, "w") as f:
+            # the lines above the table are not valid table rows
+            f.write("### SNID output file ###\n")
+            f.write("#(1) input spectrum: spectrum.snid\n")
+            f.write("rlap 5.0 lapmin 0.40\n")
+            f.write("#no. sn type lap rlap z zerr age age_flag grade\n")
+            f.write("1 sn1994D Ia-norm 0.85 12.3 0.0150 0.0040 2.1 0 good\n")
+            f.write("2 sn1999em IIP 0.40 3.2 0.0300 0.0100 10.0 0 bad\n")
+        output_df = clean_snid_output(snid_output)
+        assert list(output_df.sn) == ["sn1994D"]
+        with open(snid_output) as f:
+            assert f.readline().startswith("#no.,sn,type")
+            assert len(f.readlines()) == 1
+
+        with open(snid_output, "w") as f:
+            f.write("### SNID output file ###\n")
+        with self.assertRaises(ValueError):
+            clean_snid_output(snid_output)
+
+
+if __name__ == "__main__":
+    unittest.main()
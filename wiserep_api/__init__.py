@@ -1,8 +1,60 @@
 # -*- coding: utf-8 -*-
+import importlib
+
 from ._version import __version__
 
-from .api import _get_object_id, get_target_response
-from .properties import get_target_property, get_target_class
-from .spectra import download_target_spectra
-from .search import print_spectral_types, download_sn_list
-from .snid import run_snid
+# public names and the modules defining them. The modules (and their
+# dependencies, e.g. pandas or astropy) are only imported when one of
+# their names is first used, which keeps ``import wiserep_api`` fast
+_lazy_names = {
+    "api": ["_get_object_id", "get_target_response", "WiserepClient", "set_client"],
+    "properties": [
+        "get_target_property",
+        "get_target_class",
+        "get_target_record",
+        "get_targets_properties",
+    ],
+    "parsing": ["TargetRecord", "parse_target_page"],
+    "spectra": [
+        "download_target_spectra",
+        "download_many_target_spectra",
+        "get_target_spectra_table",
+    ],
+    "selection": ["SpectraQuery"],
+    "search": [
+        "print_spectral_types",
+        "download_sn_list",
+        "sync_sn_list",
+        "iter_sn_list",
+    ],
+    "snid": ["run_snid", "run_snid_many"],
+    "cache": ["ResponseCache"],
+    "index": ["NameIndex", "set_name_index"],
+    "pipeline": ["Pipeline", "run_pipeline"],
+    "catalog": ["Catalog"],
+    "coords": ["parse_coords", "parse_coords_deg", "crossmatch"],
+    "metrics": ["get_metrics", "capture_metrics", "add_callback", "remove_callback"],
+    "archive": ["build_archive", "SpectraArchive"],
+}
+_modules = {name: module for module, names in _lazy_names.items() for name in names}
+
+__all__ = ["__version__"] + [
+    name for name in _modules if name.startswith("_") is False
+]
+
+
+def __getattr__(name):
+    if name in _modules:
+        module = importlib.import_module(f".{_modules[name]}", __name__)
+        value = getattr(module, name)
+        # cached, so the module is only looked up once
+        globals()[name] = value
+        return value
+    if name in _lazy_names or name == "aio":
+        # submodules, e.g. ``wiserep_api.spectra``
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules) | set(_lazy_names))
@@ -0,0 +1,764 @@
+"""Asynchronous versions of the main functions of the package.
+
+They share the parsing code with the synchronous functions, but the
+requests are sent with a single ``httpx.AsyncClient``, so they can be
+awaited from an ``asyncio`` event loop (e.g. thousands of targets with
+``asyncio.gather``). Requires ``httpx`` (``pip install wiserep_api[aio]``).
+
+Cancelling a task (or ``asyncio.wait_for`` timing out) cancels the
+requests in flight and removes any partially downloaded file.
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError as exc:
+    raise ImportError(
+        "The asynchronous API requires httpx: pip install wiserep_api[aio]"
+    ) from exc
+
+import numpy as np
+
+from wiserep_api.api import YOUR_BOT_ID, YOUR_BOT_NAME, http_errors, wiserep_url
+from wiserep_api.index import get_name_index
+from wiserep_api.metrics import record_request
+from wiserep_api.parsing import parse_target_page
+from wiserep_api.properties import valid_properties, get_class_from_record
+from wiserep_api.search import (
+    _search_url,
+    _get_page_entries,
+    _index_entries,
+    _save_manifest,
+    _start_crawl,
+    _next_pages,
+    _store_page,
+    _merge_pages,
+)
+from wiserep_api.spectra import (
+    read_ascii_spectrum,
+    write_spectrum,
+    _load_download_manifest,
+    _file_sha256,
+    _is_up_to_date,
+    _link_duplicate,
+    _filter_urls,
+    _save_spectra_info,
+)
+from wiserep_api.selection import select_urls
+
+
+class AsyncRateLimiter:
+    """Limiter that spaces out requests to the same host without
+    blocking the event loop.
+
+    Parameters
+    ----------
+    rate: float or None
+        Maximum number of requests per second per host. If ``None``,
+        no limit is applied.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._next_slot = {}
+
+    async def wait(self, host):
+        """Waits until a request to ``host`` is allowed."""
+        if not self.rate:
+            return
+
+        interval = 1.0 / self.rate
+        # no await between reading and updating the slot, so no lock is needed
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncWiserepClient:
+    """Asynchronous HTTP client used for every request of this module.
+
+    Keeps a pool of keep-alive connections, retries transient errors
+    (with exponential backoff that respects ``Retry-After``) and limits
+    the request rate per host, like ``WiserepClient``.
+
+    Parameters
+    ----------
+    timeout: float, default ``30``
+        Timeout in seconds of each request.
+    retries: int, default ``5``
+        Maximum number of retries for failed connections and for the
+        status codes in ``retry_status``.
+    backoff_factor: float, default ``0.5``
+        Backoff factor between retries (``backoff_factor * 2**n`` seconds).
+    retry_status: tuple, default ``(429, 500, 502, 503, 504)``
+        HTTP status codes that trigger a retry.
+    rate_limit: float, optional
+        Maximum number of requests per second per host.
+    max_connections: int, default ``10``
+        Maximum number of simultaneous connections. Extra requests
+        wait for a free connection.
+    base_url: str, optional
+        URL that replaces ``https://www.wiserep.org`` in every request.
+    """
+
+    def __init__(
+        self,
+        timeout=30,
+        retries=5,
+        backoff_factor=0.5,
+        retry_status=(429, 500, 502, 503, 504),
+        rate_limit=None,
+        max_connections=10,
+        base_url=None,
+    ):
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/") if base_url is not None else None
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_status = retry_status
+        self.rate_limiter = AsyncRateLimiter(rate_limit)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            follow_redirects=True,
+            headers={
+                "User-Agent": 'tns_marker{"tns_id":'
+                + str(YOUR_BOT_ID)
+                + ', "type":"bot",'
+                ' "name":"' + YOUR_BOT_NAME + '"}'
+            },
+        )
+
+    def _retry_delay(self, attempt, response=None):
+        """Seconds to wait before retrying a request."""
+        if response is not None and "Retry-After" in response.headers:
+            retry_after = response.headers["Retry-After"]
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                try:
+                    return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+                except (TypeError, ValueError):
+                    pass
+        return self.backoff_factor * 2**attempt
+
+    async def request(self, method, url, stream=False, **kwargs):
+        """Sends a request, retrying transient errors.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method, e.g. ``GET``.
+        url: str
+            URL to request.
+        stream: bool, default ``False``
+            Whether to return before the body is downloaded. The response
+            must then be closed with ``await response.aclose()``.
+        **kwargs:
+            Extra arguments passed to ``httpx.AsyncClient.build_request``
+            (e.g. ``timeout=10``).
+
+        Returns
+        -------
+        response: httpx.Response
+            Response object.
+        """
+        if self.base_url is not None:
+            for prefix in (wiserep_url, wiserep_url.replace("https://", "http://")):
+                if url.startswith(prefix):
+                    url = self.base_url + url[len(prefix):]
+                    break
+        host = urlparse(url).netloc
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            await self.rate_limiter.wait(host)
+            request = self.client.build_request(method, url, **kwargs)
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as exc:
+                if attempt == self.retries:
+                    record_request(
+                        url,
+                        time.perf_counter() - start,
+                        retries=attempt,
+                        error=repr(exc),
+                        method=method,
+                    )
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code not in self.retry_status or attempt == self.retries:
+                if method == "HEAD":
+                    n_bytes = 0
+                elif stream is True:
+                    n_bytes = int(response.headers.get("Content-Length") or 0)
+                else:
+                    n_bytes = len(response.content)
+                record_request(
+                    url,
+                    time.perf_counter() - start,
+                    status=response.status_code,
+                    n_bytes=n_bytes,
+                    retries=attempt,
+                    method=method,
+                )
+                return response
+            await response.aclose()
+            await asyncio.sleep(self._retry_delay(attempt, response))
+
+    async def get(self, url, **kwargs):
+        """Sends a GET request (see ``request``)."""
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        """Sends a HEAD request (see ``request``)."""
+        return await self.request("HEAD", url, **kwargs)
+
+    async def aclose(self):
+        """Closes all the pooled connections."""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_client = None
+_client_loop = None
+_closing_tasks = set()
+
+
+def _replace_client(client, loop):
+    """Makes ``client`` the shared client of ``loop`` and closes the
+    previous one (in the background), so its connections do not leak."""
+    global _client, _client_loop
+    old_client, old_loop = _client, _client_loop
+    if old_client is not None and old_client is not client:
+        if old_loop is not loop and old_loop.is_running() is True:
+            raise RuntimeError(
+                "The shared client is in use by another running event loop"
+            )
+        # the connections of a finished loop cannot be reused, but they
+        # can still be closed from the new one
+        task = loop.create_task(old_client.aclose())
+        _closing_tasks.add(task)
+        task.add_done_callback(_closing_tasks.discard)
+    _client = client
+    _client_loop = loop
+    return client
+
+
+def get_client():
+    """Returns the client shared by all the functions of this module.
+
+    Returns
+    -------
+    client: AsyncWiserepClient
+        Shared client. It is created with the default configuration
+        on first use (and again for every new event loop, as the
+        connections cannot be shared between loops; the previous
+        client is then closed).
+    """
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        return _replace_client(AsyncWiserepClient(), loop)
+    return _client
+
+
+def set_client(client=None, **kwargs):
+    """Replaces the client shared by all the functions of this module.
+
+    It must be called from the event loop where the client is used.
+    The previous client is closed.
+
+    Parameters
+    ----------
+    client: AsyncWiserepClient, optional
+        New client. If not given, one is created with ``kwargs``.
+    **kwargs:
+        Arguments passed to ``AsyncWiserepClient`` (e.g. ``rate_limit=2``).
+
+    Returns
+    -------
+    client: AsyncWiserepClient
+        The new shared client.
+    """
+    if client is None:
+        client = AsyncWiserepClient(**kwargs)
+    return _replace_client(client, asyncio.get_running_loop())
+
+
+async def get_response(url, verbose=False, **kwargs):
+    """Obtains the response from a given Wiserep URL.
+
+    Parameters
+    ----------
+    url: str
+        Wiserep URL.
+    verbose: bool, default 'False'
+        Whether to print the errors.
+    **kwargs:
+        Extra arguments passed to ``AsyncWiserepClient.get``
+        (e.g. ``timeout=10`` or ``stream=True``).
+
+    Returns
+    -------
+    response: httpx.Response
+        Response object.
+    """
+    try:
+        response = await get_client().get(url, **kwargs)
+    except httpx.HTTPError as exc:
+        if verbose is True:
+            print(f"Request failed: {exc!r}", url)
+        return None
+
+    if response.status_code == 200:
+        return response
+    else:
+        if kwargs.get("stream") is True:
+            await response.aclose()
+        if verbose is True:
+            error = http_errors.get(
+                response.status_code, f"Error {response.status_code}"
+            )
+            print(error, url)
+        return None
+
+
+async def get_remote_info(url, verbose=False):
+    """Obtains the ``ETag`` and size of a remote file without downloading it.
+
+    See ``wiserep_api.api.get_remote_info``.
+    """
+    try:
+        response = await get_client().head(url)
+    except httpx.HTTPError as exc:
+        if verbose is True:
+            print(f"Request failed: {exc!r}", url)
+        return None
+
+    if response.status_code != 200:
+        if verbose is True:
+            error = http_errors.get(
+                response.status_code, f"Error {response.status_code}"
+            )
+            print(error, url)
+        return None
+
+    size = response.headers.get("Content-Length")
+    remote_info = {
+        "etag": response.headers.get("ETag"),
+        "size": int(size) if size is not None else None,
+    }
+    return remote_info
+
+
+async def download_file(url, outfile, expected_size=None, sha256=None, verbose=False):
+    """Downloads a file byte for byte, streaming it to disk.
+
+    The file is first written to ``<outfile>.part`` and only renamed to
+    ``outfile`` when complete. See ``wiserep_api.api.download_file``.
+
+    Returns
+    -------
+    file_info: dict
+        ``size``, ``sha256`` and ``etag`` of the downloaded file.
+        Returns None if the download failed or did not pass the checks.
+    """
+    response = await get_response(url, verbose, stream=True)
+    if response is None:
+        return None
+
+    if expected_size is None and "Content-Length" in response.headers:
+        if response.headers.get("Content-Encoding") is None:
+            expected_size = int(response.headers["Content-Length"])
+
+    tmp_file = outfile + ".part"
+    checksum = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_file, "wb") as fp:
+            async for chunk in response.aiter_bytes(chunk_size=2**16):
+                fp.write(chunk)
+                checksum.update(chunk)
+                size += len(chunk)
+    except httpx.HTTPError as exc:
+        if verbose is True:
+            print(f"Download failed: {exc!r}", url)
+        os.remove(tmp_file)
+        return None
+    except asyncio.CancelledError:
+        os.remove(tmp_file)
+        raise
+    finally:
+        await response.aclose()
+
+    error = None
+    if expected_size is not None and size != expected_size:
+        error = f"size mismatch ({size} != {expected_size} bytes)"
+    elif sha256 is not None and checksum.hexdigest() != sha256.lower():
+        error = "checksum mismatch"
+    if error is not None:
+        if verbose is True:
+            print(f"Download failed: {error}", url)
+        os.remove(tmp_file)
+        return None
+
+    os.replace(tmp_file, outfile)
+    file_info = {
+        "size": size,
+        "sha256": checksum.hexdigest(),
+        "etag": response.headers.get("ETag"),
+    }
+    return file_info
+
+
+async def download_ascii_spectrum(url, outfile, dtype=np.float64, verbose=False):
+    """Downloads an ASCII spectrum and saves it in a normalised CSV format.
+
+    The parsing and writing are done in a worker thread, so they do not
+    block the event loop. See ``wiserep_api.spectra.download_ascii_spectrum``.
+
+    Returns
+    -------
+    spectrum: tuple
+        Wavelength, flux and flux error arrays. Returns None if the
+        file could not be downloaded or has no data (e.g. an error page).
+    """
+    response = await get_response(url, verbose, stream=True)
+    if response is None:
+        return None
+
+    try:
+        lines = [line async for line in response.aiter_lines()]
+    except httpx.HTTPError as exc:
+        if verbose is True:
+            print(f"Download failed: {exc!r}", url)
+        return None
+    finally:
+        await response.aclose()
+
+    def parse_and_write():
+        spectrum = read_ascii_spectrum(lines, dtype=dtype)
+        if len(spectrum[0]) == 0:
+            if verbose is True:
+                print("No data found in the file", url)
+            return None
+        write_spectrum(outfile, *spectrum)
+        return spectrum
+
+    return await asyncio.to_thread(parse_and_write)
+
+
+async def get_target_response(iau_name, verbose=False):
+    """Obtains the response from a given target's Wiserep URL.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target (e.g. 2020xne).
+    verbose: bool, default 'False'
+        Whether to print the errors.
+
+    Returns
+    -------
+    response: httpx.Response
+        Response object.
+    """
+    name_index = get_name_index()
+    # known object: go straight to its page
+    target_url = name_index.get_url(iau_name)
+    if target_url is not None:
+        response = await get_response(target_url, verbose)
+        if response is not None:
+            return response
+
+    target_url = f"https://www.wiserep.org/iauname/{iau_name}"
+    response = await get_response(target_url, verbose)
+    if response is None:
+        # try internal survey name
+        target_url = f"https://www.wiserep.org/internal-name/{iau_name}"
+        response = await get_response(target_url, verbose)
+
+        if response is None:
+            return None
+
+    # remember the object ID if the name was redirected to the object page
+    match = re.search(r"/object/(\d+)", str(response.url))
+    if match is not None:
+        name_index.add(iau_name, match.group(1))
+
+    return response
+
+
+async def get_target_record(iau_name, verbose=False):
+    """Obtains the information of a target's Wiserep webpage.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target (e.g. 2020xne).
+    verbose: bool, default 'False'
+        If True, print some of the intermediate information
+
+    Returns
+    -------
+    record: TargetRecord
+        The target's information. Returns None if the webpage
+        could not be loaded.
+    """
+    response = await get_target_response(iau_name, verbose)
+    if response is None:
+        return None
+
+    record = parse_target_page(response.text)
+    # the aliases of the target are found without extra requests
+    get_name_index().add_record(iau_name, record)
+    return record
+
+
+async def get_target_property(iau_name, property_name, verbose=False):
+    """Obtains the target's properties from Wiserep.
+
+    See ``wiserep_api.get_target_property``.
+
+    Returns
+    -------
+    target_properties: str, float or list
+        The values of the target's properties.
+    """
+    if isinstance(property_name, str):
+        properties_list = [property_name]
+    else:
+        properties_list = property_name
+
+    for property in properties_list:
+        assert property in valid_properties, f"Not a valid property: '{property}'"
+
+    record = await get_target_record(iau_name, verbose)
+    if record is None:
+        return None
+
+    target_properties = [record.get(property) for property in properties_list]
+
+    if len(target_properties) == 1:
+        target_properties = target_properties[0]
+
+    return target_properties
+
+
+async def get_target_class(iau_name, verbose=False):
+    """Obtains the target's classification (type) from Wiserep.
+
+    Returns
+    -------
+    target_class: str
+        The target's classification. Returns 'Unknown' if not found.
+    """
+    record = await get_target_record(iau_name, verbose)
+    if record is None:
+        print(f"Could not load the webpage of {iau_name}")
+        return "Unknown"
+
+    target_class = get_class_from_record(record)
+    if target_class is None:
+        print(f"Target classification not found: {iau_name}")
+        return "Unknown"
+
+    return target_class
+
+
+async def _gather(*coroutines):
+    """Like ``asyncio.gather``, but the other tasks are cancelled (and
+    awaited) as soon as one of them fails, so no download is left running
+    in the background."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _fetch_spectrum(url, outfile, file_kind, manifest, skip_existing=False, verbose=False):
+    """Downloads a spectrum (ASCII or FITS), unless it is up to date.
+
+    See ``wiserep_api.spectra._fetch_spectrum``.
+    """
+    basename = os.path.basename(outfile)
+    remote_info = None
+    if skip_existing is True:
+        remote_info = await get_remote_info("http://" + url, verbose)
+        if _is_up_to_date(manifest.get(basename), outfile, remote_info) is True:
+            if verbose is True:
+                print(f"Already downloaded: {basename}")
+            return True
+
+    if file_kind == "ascii":
+        downloaded = await download_ascii_spectrum("http://" + url, outfile, verbose=verbose)
+    else:
+        downloaded = await download_file("http://" + url, outfile, verbose=verbose)
+    if downloaded is None:
+        return False
+
+    sha256 = await asyncio.to_thread(_file_sha256, outfile)
+    _link_duplicate(outfile, sha256, manifest)
+    if remote_info is None:
+        remote_info = {"etag": None, "size": None}
+    manifest[basename] = {
+        "url": url,
+        "size": os.path.getsize(outfile),
+        "sha256": sha256,
+        "etag": remote_info["etag"],
+        "remote_size": remote_info["size"],
+    }
+    return True
+
+
+async def download_target_spectra(
+    iau_name,
+    file_type=None,
+    exclude=None,
+    include=None,
+    skip_existing=False,
+    verbose=False,
+    record=None,
+    spectra_dir="spectra",
+    query=None,
+):
+    """Downloads the target's spectra from Wiserep.
+
+    The spectra of the target are downloaded concurrently. See
+    ``wiserep_api.download_target_spectra`` for the parameters
+    (``dry_run`` is only available there).
+
+    Returns
+    -------
+    downloaded_files: list
+        Names of the downloaded (or already present) files. Returns
+        None if the target's webpage could not be loaded.
+    """
+    os.makedirs(spectra_dir, exist_ok=True)
+
+    if query is not None and file_type is None:
+        file_type = query.file_type
+    assert file_type in [None, "ascii", "fits"], "not a valide file type"
+
+    # target's webpage
+    if record is None:
+        record = await get_target_record(iau_name, verbose)
+    if record is None:
+        print(f"Could not load the webpage of {iau_name}")
+        return None
+
+    spec_table = record.spectra_table
+    txt_urls, fits_urls = record.ascii_urls, record.fits_urls
+    if query is not None:
+        spec_table = query.select(spec_table)
+        txt_urls = select_urls(txt_urls, spec_table, "ascii")
+        fits_urls = select_urls(fits_urls, spec_table, "fits")
+
+    obj_dir = os.path.join(spectra_dir, iau_name)
+    manifest = _load_download_manifest(obj_dir)
+
+    async def fetch_all(urls, file_kind):
+        urls = _filter_urls(urls, exclude, include, verbose)
+        if len(urls) > 0:
+            os.makedirs(obj_dir, exist_ok=True)
+        outfiles = [os.path.join(obj_dir, os.path.basename(url)) for url in urls]
+        available = await _gather(
+            *[
+                _fetch_spectrum(url, outfile, file_kind, manifest, skip_existing, verbose)
+                for url, outfile in zip(urls, outfiles)
+            ]
+        )
+        files = []
+        for url, outfile, is_available in zip(urls, outfiles, available):
+            if is_available is False:
+                print(f"Nothing found in {url}")
+                continue
+            files.append(os.path.basename(outfile))
+        return files
+
+    ascii_files = fits_files = None
+    if file_type == "ascii" or file_type is None:
+        ascii_files = await fetch_all(txt_urls, "ascii")
+    if file_type == "fits" or file_type is None:
+        fits_files = await fetch_all(fits_urls, "fits")
+
+    return _save_spectra_info(obj_dir, manifest, spec_table, ascii_files, fits_files)
+
+
+async def _fetch_page(spec_type, page):
+    """Downloads a search page and extracts the names of the targets."""
+    response = await get_response(_search_url(spec_type, page))
+    if response is None:
+        return None
+    entries = _get_page_entries(response.text)
+    _index_entries(entries)
+    return [name for name, _ in entries]
+
+
+async def download_sn_list(spec_type, workers=4, resume=True):
+    """Downloads a list of all the targets of a given spectral type.
+
+    The search pages are downloaded concurrently, ``workers`` pages at
+    a time, with the same checkpoint manifest as
+    ``wiserep_api.download_sn_list``.
+
+    Parameters
+    ----------
+    spec_type : int or str
+        Spectral type, e.g. ``SN Ia`` or ``3``.
+    workers : int, default ``4``
+        Number of pages downloaded at the same time.
+    resume : bool, default ``True``
+        Whether to resume an interrupted crawl.
+
+    Returns
+    -------
+    sne_list : list
+        Names of the targets. Returns None if the crawl was interrupted.
+    """
+    spec_type, spec_directory, manifest_file, manifest, done_pages = _start_crawl(
+        spec_type, resume
+    )
+
+    while True:
+        window = _next_pages(manifest, done_pages, workers)
+        if len(window) == 0:
+            break
+
+        pages_names = await _gather(*[_fetch_page(spec_type, i) for i in window])
+        for i, names in zip(window, pages_names):
+            if names is None:
+                # keep the pages of the window stored before the failed one
+                manifest["pages"] = sorted(done_pages)
+                _save_manifest(manifest, manifest_file)
+                print(f"Could not load the webpage: {_search_url(spec_type, i)}")
+                print("Run again to resume the search.")
+                return None
+            _store_page(spec_directory, manifest, done_pages, i, names)
+
+        manifest["pages"] = sorted(done_pages)
+        _save_manifest(manifest, manifest_file)
+
+    return _merge_pages(spec_type, spec_directory, manifest, manifest_file)
@@ -1,7 +1,322 @@
+import os
+import re
+import time
+import hashlib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from wiserep_api.cache import ResponseCache
+from wiserep_api.index import get_name_index
+from wiserep_api.metrics import record_request
+
+# ID of your Bot:
+YOUR_BOT_ID = 1234
+# name of your Bot:
+YOUR_BOT_NAME = "My_Bot1"
+# API key of your Bot:
+api_key = "604d60d302f86eb38fd1407abe41d05b438043bd"
+
+# URL of Wiserep, replaced by the ``base_url`` of the client (if given)
+wiserep_url = "https://www.wiserep.org"
+
+http_errors = {
+    304: "Error 304: Not Modified: There was no new data to return.",
+    400: "Error 400: Bad Request: The request was invalid. "
+    "An accompanying error message will explain why.",
+    403: "Error 403: Forbidden: The request is understood, but it has "
+    "been refused. An accompanying error message will explain why.",
+    404: "Error 404: Not Found: The URI requested is invalid or the "
+    "resource requested, such as a category, does not exists.",
+    500: "Error 500: Internal Server Error: Something is broken.",
+    503: "Error 503: Service Unavailable.",
+}
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces out requests to the same host.
+
+    Parameters
+    ----------
+    rate: float or None
+        Maximum number of requests per second per host. If ``None``,
+        no limit is applied.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        """Blocks until a request to ``host`` is allowed."""
+        if not self.rate:
+            return
+
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class WiserepClient:
+    """HTTP client used for every request made to Wiserep.
 
+    Keeps a pool of keep-alive connections, retries transient errors
+    (with exponential backoff that respects ``Retry-After``) and limits
+    the request rate per host.
+
+    Parameters
+    ----------
+    timeout: float or tuple, default ``30``
+        Timeout in seconds of each request. A ``(connect, read)`` tuple
+        can also be given.
+    retries: int, default ``5``
+        Maximum number of retries for failed connections and for the
+        status codes in ``retry_status``.
+    backoff_factor: float, default ``0.5``
+        Backoff factor between retries (``backoff_factor * 2**n`` seconds).
+    retry_status: tuple, default ``(429, 500, 502, 503, 504)``
+        HTTP status codes that trigger a retry.
+    rate_limit: float, optional
+        Maximum number of requests per second per host.
+    pool_maxsize: int, default ``10``
+        Maximum number of simultaneous connections per host. Extra
+        requests wait for a free connection.
+    cache: ResponseCache or str, optional
+        Cache for the responses, or the path of its database. By
+        default, responses are not cached.
+    base_url: str, optional
+        URL that replaces ``https://www.wiserep.org`` in every request,
+        e.g. a mirror or a local server (see ``benchmarks/``).
+    """
+
+    def __init__(
+        self,
+        timeout=30,
+        retries=5,
+        backoff_factor=0.5,
+        retry_status=(429, 500, 502, 503, 504),
+        rate_limit=None,
+        pool_maxsize=10,
+        cache=None,
+        base_url=None,
+    ):
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/") if base_url is not None else None
+        if isinstance(cache, str):
+            cache = ResponseCache(cache)
+        self.cache = cache
+        self.rate_limiter = RateLimiter(rate_limit)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_status,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=4,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": 'tns_marker{"tns_id":'
+                + str(YOUR_BOT_ID)
+                + ', "type":"bot",'
+                ' "name":"' + YOUR_BOT_NAME + '"}'
+            }
+        )
+
+    def _rewrite_url(self, url):
+        """Replaces the Wiserep URL by ``base_url`` (if given)."""
+        if self.base_url is None:
+            return url
+        # the spectra URLs are requested with plain HTTP
+        for prefix in (wiserep_url, wiserep_url.replace("https://", "http://")):
+            if url.startswith(prefix):
+                return self.base_url + url[len(prefix):]
+        return url
+
+    def get(self, url, use_cache=True, **kwargs):
+        """Sends a GET request through the pooled session.
+
+        If the client has a cache, fresh cached responses are returned
+        without contacting the server and stale ones are revalidated.
+        Streamed requests are never cached.
+
+        Parameters
+        ----------
+        url: str
+            URL to request.
+        use_cache: bool, default ``True``
+            Whether to use the cache (if any) for this request.
+        **kwargs:
+            Extra arguments passed to ``requests.Session.get``.
+
+        Returns
+        -------
+        response: requests.Response
+            Response object.
+        """
+        url = self._rewrite_url(url)
+        kwargs.setdefault("timeout", self.timeout)
+        cache = self.cache
+        if use_cache is False or kwargs.get("stream") is True:
+            cache = None
+
+        start = time.perf_counter()
+        entry = None
+        if cache is not None:
+            entry = cache.get(url)
+            if entry is not None:
+                if cache.is_fresh(entry):
+                    response = cache.to_response(entry)
+                    _record_response(url, response, start, from_cache=True)
+                    return response
+                headers = dict(kwargs.pop("headers", None) or {})
+                headers.update(cache.validation_headers(entry))
+                kwargs["headers"] = headers
+
+        self.rate_limiter.wait(urlparse(url).netloc)
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.exceptions.RequestException as exc:
+            record_request(url, time.perf_counter() - start, error=repr(exc))
+            raise
+
+        if cache is not None:
+            if entry is not None and response.status_code == 304:
+                cache.touch(url)
+                _record_response(url, response, start, from_cache=True)
+                return cache.to_response(entry)
+            if response.status_code == 200:
+                cache.put(url, response)
+        _record_response(url, response, start)
+        return response
 
-def get_response(url, verbose=False):
+    def head(self, url, **kwargs):
+        """Sends a HEAD request through the pooled session.
+
+        Parameters
+        ----------
+        url: str
+            URL to request.
+        **kwargs:
+            Extra arguments passed to ``requests.Session.head``.
+
+        Returns
+        -------
+        response: requests.Response
+            Response object.
+        """
+        url = self._rewrite_url(url)
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("allow_redirects", True)
+        start = time.perf_counter()
+        self.rate_limiter.wait(urlparse(url).netloc)
+        try:
+            response = self.session.head(url, **kwargs)
+        except requests.exceptions.RequestException as exc:
+            record_request(url, time.perf_counter() - start, error=repr(exc), method="HEAD")
+            raise
+        _record_response(url, response, start, method="HEAD")
+        return response
+
+    def close(self):
+        """Closes all the pooled connections."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def _record_response(url, response, start, from_cache=False, method="GET"):
+    """Records the metrics of a response (see ``wiserep_api.metrics``)."""
+    retries = 0
+    retry = getattr(response.raw, "retries", None)
+    if retry is not None:
+        retries = len(retry.history)
+    if method == "HEAD":
+        n_bytes = 0
+    elif response._content is not False:
+        n_bytes = len(response._content or b"")
+    else:
+        # streamed response: the body is not read yet
+        n_bytes = int(response.headers.get("Content-Length") or 0)
+    record_request(
+        url,
+        time.perf_counter() - start,
+        status=response.status_code,
+        n_bytes=n_bytes,
+        retries=retries,
+        from_cache=from_cache,
+        method=method,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the client shared by all the functions of the package.
+
+    Returns
+    -------
+    client: WiserepClient
+        Shared client. It is created with the default configuration
+        on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = WiserepClient()
+    return _client
+
+
+def set_client(client=None, **kwargs):
+    """Replaces the client shared by all the functions of the package.
+
+    Parameters
+    ----------
+    client: WiserepClient, optional
+        New client. If not given, one is created with ``kwargs``.
+    **kwargs:
+        Arguments passed to ``WiserepClient`` (e.g. ``rate_limit=2``).
+
+    Returns
+    -------
+    client: WiserepClient
+        The new shared client.
+    """
+    global _client
+    if client is None:
+        client = WiserepClient(**kwargs)
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
+    return client
+
+
+def get_response(url, verbose=False, **kwargs):
     """Obtains the response from a given Wiserep URL.
 
     Parameters
@@ -10,46 +325,142 @@ def get_response(url, verbose=False):
         Wiserep URL.
     verbose: bool, default 'False'
         Whether to print the errors.
+    **kwargs:
+        Extra arguments passed to ``WiserepClient.get``
+        (e.g. ``stream=True``).
 
     Returns
     -------
     response: requests.Response
         Response object.
     """
-    # ID of your Bot:
-    YOUR_BOT_ID = 1234
-    # name of your Bot:
-    YOUR_BOT_NAME = "My_Bot1"
-    # API key of your Bot:
-    api_key = "604d60d302f86eb38fd1407abe41d05b438043bd"
-
-    headers = {
-        "User-Agent": 'tns_marker{"tns_id":' + str(YOUR_BOT_ID) + ', "type":"bot",'
-        ' "name":"' + YOUR_BOT_NAME + '"}'
-    }
-
-    http_errors = {
-        304: "Error 304: Not Modified: There was no new data to return.",
-        400: "Error 400: Bad Request: The request was invalid. "
-        "An accompanying error message will explain why.",
-        403: "Error 403: Forbidden: The request is understood, but it has "
-        "been refused. An accompanying error message will explain why.",
-        404: "Error 404: Not Found: The URI requested is invalid or the "
-        "resource requested, such as a category, does not exists.",
-        500: "Error 500: Internal Server Error: Something is broken.",
-        503: "Error 503: Service Unavailable.",
-    }
-
-    ###############################################################
-    response = requests.get(url, headers=headers)
+    try:
+        response = get_client().get(url, **kwargs)
+    except requests.exceptions.RequestException as exc:
+        if verbose is True:
+            print(f"Request failed: {exc}", url)
+        return None
 
     if response.status_code == 200:
         return response
     else:
         if verbose is True:
-            print(http_errors[response.status_code], url)
+            error = http_errors.get(
+                response.status_code, f"Error {response.status_code}"
+            )
+            print(error, url)
+        return None
+
+
+def get_remote_info(url, verbose=False):
+    """Obtains the ``ETag`` and size of a remote file without downloading it.
+
+    Parameters
+    ----------
+    url: str
+        URL of the file.
+    verbose: bool, default 'False'
+        Whether to print the errors.
+
+    Returns
+    -------
+    remote_info: dict
+        ``etag`` and ``size`` of the file (None if not given by the
+        server). Returns None if the request failed.
+    """
+    try:
+        response = get_client().head(url)
+    except requests.exceptions.RequestException as exc:
+        if verbose is True:
+            print(f"Request failed: {exc}", url)
+        return None
+
+    if response.status_code != 200:
+        if verbose is True:
+            error = http_errors.get(
+                response.status_code, f"Error {response.status_code}"
+            )
+            print(error, url)
         return None
-    
+
+    size = response.headers.get("Content-Length")
+    remote_info = {
+        "etag": response.headers.get("ETag"),
+        "size": int(size) if size is not None else None,
+    }
+    return remote_info
+
+
+def download_file(url, outfile, expected_size=None, sha256=None, verbose=False):
+    """Downloads a file byte for byte, streaming it to disk.
+
+    The file is first written to ``<outfile>.part`` and only renamed to
+    ``outfile`` when complete, so an interrupted download never leaves a
+    truncated file behind.
+
+    Parameters
+    ----------
+    url: str
+        URL of the file.
+    outfile: str
+        Output file.
+    expected_size: int, optional
+        Expected size in bytes. By default, the ``Content-Length``
+        header (if any) is used.
+    sha256: str, optional
+        Expected SHA-256 checksum (hexadecimal).
+    verbose: bool, default 'False'
+        Whether to print the errors.
+
+    Returns
+    -------
+    file_info: dict
+        ``size``, ``sha256`` and ``etag`` of the downloaded file.
+        Returns None if the download failed or did not pass the checks.
+    """
+    response = get_response(url, verbose, use_cache=False, stream=True)
+    if response is None:
+        return None
+
+    if expected_size is None and "Content-Length" in response.headers:
+        if response.headers.get("Content-Encoding") is None:
+            expected_size = int(response.headers["Content-Length"])
+
+    tmp_file = outfile + ".part"
+    checksum = hashlib.sha256()
+    size = 0
+    try:
+        with response, open(tmp_file, "wb") as fp:
+            for chunk in response.iter_content(chunk_size=2**16):
+                fp.write(chunk)
+                checksum.update(chunk)
+                size += len(chunk)
+    except requests.exceptions.RequestException as exc:
+        if verbose is True:
+            print(f"Download failed: {exc}", url)
+        os.remove(tmp_file)
+        return None
+
+    error = None
+    if expected_size is not None and size != expected_size:
+        error = f"size mismatch ({size} != {expected_size} bytes)"
+    elif sha256 is not None and checksum.hexdigest() != sha256.lower():
+        error = "checksum mismatch"
+    if error is not None:
+        if verbose is True:
+            print(f"Download failed: {error}", url)
+        os.remove(tmp_file)
+        return None
+
+    os.replace(tmp_file, outfile)
+    file_info = {
+        "size": size,
+        "sha256": checksum.hexdigest(),
+        "etag": response.headers.get("ETag"),
+    }
+    return file_info
+
+
 def get_target_response(iau_name, verbose=False):
     """Obtains the response from a given target's Wiserep URL.
 
@@ -65,6 +476,14 @@ def get_target_response(iau_name, verbose=False):
     response: requests.Response
         Response object.
     """
+    name_index = get_name_index()
+    # known object: go straight to its page
+    target_url = name_index.get_url(iau_name)
+    if target_url is not None:
+        response = get_response(target_url, verbose)
+        if response is not None:
+            return response
+
     target_url = f"https://www.wiserep.org/iauname/{iau_name}"
     response = get_response(target_url, verbose)
     if response is None:
@@ -74,7 +493,12 @@ def get_target_response(iau_name, verbose=False):
 
         if response is None:
             return None
-        
+
+    # remember the object ID if the name was redirected to the object page
+    match = re.search(r"/object/(\d+)", response.url or "")
+    if match is not None:
+        name_index.add(iau_name, match.group(1))
+
     return response
 
 
@@ -94,6 +518,13 @@ def _get_object_id(iau_name, verbose=False):
         The object's Wiserep ID. Returns 'Unknown' if not found
         or None if there is a problem of some other kind.
     """
+    name_index = get_name_index()
+    obj_id = name_index.get_id(iau_name)
+    if obj_id is not None:
+        if verbose:
+            print("Object ID (Wiserep):", obj_id)
+        return obj_id
+
     # look for the target ID in the search webpage
     wiserep_search_url = "https://www.wiserep.org/search?"
     search_name = iau_name.replace('+', '%2B')  # is this an html thing?
@@ -116,5 +547,62 @@ def _get_object_id(iau_name, verbose=False):
 
     if obj_id is None:
         print(f"No target with this name found on Wiserep: {iau_name}")
-    
+    else:
+        name_index.add(iau_name, obj_id)
+
     return obj_id
+
+
+def map_targets(func, iau_names, workers=4, **kwargs):
+    """Applies a function to multiple targets with a pool of threads.
+
+    Parameters
+    ----------
+    func: callable
+        Function that takes the IAU name as first argument.
+    iau_names: iterable
+        IAU names of the targets. At most ``2 * workers`` of them are
+        queued at a time.
+    workers: int, default ``4``
+        Number of threads.
+    **kwargs:
+        Extra arguments passed to ``func``.
+
+    Yields
+    ------
+    iau_name: str
+        IAU name of the target.
+    output: any
+        Output of ``func`` or None if it failed.
+    error: str or None
+        Error message if ``func`` raised an exception.
+    elapsed: float
+        Time in seconds spent on the target.
+    """
+
+    def timed_func(iau_name):
+        start = time.monotonic()
+        try:
+            output, error = func(iau_name, **kwargs), None
+        except Exception as exc:
+            output, error = None, f"{type(exc).__name__}: {exc}"
+        return output, error, time.monotonic() - start
+
+    # only a few targets are queued at a time, so that stopping early
+    # (closed generator or Ctrl-C) does not wait for the whole list
+    names = iter(iau_names)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+    try:
+        for name in itertools.islice(names, 2 * workers):
+            futures[executor.submit(timed_func, name)] = name
+        while len(futures) > 0:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                for next_name in itertools.islice(names, 1):
+                    futures[executor.submit(timed_func, next_name)] = next_name
+                output, error, elapsed = future.result()
+                yield name, output, error, elapsed
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,260 @@
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from wiserep_api.snid import _get_spectrum_files
+
+# columns of the spectra table kept in the archive index
+metadata_columns = {
+    "Spec. ID": "spec_id",
+    "Obs-date": "obs_date",
+    "Telescope": "telescope",
+    "Instrument": "instrument",
+    "Group": "group",
+    "Reducer": "reducer",
+}
+index_columns = ["target", "file"] + list(metadata_columns.values()) + ["start", "length"]
+array_names = ["wave", "flux", "flux_err"]
+
+# fixed size of the NPY header, so it can be written once the length is known
+_npy_header_size = 128
+
+
+class _NpyWriter:
+    """Appends arrays to a 1D NPY file of unknown final length."""
+
+    def __init__(self, path, dtype=np.float32):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._fp = open(path, "wb")
+        self._fp.write(b"\0" * _npy_header_size)
+
+    def write(self, array):
+        array = np.ascontiguousarray(array, dtype=self.dtype)
+        self._fp.write(array.tobytes())
+        self.length += len(array)
+
+    def close(self):
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.length,),
+            }
+        ).encode("latin1")
+        # magic string, version 1.0 and header length, padded with spaces
+        preamble = np.lib.format.MAGIC_PREFIX + b"\x01\x00"
+        header_length = _npy_header_size - len(preamble) - 2
+        header = header.ljust(header_length - 1) + b"\n"
+        self._fp.seek(0)
+        self._fp.write(preamble + header_length.to_bytes(2, "little") + header)
+        self._fp.close()
+
+
+def _read_spectrum(spectrum_file):
+    """Reads the wavelength, flux and flux error of a spectrum saved by
+    the downloader (flux error is NaN if not included)."""
+    spec_df = pd.read_csv(spectrum_file, dtype=float)
+    if "flux_err" not in spec_df.columns:
+        spec_df["flux_err"] = np.nan
+    return [spec_df[name].to_numpy(dtype=np.float32) for name in array_names]
+
+
+def _target_metadata(obj_dir):
+    """Metadata of a target's spectra, by ASCII file name."""
+    info_file = os.path.join(obj_dir, "downloaded_spectra_info.csv")
+    if os.path.isfile(info_file) is False:
+        return {}
+    spec_table = pd.read_csv(info_file, dtype=str, keep_default_na=False)
+    if "Spectrum ascii File" not in spec_table.columns:
+        return {}
+    metadata = {}
+    for _, row in spec_table.iterrows():
+        values = {
+            column: row.get(table_column, "")
+            for table_column, column in metadata_columns.items()
+        }
+        # IDs read as floats by pandas (e.g. if some are missing)
+        if values["spec_id"].endswith(".0"):
+            values["spec_id"] = values["spec_id"][:-2]
+        metadata[row["Spectrum ascii File"]] = values
+    return metadata
+
+
+def build_archive(spectra_dir="spectra", archive_dir="spectra_archive", targets=None):
+    """Packs the downloaded spectra into a single archive.
+
+    The wavelength, flux and flux error of all the spectra are stored
+    as float32 in ``wave.npy``, ``flux.npy`` and ``flux_err.npy``, one
+    spectrum after the other. ``index.csv`` holds the target, file name,
+    metadata from the spectra table (Spec. ID, date, telescope,
+    instrument, group and reducer) and the position of each spectrum
+    in the arrays. The spectra are read one at a time, so the archive
+    can be larger than the available memory.
+
+    Parameters
+    ----------
+    spectra_dir: str, default ``spectra``
+        Directory with the spectra, as saved by ``download_target_spectra``.
+    archive_dir: str, default ``spectra_archive``
+        Output directory. An existing archive is replaced.
+    targets: list, optional
+        Targets to include. By default, all the targets in ``spectra_dir``.
+
+    Returns
+    -------
+    n_spectra: int
+        Number of spectra in the archive.
+    """
+    if targets is None:
+        targets = sorted(
+            os.path.basename(obj_dir)
+            for obj_dir in glob.glob(os.path.join(spectra_dir, "*"))
+            if os.path.isdir(obj_dir)
+        )
+
+    # the archive is written next to its final location and then renamed
+    tmp_dir = archive_dir.rstrip(os.sep) + ".part"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    writers = {
+        name: _NpyWriter(os.path.join(tmp_dir, f"{name}.npy")) for name in array_names
+    }
+    rows = []
+    start = 0
+    for target in targets:
+        obj_dir = os.path.join(spectra_dir, target)
+        metadata = _target_metadata(obj_dir)
+        for spectrum_file in sorted(_get_spectrum_files(obj_dir)):
+            basename = os.path.basename(spectrum_file)
+            arrays = _read_spectrum(spectrum_file)
+            for name, array in zip(array_names, arrays):
+                writers[name].write(array)
+            length = len(arrays[0])
+
+            row = {"target": target, "file": basename}
+            row.update(metadata.get(basename, {}))
+            row.update({"start": start, "length": length})
+            rows.append(row)
+            start += length
+    for writer in writers.values():
+        writer.close()
+
+    index_df = pd.DataFrame(rows, columns=index_columns)
+    index_df.to_csv(os.path.join(tmp_dir, "index.csv"), index=False)
+
+    if os.path.isdir(archive_dir):
+        shutil.rmtree(archive_dir)
+    os.replace(tmp_dir, archive_dir)
+
+    return len(index_df)
+
+
+def _load_array(path):
+    """Memory-maps an array of the archive."""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class SpectraArchive:
+    """Reader of an archive created with ``build_archive``.
+
+    The arrays are memory-mapped, so the spectra are read from disk only
+    when accessed and are returned as read-only views (without copies).
+
+    Parameters
+    ----------
+    archive_dir: str, default ``spectra_archive``
+        Directory of the archive.
+
+    Examples
+    --------
+    >>> archive = SpectraArchive("spectra_archive")
+    >>> wave, flux, flux_err = archive[0]
+    >>> for wave, flux, flux_err in archive.get_target("2004eo"):
+    ...     pass
+    """
+
+    def __init__(self, archive_dir="spectra_archive"):
+        self.archive_dir = archive_dir
+        self.wave, self.flux, self.flux_err = [
+            _load_array(os.path.join(archive_dir, f"{name}.npy")) for name in array_names
+        ]
+        self.index = pd.read_csv(
+            os.path.join(archive_dir, "index.csv"),
+            dtype={column: str for column in index_columns[:-2]},
+            keep_default_na=False,
+        )
+        self._starts = self.index["start"].to_numpy()
+        self._ends = self._starts + self.index["length"].to_numpy()
+
+        self._by_target = {}
+        self._by_spec_id = {}
+        for i, (target, spec_id) in enumerate(zip(self.index.target, self.index.spec_id)):
+            self._by_target.setdefault(target, []).append(i)
+            if spec_id != "":
+                self._by_spec_id[spec_id] = i
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """Wavelength, flux and flux error of the ``i``-th spectrum."""
+        start, end = self._starts[i], self._ends[i]
+        return self.wave[start:end], self.flux[start:end], self.flux_err[start:end]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def targets(self):
+        """Targets in the archive."""
+        return list(self._by_target.keys())
+
+    def get_target(self, target):
+        """Spectra of a target.
+
+        Parameters
+        ----------
+        target: str
+            Name of the target, e.g. ``2004eo``.
+
+        Returns
+        -------
+        spectra: list
+            ``(wave, flux, flux_err)`` tuples. Their metadata are in
+            ``archive.index`` (see ``get_target_index``).
+        """
+        return [self[i] for i in self._by_target.get(target, [])]
+
+    def get_target_index(self, target):
+        """Rows of the index with the spectra of a target."""
+        return self.index.iloc[self._by_target.get(target, [])]
+
+    def get_spectrum(self, spec_id):
+        """Spectrum with a given Wiserep Spec. ID.
+
+        Parameters
+        ----------
+        spec_id: int or str
+            Spec. ID of the spectrum.
+
+        Returns
+        -------
+        spectrum: tuple
+            Wavelength, flux and flux error. None if not found.
+        """
+        i = self._by_spec_id.get(str(spec_id))
+        if i is None:
+            return None
+        return self[i]
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import requests
+
+
+class ResponseCache:
+    """Persistent cache of HTTP responses stored in a sqlite database.
+
+    Responses are keyed by URL. Entries younger than ``ttl`` are served
+    directly. Older entries are revalidated with the server using their
+    ``ETag``/``Last-Modified`` headers, so a "304 Not Modified" answer
+    costs only the request round trip. When the cache grows above
+    ``max_size``, the least recently used entries are evicted.
+
+    Parameters
+    ----------
+    path: str, default ``wiserep_cache.sqlite``
+        Path of the sqlite database.
+    ttl: float, default ``86400``
+        Time in seconds during which an entry is served without
+        contacting the server.
+    max_size: int, default ``2 * 1024**3``
+        Maximum size in bytes of the cached content.
+    """
+
+    def __init__(self, path="wiserep_cache.sqlite", ttl=86400, max_size=2 * 1024**3):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    headers TEXT,
+                    content BLOB,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored REAL,
+                    accessed REAL,
+                    size INTEGER
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)"
+            )
+
+    def get(self, url):
+        """Retrieves a cached entry.
+
+        Parameters
+        ----------
+        url: str
+            URL of the response.
+
+        Returns
+        -------
+        entry: dict or None
+            Cached entry or None if the URL is not cached.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, headers, content, etag, last_modified, stored "
+                "FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE url = ?",
+                    (time.time(), url),
+                )
+
+        keys = ["url", "headers", "content", "etag", "last_modified", "stored"]
+        entry = dict(zip(keys, row))
+        entry["headers"] = json.loads(entry["headers"])
+        return entry
+
+    def is_fresh(self, entry):
+        """Whether a cached entry can be used without revalidation."""
+        return time.time() - entry["stored"] < self.ttl
+
+    def put(self, url, response):
+        """Stores a successful response.
+
+        Parameters
+        ----------
+        url: str
+            URL of the response.
+        response: requests.Response
+            Response object.
+        """
+        content = response.content
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() in ["content-type", "etag", "last-modified"]
+        }
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    json.dumps(headers),
+                    content,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(content),
+                ),
+            )
+            self._evict()
+
+    def touch(self, url):
+        """Marks an entry as fresh (e.g. after a "304 Not Modified")."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET stored = ?, accessed = ? WHERE url = ?",
+                (now, now, url),
+            )
+
+    def validation_headers(self, entry):
+        """Headers for a conditional request that revalidates an entry."""
+        headers = {}
+        if entry["etag"] is not None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def to_response(self, entry):
+        """Builds a ``requests.Response`` from a cached entry."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response._content = entry["content"]
+        response.headers.update(entry["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers
+        )
+        response.from_cache = True
+        return response
+
+    def _evict(self):
+        """Removes the least recently used entries above ``max_size``."""
+        total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = self._conn.execute(
+            "SELECT url, size FROM responses ORDER BY accessed ASC"
+        ).fetchall()
+        expired = []
+        for url, size in rows:
+            if total_size <= self.max_size:
+                break
+            expired.append((url,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", expired)
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        """Closes the database connection."""
+        self._conn.close()
@@ -0,0 +1,312 @@
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from wiserep_api.api import map_targets
+from wiserep_api.index import get_name_index
+from wiserep_api.coords import angular_separation, crossmatch, parse_coords_deg
+from wiserep_api.properties import get_target_record, get_class_from_record
+from wiserep_api.search import sync_sn_list, _load_spectral_types
+
+catalog_columns = [
+    "name",
+    "obj_id",
+    "aliases",
+    "type",
+    "spec_type",
+    "redshift",
+    "host",
+    "ra",
+    "dec",
+    "n_spectra",
+    "updated",
+]
+
+
+def _count_spectra(record):
+    """Number of spectra of a target (ASCII and FITS versions count once)."""
+    urls = record.ascii_urls + record.fits_urls
+    return len({os.path.splitext(os.path.basename(url))[0] for url in urls})
+
+
+class Catalog:
+    """Local snapshot of the Wiserep objects metadata stored in sqlite.
+
+    The snapshot holds name, aliases, type, redshift, host, coordinates
+    and number of spectra of each object, with indices on type, redshift
+    and declination, so queries by type, redshift range and sky position
+    are answered locally.
+
+    Parameters
+    ----------
+    path: str, default ``wiserep_catalog.sqlite``
+        Path of the sqlite database.
+    """
+
+    def __init__(self, path="wiserep_catalog.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS objects (
+                    name TEXT PRIMARY KEY,
+                    obj_id TEXT,
+                    aliases TEXT,
+                    type TEXT,
+                    spec_type INTEGER,
+                    redshift REAL,
+                    host TEXT,
+                    ra REAL,
+                    dec REAL,
+                    n_spectra INTEGER,
+                    updated REAL
+                )"""
+            )
+            for column in ["type", "redshift", "dec"]:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{column} ON objects ({column})"
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def _known_names(self, max_age=None):
+        """Names in the catalog (updated less than ``max_age`` seconds ago)."""
+        query = "SELECT name FROM objects"
+        params = ()
+        if max_age is not None:
+            query += " WHERE updated >= ?"
+            params = (time.time() - max_age,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {row[0] for row in rows}
+
+    def _store(self, rows):
+        """Inserts or replaces rows of the catalog."""
+        placeholders = ", ".join("?" * len(catalog_columns))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO objects VALUES ({placeholders})",
+                [[row[column] for column in catalog_columns] for row in rows],
+            )
+
+    def update(self, spec_types=None, max_age=None, workers=4, chunk_size=200):
+        """Adds the objects of the given spectral types to the catalog.
+
+        Only objects that are not in the catalog yet (or were updated more
+        than ``max_age`` seconds ago) are downloaded, so running it again
+        refreshes the catalog incrementally. The names are listed with
+        ``sync_sn_list``, so only the search pages with objects added since
+        the previous run are downloaded (its sync state is saved under
+        ``wiserep/`` in the working directory).
+
+        Parameters
+        ----------
+        spec_types: list, optional
+            Spectral types, e.g. ``['SN Ia', 'SN II']``. By default,
+            all of them (see ``print_spectral_types()``).
+        max_age: float, optional
+            Objects updated more than ``max_age`` seconds ago are downloaded
+            again. By default, objects already in the catalog are kept.
+        workers: int, default ``4``
+            Number of objects downloaded at the same time.
+        chunk_size: int, default ``200``
+            Number of objects stored at a time.
+
+        Returns
+        -------
+        n_updated: int
+            Number of objects added or updated.
+        """
+        spectral_types = _load_spectral_types()
+        if spec_types is None:
+            spec_types = list(spectral_types.keys())
+        known_names = self._known_names(max_age)
+        name_index = get_name_index()
+
+        n_updated = 0
+        for spec_type in spec_types:
+            if isinstance(spec_type, str):
+                spec_type = spectral_types[spec_type]
+            result = sync_sn_list(spec_type)
+            if result is None:
+                print(f"Could not list the objects of spectral type {spec_type}")
+                continue
+            # every known name of the spectral type, not only the new ones, as
+            # the catalog might be missing (or have old) objects of previous syncs
+            _, _, sne_list = result
+            names = [name for name in sne_list if name not in known_names]
+
+            rows = []
+            for name, record, error, _ in map_targets(
+                get_target_record, names, workers
+            ):
+                if record is None:
+                    if error is not None:
+                        print(f"{name}: {error}")
+                    continue
+                (ra,), (dec,) = parse_coords_deg(record.coords_deg)
+                target_class = get_class_from_record(record)
+                obj_id = name_index.get_id(name)
+                aliases = []
+                if obj_id is not None:
+                    aliases = [
+                        alias
+                        for alias in name_index.get_names(obj_id)
+                        if alias != name
+                    ]
+                rows.append(
+                    {
+                        "name": name,
+                        "obj_id": obj_id,
+                        "aliases": ",".join(aliases),
+                        "type": target_class or "Unknown",
+                        "spec_type": spec_type,
+                        "redshift": record.redshift if record.redshift != "" else None,
+                        "host": record.host,
+                        "ra": None if np.isnan(ra) else ra,
+                        "dec": None if np.isnan(dec) else dec,
+                        "n_spectra": _count_spectra(record),
+                        "updated": time.time(),
+                    }
+                )
+                known_names.add(name)
+                if len(rows) >= chunk_size:
+                    self._store(rows)
+                    n_updated += len(rows)
+                    rows = []
+            self._store(rows)
+            n_updated += len(rows)
+
+        return n_updated
+
+    def query(
+        self,
+        types=None,
+        z_min=None,
+        z_max=None,
+        ra=None,
+        dec=None,
+        radius=None,
+        min_spectra=None,
+    ):
+        """Queries the catalog.
+
+        Parameters
+        ----------
+        types: str or list, optional
+            Classifications, e.g. ``'SN Ia'`` or ``['SN Ia', 'SN Ia-pec']``.
+        z_min: float, optional
+            Minimum redshift.
+        z_max: float, optional
+            Maximum redshift.
+        ra: float, optional
+            Right ascension of the cone search centre, in degrees.
+        dec: float, optional
+            Declination of the cone search centre, in degrees.
+        radius: float, optional
+            Radius of the cone search, in degrees.
+        min_spectra: int, optional
+            Minimum number of spectra.
+
+        Returns
+        -------
+        objects_df: pandas.DataFrame
+            Matching objects. For cone searches, the ``separation``
+            (in degrees) is included and the objects are sorted by it.
+        """
+        conditions, params = [], []
+        if types is not None:
+            if isinstance(types, str):
+                types = [types]
+            conditions.append(f"type IN ({', '.join('?' * len(types))})")
+            params += list(types)
+        if z_min is not None:
+            conditions.append("redshift >= ?")
+            params.append(z_min)
+        if z_max is not None:
+            conditions.append("redshift <= ?")
+            params.append(z_max)
+        if min_spectra is not None:
+            conditions.append("n_spectra >= ?")
+            params.append(min_spectra)
+
+        cone_search = ra is not None and dec is not None and radius is not None
+        if cone_search is True:
+            # declination band (uses the index), then RA band if far from the poles
+            conditions.append("dec BETWEEN ? AND ?")
+            params += [dec - radius, dec + radius]
+            if abs(dec) + radius < 89:
+                ra_radius = radius / np.cos(np.radians(abs(dec) + radius))
+                if ra_radius < 180:
+                    ra_min = (ra - ra_radius) % 360
+                    ra_max = (ra + ra_radius) % 360
+                    if ra_min <= ra_max:
+                        conditions.append("ra BETWEEN ? AND ?")
+                    else:
+                        # the band crosses RA = 0
+                        conditions.append("(ra >= ? OR ra <= ?)")
+                    params += [ra_min, ra_max]
+
+        query = "SELECT * FROM objects"
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            objects_df = pd.read_sql_query(query, self._conn, params=params)
+
+        if cone_search is True:
+            objects_df["separation"] = angular_separation(
+                ra, dec, objects_df.ra.values, objects_df.dec.values
+            )
+            objects_df = objects_df[objects_df.separation <= radius]
+            objects_df = objects_df.sort_values("separation").reset_index(drop=True)
+
+        return objects_df
+
+    def crossmatch(self, ra, dec, max_sep=1 / 3600):
+        """Matches coordinates (e.g. an external catalog) against the
+        objects of the catalog.
+
+        Parameters
+        ----------
+        ra: array
+            Right ascension of the coordinates to match, in degrees.
+        dec: array
+            Declination of the coordinates to match, in degrees.
+        max_sep: float, default ``1/3600``
+            Maximum separation in degrees of a match (1 arcsec by default).
+
+        Returns
+        -------
+        matches_df: pandas.DataFrame
+            One row per input coordinate with the ``name`` and ``type``
+            of the nearest object and their ``separation`` in degrees.
+            Columns are empty/NaN for coordinates without a match.
+        """
+        with self._lock:
+            objects_df = pd.read_sql_query(
+                "SELECT name, type, ra, dec FROM objects", self._conn
+            )
+        indices, separations = crossmatch(
+            ra, dec, objects_df.ra.values, objects_df.dec.values, max_sep
+        )
+
+        matched = indices >= 0
+        names = np.full(len(indices), None, dtype=object)
+        types = np.full(len(indices), None, dtype=object)
+        names[matched] = objects_df.name.values[indices[matched]]
+        types[matched] = objects_df.type.values[indices[matched]]
+        matches_df = pd.DataFrame(
+            {"name": names, "type": types, "separation": separations}
+        )
+        return matches_df
+
+    def close(self):
+        """Closes the database connection."""
+        self._conn.close()
@@ -0,0 +1,605 @@
+"""Command-line tool for bulk operations on Wiserep.
+
+Subcommands:
+
+- ``search``: names of the targets of a spectral type (resumable crawl).
+- ``sync``: new (and removed) targets of a spectral type since the last sync.
+- ``props``: properties of a list of targets.
+- ``spectra``: download of the spectra of a list of targets.
+- ``snid``: SNID fits of the downloaded spectra of a list of targets.
+
+The targets are read from the command line, from files or from the
+standard input (one per line, or JSON lines with a ``name`` or
+``target`` key, so the output of a command can be piped into another).
+The results are written as JSON lines to the standard output, while the
+progress is shown in the standard error. The targets completed by
+``props``, ``spectra`` and ``snid`` are recorded in a journal, so an
+interrupted job resumes where it stopped::
+
+    wiserep search "SN Ia" > sn_ia.jsonl
+    wiserep props -i sn_ia.jsonl --workers 8 --rate-limit 4 > props.jsonl
+    wiserep spectra -i sn_ia.jsonl --file-type ascii --output-dir data
+    wiserep snid -i sn_ia.jsonl --output-dir data --results-db data/snid.sqlite
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import contextlib
+
+from wiserep_api._version import __version__
+
+journal_dir = ".wiserep_journal"
+
+
+class Progress:
+    """Live progress and throughput of a job, shown in the standard error.
+
+    Parameters
+    ----------
+    total: int, optional
+        Number of items of the job (if known).
+    label: str, default ``targets``
+        Name of the items.
+    quiet: bool, default ``False``
+        Whether to hide the progress.
+    stream: file, optional
+        Where the progress is shown. By default, the standard error.
+    interval: float, default ``0.5``
+        Minimum time in seconds between updates. If the stream is not
+        a terminal, a line is written at most every 10 seconds.
+    """
+
+    def __init__(self, total=None, label="targets", quiet=False, stream=None, interval=0.5):
+        self.total = total
+        self.label = label
+        self.quiet = quiet
+        self.stream = stream if stream is not None else sys.stderr
+        self.interactive = self.stream.isatty()
+        self.interval = interval if self.interactive else 10.0
+        self.done = 0
+        self.errors = 0
+        self.skipped = 0
+        self.start_time = time.monotonic()
+        self._last_update = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, n=1, error=False, skipped=False):
+        """Counts processed items and refreshes the display."""
+        with self._lock:
+            self.done += n
+            if error is True:
+                self.errors += n
+            if skipped is True:
+                self.skipped += n
+            now = time.monotonic()
+            if now - self._last_update >= self.interval:
+                self._last_update = now
+                self._show()
+
+    def _status(self):
+        elapsed = time.monotonic() - self.start_time
+        processed = self.done - self.skipped
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        if self.total is not None:
+            status = f"{self.done}/{self.total} {self.label}"
+        else:
+            status = f"{self.done} {self.label}"
+        status += f" | {rate:.2f}/s | {self.errors} errors"
+        if self.skipped > 0:
+            status += f" | {self.skipped} already done"
+        if self.total is not None and rate > 0 and self.done < self.total:
+            remaining = (self.total - self.done) / rate
+            status += f" | ETA {time.strftime('%H:%M:%S', time.gmtime(remaining))}"
+        return status
+
+    def _show(self):
+        if self.quiet is True:
+            return
+        if self.interactive is True:
+            self.stream.write(f"\r\033[K{self._status()}")
+        else:
+            self.stream.write(self._status() + "\n")
+        self.stream.flush()
+
+    def close(self):
+        """Shows the final status."""
+        if self.quiet is True:
+            return
+        elapsed = time.monotonic() - self.start_time
+        if self.interactive is True:
+            self.stream.write("\r\033[K")
+        self.stream.write(f"{self._status()} | {elapsed:.1f} s\n")
+        self.stream.flush()
+
+
+class Journal:
+    """Record of the targets completed by a job (JSON lines).
+
+    Parameters
+    ----------
+    path: str
+        Journal file. It is created if it does not exist.
+    resume: bool, default ``True``
+        Whether to read the targets completed by previous runs.
+        Otherwise, the journal is started from scratch.
+    options: dict, optional
+        Options of the job that change its results. They are saved in
+        the first line of the journal, and a journal written with other
+        options is not resumed (a ``ValueError`` is raised).
+    """
+
+    def __init__(self, path, resume=True, options=None):
+        self.path = path
+        self.options = options
+        self.completed = set()
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        new_journal = resume is False or os.path.isfile(path) is False
+        if new_journal is False:
+            saved_options = None
+            with open(path, "r") as fp:
+                for i, line in enumerate(fp):
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # line cut by an interruption
+                    if i == 0 and "options" in entry:
+                        saved_options = entry["options"]
+                    elif entry.get("status") == "ok":
+                        self.completed.add(entry["target"])
+            # JSON round trip, so that e.g. tuples compare equal to lists
+            if saved_options != json.loads(json.dumps(options, default=str)):
+                raise ValueError(
+                    f"The journal {path} was written with other options ({saved_options}): "
+                    "use --no-resume to start again, or another --journal"
+                )
+        self._fp = open(path, "w" if new_journal is True else "a")
+        if new_journal is True:
+            self._fp.write(json.dumps({"options": options}, default=str) + "\n")
+            self._fp.flush()
+
+    def record(self, entry):
+        """Appends a result to the journal."""
+        self._fp.write(json.dumps(entry, default=str) + "\n")
+        self._fp.flush()
+        if entry.get("status") == "ok":
+            self.completed.add(entry["target"])
+
+    def close(self):
+        self._fp.close()
+
+
+def read_names(names=None, input_files=None, stdin=None):
+    """Reads the names of the targets.
+
+    Parameters
+    ----------
+    names: list, optional
+        Names given in the command line.
+    input_files: list, optional
+        Files with one name per line, or JSON lines with a ``name`` or
+        ``target`` key. ``-`` is the standard input.
+    stdin: file, optional
+        Standard input, read if no names or files are given and it
+        is not a terminal.
+
+    Returns
+    -------
+    names: list
+        Names without duplicates, in the given order.
+    """
+    stdin = stdin if stdin is not None else sys.stdin
+    if not names and not input_files and stdin is not None and not stdin.isatty():
+        input_files = ["-"]
+
+    lines = list(names or [])
+    for input_file in input_files or []:
+        if input_file == "-":
+            lines += stdin.read().splitlines()
+        else:
+            with open(input_file, "r") as fp:
+                lines += fp.read().splitlines()
+
+    all_names = []
+    for line in lines:
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            entry = json.loads(line)
+            line = entry.get("name", entry.get("target"))
+            if line is None:
+                continue
+        all_names.append(line)
+    return list(dict.fromkeys(all_names))
+
+
+def _configure_client(args):
+    """Sets the shared client according to the command-line options."""
+    from wiserep_api.api import set_client
+    from wiserep_api.index import set_name_index, default_filename
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = os.path.join(args.cache_dir, "wiserep_cache.sqlite")
+        # the IDs of the targets are kept for the next runs
+        set_name_index(os.path.join(args.cache_dir, default_filename))
+    set_client(
+        rate_limit=args.rate_limit,
+        pool_maxsize=max(10, args.workers),
+        cache=cache,
+        base_url=args.base_url,
+    )
+
+
+def _write(out, entry):
+    """Writes a result as a JSON line."""
+    out.write(json.dumps(entry, default=str) + "\n")
+    out.flush()
+
+
+def _run_targets(args, func, out):
+    """Applies a function to the targets with a pool of threads, with
+    progress, JSON-lines output and a journal.
+
+    ``func`` takes the name of a target and returns a dictionary with
+    its results (``status`` is added if not given).
+
+    Returns
+    -------
+    n_failed: int
+        Number of targets that failed.
+    """
+    from wiserep_api.api import map_targets
+
+    names = read_names(args.names, args.input)
+    options = {name: getattr(args, name) for name in ["base_url"] + args.journal_options}
+    journal_file = args.journal
+    if journal_file is None:
+        # one journal per set of options, as they change the results
+        key = hashlib.sha1(json.dumps(options, sort_keys=True, default=str).encode())
+        journal_file = os.path.join(
+            args.output_dir, journal_dir, f"{args.command}-{key.hexdigest()[:10]}.jsonl"
+        )
+    try:
+        journal = Journal(journal_file, resume=not args.no_resume, options=options)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return len(names)
+
+    pending = [name for name in names if name not in journal.completed]
+    progress = Progress(len(names), quiet=args.quiet)
+    progress.update(len(names) - len(pending), skipped=True)
+
+    n_failed = 0
+    try:
+        for name, output, error, elapsed in map_targets(func, pending, args.workers):
+            if error is not None:
+                entry = {"target": name, "status": "failed", "error": error}
+            else:
+                entry = {"target": name}
+                entry.update(output)
+                entry.setdefault("status", "ok")
+            entry["elapsed"] = round(elapsed, 3)
+
+            # written before being journaled, so that an interruption in
+            # between repeats the target instead of losing its result
+            _write(out, entry)
+            journal.record(entry)
+            failed = entry["status"] not in ("ok", "planned")
+            n_failed += failed
+            progress.update(error=failed)
+    finally:
+        progress.close()
+        journal.close()
+    return n_failed
+
+
+def _props(args, out):
+    from wiserep_api.properties import get_target_record, _record_to_row
+
+    properties = args.properties
+
+    def func(name):
+        record = get_target_record(name)
+        if record is None:
+            return {"status": "not found"}
+        row = _record_to_row(name, record, properties)
+        del row["target"]
+        # NaN is not valid JSON
+        return {key: None if value != value else value for key, value in row.items()}
+
+    return _run_targets(args, func, out)
+
+
+def _spectra(args, out):
+    from wiserep_api.spectra import download_target_spectra
+    from wiserep_api.selection import SpectraQuery
+
+    query = None
+    query_options = {
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "instruments": args.instruments,
+        "telescopes": args.telescopes,
+        "groups": args.groups,
+        "reducers": args.reducers,
+    }
+    if any(value is not None for value in query_options.values()) or args.one_per_night:
+        query = SpectraQuery(one_per_night=args.one_per_night, **query_options)
+    spectra_dir = os.path.join(args.output_dir, "spectra")
+
+    def func(name):
+        files = download_target_spectra(
+            name,
+            file_type=args.file_type,
+            exclude=args.exclude,
+            include=args.include,
+            skip_existing=args.skip_existing,
+            spectra_dir=spectra_dir,
+            query=query,
+            dry_run=args.dry_run,
+        )
+        if files is None:
+            return {"status": "not found"}
+        if args.dry_run is True:
+            # nothing is downloaded, so the target is not completed
+            return {
+                "status": "planned",
+                "files": list(files.file),
+                "bytes": int(files["size"].fillna(0).sum()),
+            }
+        return {"files": files}
+
+    return _run_targets(args, func, out)
+
+
+def _snid(args, out):
+    from wiserep_api.snid import run_snid, _get_spectrum_files
+
+    spectra_dir = os.path.join(args.output_dir, "spectra")
+
+    def func(name):
+        directory = os.path.join(spectra_dir, name)
+        if os.path.isdir(directory) is False or len(_get_spectrum_files(directory)) == 0:
+            # nothing to fit (yet): the target is retried by the next runs
+            return {"status": "not found", "spectra": []}
+        results = run_snid(
+            directory,
+            args.snid_command,
+            args.skip_fits,
+            timeout=args.timeout,
+            results_db=args.results_db,
+        )
+        spectra = []
+        for result in results:
+            spectrum = {"spectrum": os.path.basename(result.spectrum), "error": result.error}
+            if result.matches is not None and len(result.matches) > 0:
+                best = result.matches.sort_values("rlap", ascending=False).iloc[0]
+                spectrum.update(
+                    {"type": best["type"], "rlap": float(best["rlap"]), "z": float(best["z"])}
+                )
+            spectra.append(spectrum)
+        n_failed = sum(spectrum["error"] is not None for spectrum in spectra)
+        status = "ok" if n_failed == 0 else "failed"
+        return {"status": status, "n_failed": n_failed, "spectra": spectra}
+
+    return _run_targets(args, func, out)
+
+
+@contextlib.contextmanager
+def _working_directory(directory):
+    """Runs a block of code in another directory."""
+    cwd = os.getcwd()
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def _search(args, out):
+    from wiserep_api.search import download_sn_list
+    from wiserep_api.metrics import add_callback, remove_callback
+
+    progress = Progress(label="pages", quiet=args.quiet)
+
+    def callback(event):
+        if event["kind"] == "request" and event["category"] == "search":
+            progress.update(error=event["error"] is not None)
+
+    # the pages are downloaded in parallel, with a checkpoint manifest
+    # under the output directory to resume interrupted crawls
+    add_callback(callback)
+    try:
+        with _working_directory(args.output_dir):
+            sne_list = download_sn_list(
+                args.spec_type, workers=args.workers, resume=not args.no_resume
+            )
+    finally:
+        remove_callback(callback)
+        progress.close()
+    if sne_list is None:
+        print("Could not load a search page: run the same command again to resume",
+              file=sys.stderr)
+        return 1
+
+    for name in sne_list:
+        _write(out, {"name": name})
+    return 0
+
+
+def _sync(args, out):
+    from wiserep_api.search import sync_sn_list
+
+    # the sync state is saved under the output directory
+    with _working_directory(args.output_dir):
+        result = sync_sn_list(args.spec_type, full=args.full, max_pages=args.max_pages)
+    if result is None:
+        print("Could not load a search page", file=sys.stderr)
+        return 1
+
+    added, removed, sne_list = result
+    for name in added:
+        _write(out, {"name": name, "change": "added"})
+    for name in removed:
+        _write(out, {"name": name, "change": "removed"})
+    if args.quiet is False:
+        print(
+            f"{len(added)} added, {len(removed)} removed, {len(sne_list)} targets",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def _spec_type(value):
+    """Spectral type as an integer (if given as a number) or a name."""
+    return int(value) if value.isdigit() else value
+
+
+def build_parser():
+    """Parser of the command-line arguments."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=4,
+                        help="number of targets processed at the same time (default: 4)")
+    common.add_argument("--rate-limit", type=float, default=None,
+                        help="maximum requests per second to Wiserep")
+    common.add_argument("--cache-dir", default=None,
+                        help="directory of the persistent cache of responses and target IDs")
+    common.add_argument("--output-dir", default=".",
+                        help="directory of the downloaded files and journals (default: .)")
+    common.add_argument("--base-url", default=None,
+                        help="URL of a mirror of Wiserep (default: https://www.wiserep.org)")
+    common.add_argument("-o", "--output", default=None,
+                        help="file where the JSON lines are appended (default: stdout)")
+    common.add_argument("-q", "--quiet", action="store_true", help="hide the progress")
+
+    targets = argparse.ArgumentParser(add_help=False)
+    targets.add_argument("names", nargs="*", help="names of the targets")
+    targets.add_argument("-i", "--input", action="append", default=None,
+                         help="file with the names of the targets ('-' for stdin)")
+    targets.add_argument("--journal", default=None,
+                         help="journal of the completed targets (default: "
+                         f"OUTPUT_DIR/{journal_dir}/COMMAND-OPTIONS_HASH.jsonl)")
+    targets.add_argument("--no-resume", action="store_true",
+                         help="process again the targets completed by previous runs")
+
+    parser = argparse.ArgumentParser(
+        prog="wiserep", description="Bulk operations on Wiserep."
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser(
+        "search", parents=[common], help="list the targets of a spectral type"
+    )
+    search_parser.add_argument("spec_type", type=_spec_type,
+                               help="spectral type, e.g. 'SN Ia' or 3")
+    search_parser.add_argument("--no-resume", action="store_true",
+                               help="start the crawl from scratch")
+    search_parser.set_defaults(func=_search)
+
+    sync_parser = subparsers.add_parser(
+        "sync", parents=[common], help="list the targets added since the last sync"
+    )
+    sync_parser.add_argument("spec_type", type=_spec_type,
+                             help="spectral type, e.g. 'SN Ia' or 3")
+    sync_parser.add_argument("--full", action="store_true",
+                             help="download every page (to find removed targets)")
+    sync_parser.add_argument("--max-pages", type=int, default=999)
+    sync_parser.set_defaults(func=_sync)
+
+    props_parser = subparsers.add_parser(
+        "props", parents=[common, targets], help="get the properties of targets"
+    )
+    props_parser.add_argument("--properties", default="type,redshift,host,coords,coords_deg",
+                              help="comma-separated properties (default: all)")
+    props_parser.set_defaults(func=_props, journal_options=["properties"])
+
+    spectra_parser = subparsers.add_parser(
+        "spectra", parents=[common, targets], help="download the spectra of targets"
+    )
+    spectra_parser.add_argument("--file-type", choices=["ascii", "fits"], default=None)
+    patterns = spectra_parser.add_mutually_exclusive_group()
+    patterns.add_argument("--exclude", nargs="+", default=None, metavar="PATTERN")
+    patterns.add_argument("--include", nargs="+", default=None, metavar="PATTERN")
+    spectra_parser.add_argument("--skip-existing", action="store_true",
+                                help="skip the files already downloaded")
+    spectra_parser.add_argument("--start-date", default=None)
+    spectra_parser.add_argument("--end-date", default=None)
+    spectra_parser.add_argument("--instruments", nargs="+", default=None)
+    spectra_parser.add_argument("--telescopes", nargs="+", default=None)
+    spectra_parser.add_argument("--groups", nargs="+", default=None)
+    spectra_parser.add_argument("--reducers", nargs="+", default=None)
+    spectra_parser.add_argument("--one-per-night", action="store_true")
+    spectra_parser.add_argument("--dry-run", action="store_true",
+                                help="list the files (and bytes) without downloading them")
+    spectra_parser.set_defaults(
+        func=_spectra,
+        journal_options=[
+            "file_type", "exclude", "include", "start_date", "end_date", "instruments",
+            "telescopes", "groups", "reducers", "one_per_night",
+        ],
+    )
+
+    snid_parser = subparsers.add_parser(
+        "snid", parents=[common, targets], help="run SNID on the downloaded spectra"
+    )
+    snid_parser.add_argument("--snid-command", default=None,
+                             help="SNID command (default: 'snid inter=0 plot=0 aband=0')")
+    snid_parser.add_argument("--skip-fits", action="store_true",
+                             help="skip the spectra already fitted")
+    snid_parser.add_argument("--timeout", type=float, default=None,
+                             help="maximum time in seconds of each fit")
+    snid_parser.add_argument("--results-db", default=None,
+                             help="sqlite database where the best matches are stored")
+    snid_parser.set_defaults(func=_snid, journal_options=["snid_command", "results_db"])
+
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the ``wiserep`` command."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "props":
+        from wiserep_api.properties import valid_properties
+
+        args.properties = args.properties.split(",")
+        invalid = [name for name in args.properties if name not in valid_properties]
+        if len(invalid) > 0:
+            parser.error(
+                f"argument --properties: not valid: {', '.join(invalid)} "
+                f"(choose from {', '.join(valid_properties)})"
+            )
+
+    if args.output is not None:
+        out = open(args.output, "a")
+    else:
+        out = sys.stdout
+
+    try:
+        _configure_client(args)
+        # messages printed by the package go to stderr, so that
+        # stdout only has the JSON lines
+        with contextlib.redirect_stdout(sys.stderr):
+            n_failed = args.func(args, out)
+    except KeyboardInterrupt:
+        print("\nInterrupted: run the same command again to resume", file=sys.stderr)
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    return 1 if n_failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
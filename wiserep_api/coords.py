@@ -0,0 +1,170 @@
+import numpy as np
+
+
+def _as_str_array(coords):
+    """Converts coordinates strings into a stripped NumPy array of strings."""
+    coords = np.asarray(coords, dtype=str)
+    return np.char.strip(coords.ravel())
+
+
+def parse_coords(coords):
+    """Converts sexagesimal coordinates into degrees.
+
+    Parameters
+    ----------
+    coords: str or array
+        Coordinates as given by ``get_target_property(..., 'coords')``,
+        e.g. ``'20:32:54.190 +09:55:42.71'``.
+
+    Returns
+    -------
+    ra: numpy.ndarray
+        Right ascension in degrees. NaN for invalid coordinates.
+    dec: numpy.ndarray
+        Declination in degrees. NaN for invalid coordinates.
+    """
+    coords = _as_str_array(coords)
+    ra = np.full(len(coords), np.nan)
+    dec = np.full(len(coords), np.nan)
+
+    valid = (np.char.count(coords, ":") == 4) & (np.char.count(coords, " ") == 1)
+    if valid.any():
+        lines = np.char.replace(coords[valid], ":", " ")
+        try:
+            values = np.loadtxt(lines, ndmin=2)
+        except ValueError:
+            # slow path: some strings are not numbers
+            values = np.array([_split_floats(line, 6) for line in lines]).reshape(-1, 6)
+        # the sign is taken from the string to keep it for -00 degrees
+        dec_str = np.char.partition(coords[valid], " ")[:, 2]
+        sign = np.where(np.char.startswith(dec_str, "-"), -1.0, 1.0)
+
+        ra[valid] = 15 * (values[:, 0] + values[:, 1] / 60 + values[:, 2] / 3600)
+        dec[valid] = sign * (
+            np.abs(values[:, 3]) + values[:, 4] / 60 + values[:, 5] / 3600
+        )
+
+    return ra, dec
+
+
+def parse_coords_deg(coords_deg):
+    """Converts coordinates strings in degrees into floats.
+
+    Parameters
+    ----------
+    coords_deg: str or array
+        Coordinates as given by ``get_target_property(..., 'coords_deg')``,
+        e.g. ``'308.22579 +9.92853'``.
+
+    Returns
+    -------
+    ra: numpy.ndarray
+        Right ascension in degrees. NaN for invalid coordinates.
+    dec: numpy.ndarray
+        Declination in degrees. NaN for invalid coordinates.
+    """
+    coords_deg = _as_str_array(coords_deg)
+    ra = np.full(len(coords_deg), np.nan)
+    dec = np.full(len(coords_deg), np.nan)
+
+    valid = np.char.count(coords_deg, " ") == 1
+    if valid.any():
+        try:
+            values = np.loadtxt(coords_deg[valid], ndmin=2)
+        except ValueError:
+            # slow path: some strings are not numbers
+            values = np.array(
+                [_split_floats(value) for value in coords_deg[valid]]
+            ).reshape(-1, 2)
+        ra[valid], dec[valid] = values[:, 0], values[:, 1]
+
+    return ra, dec
+
+
+def _split_floats(value, n_values=2):
+    """Converts a string with ``n_values`` numbers into floats (NaN if invalid)."""
+    split_value = value.split()
+    if len(split_value) != n_values:
+        return (np.nan,) * n_values
+    try:
+        return tuple(float(number) for number in split_value)
+    except ValueError:
+        return (np.nan,) * n_values
+
+
+def angular_separation(ra1, dec1, ra2, dec2):
+    """Angular separation in degrees between coordinates in degrees
+    (haversine formula). The inputs can be arrays."""
+    ra1, dec1, ra2, dec2 = map(np.radians, (ra1, dec1, ra2, dec2))
+    sin_ddec = np.sin((dec2 - dec1) / 2)
+    sin_dra = np.sin((ra2 - ra1) / 2)
+    a = sin_ddec**2 + np.cos(dec1) * np.cos(dec2) * sin_dra**2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))))
+
+
+def _unit_vectors(ra, dec):
+    """Cartesian unit vectors of coordinates in degrees."""
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+
+def crossmatch(ra, dec, cat_ra, cat_dec, max_sep=None):
+    """Finds the nearest catalog object to each of the given coordinates.
+
+    A k-d tree of the catalog positions (as unit vectors) is used, so
+    millions of coordinates can be matched at once.
+
+    Parameters
+    ----------
+    ra: array
+        Right ascension of the coordinates to match, in degrees.
+    dec: array
+        Declination of the coordinates to match, in degrees.
+    cat_ra: array
+        Right ascension of the catalog objects, in degrees.
+    cat_dec: array
+        Declination of the catalog objects, in degrees.
+    max_sep: float, optional
+        Maximum separation in degrees of a match.
+
+    Returns
+    -------
+    indices: numpy.ndarray
+        Index of the nearest catalog object, or -1 if there is no
+        match within ``max_sep`` (or the coordinates are NaN).
+    separations: numpy.ndarray
+        Separation in degrees to the nearest catalog object (NaN if
+        there is no match).
+    """
+    from scipy.spatial import cKDTree
+
+    ra, dec = np.atleast_1d(ra).astype(float), np.atleast_1d(dec).astype(float)
+    cat_ra = np.atleast_1d(cat_ra).astype(float)
+    cat_dec = np.atleast_1d(cat_dec).astype(float)
+
+    indices = np.full(len(ra), -1)
+    separations = np.full(len(ra), np.nan)
+
+    cat_valid = np.isfinite(cat_ra) & np.isfinite(cat_dec)
+    valid = np.isfinite(ra) & np.isfinite(dec)
+    if cat_valid.sum() == 0 or valid.sum() == 0:
+        return indices, separations
+
+    tree = cKDTree(_unit_vectors(cat_ra[cat_valid], cat_dec[cat_valid]))
+    max_chord = np.inf
+    if max_sep is not None:
+        max_chord = 2 * np.sin(np.radians(min(max_sep, 180)) / 2)
+    chord, tree_indices = tree.query(
+        _unit_vectors(ra[valid], dec[valid]), k=1, distance_upper_bound=max_chord
+    )
+
+    matched = np.isfinite(chord)
+    cat_indices = np.flatnonzero(cat_valid)
+    valid_indices = np.flatnonzero(valid)
+    indices[valid_indices[matched]] = cat_indices[tree_indices[matched]]
+    separations[valid_indices[matched]] = np.degrees(
+        2 * np.arcsin(np.clip(chord[matched] / 2, 0, 1))
+    )
+
+    return indices, separations
@@ -0,0 +1,216 @@
+import os
+import csv
+import sqlite3
+import threading
+
+object_url = "https://www.wiserep.org/object/{obj_id}"
+default_filename = "wiserep_names.sqlite"
+
+
+class NameIndex:
+    """Local index that maps object names (IAU and internal/alias names)
+    to their Wiserep IDs.
+
+    The index is filled as a side effect of searches and object page
+    downloads, so later lookups of the same names do not need to query
+    Wiserep.
+
+    Parameters
+    ----------
+    path: str, default ``:memory:``
+        Path of the sqlite database. By default, the index is only
+        kept in memory.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS names (
+                    name TEXT PRIMARY KEY,
+                    obj_id TEXT NOT NULL,
+                    iau_name TEXT
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_obj_id ON names (obj_id)"
+            )
+
+    def add(self, name, obj_id, iau_name=None):
+        """Adds a name to the index.
+
+        Parameters
+        ----------
+        name: str
+            Name of the object (IAU or internal name).
+        obj_id: str or int
+            Wiserep ID of the object.
+        iau_name: str, optional
+            IAU name of the object.
+        """
+        self.add_many([(name, obj_id, iau_name)])
+
+    def add_many(self, rows):
+        """Adds multiple names to the index.
+
+        Parameters
+        ----------
+        rows: list
+            ``(name, obj_id, iau_name)`` tuples. ``iau_name`` can be None.
+        """
+        rows = [
+            (str(name), str(obj_id), iau_name)
+            for name, obj_id, iau_name in rows
+            if name and obj_id is not None
+        ]
+        with self._lock, self._conn:
+            # an already known IAU name is never replaced by None
+            self._conn.executemany(
+                """INSERT INTO names VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                obj_id = excluded.obj_id,
+                iau_name = COALESCE(excluded.iau_name, names.iau_name)""",
+                rows,
+            )
+
+    def add_record(self, name, record):
+        """Adds the names of a parsed object page to the index.
+
+        Parameters
+        ----------
+        name: str
+            Name used to find the object page.
+        record: TargetRecord
+            Information of the object page. Nothing is added if it
+            does not have the object ID.
+        """
+        if not record.obj_id:
+            return
+        names = [name] + list(record.internal_names)
+        self.add_many([(alias, record.obj_id, None) for alias in names])
+
+    def get_id(self, name):
+        """Wiserep ID of an object.
+
+        Parameters
+        ----------
+        name: str
+            Name of the object (IAU or internal name).
+
+        Returns
+        -------
+        obj_id: str or None
+            Wiserep ID of the object. None if the name is not indexed.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT obj_id FROM names WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def get_url(self, name):
+        """Canonical Wiserep URL of an object, or None if not indexed."""
+        obj_id = self.get_id(name)
+        if obj_id is None:
+            return None
+        return object_url.format(obj_id=obj_id)
+
+    def get_names(self, obj_id):
+        """All the indexed names of an object."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM names WHERE obj_id = ? ORDER BY name",
+                (str(obj_id),),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+    def export_csv(self, csv_file):
+        """Saves the index to a CSV file with ``name``, ``obj_id`` and
+        ``iau_name`` columns."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, obj_id, iau_name FROM names ORDER BY obj_id, name"
+            ).fetchall()
+        with open(csv_file, "w", newline="") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["name", "obj_id", "iau_name"])
+            writer.writerows(rows)
+
+    def import_csv(self, csv_file):
+        """Adds the names of a CSV file (as saved by ``export_csv``)."""
+        with open(csv_file, "r", newline="") as fp:
+            rows = [
+                (row["name"], row["obj_id"], row.get("iau_name") or None)
+                for row in csv.DictReader(fp)
+            ]
+        self.add_many(rows)
+
+    def close(self):
+        """Closes the database connection."""
+        self._conn.close()
+
+
+_name_index = None
+_name_index_lock = threading.Lock()
+
+
+def get_name_index():
+    """Returns the name index shared by all the functions of the package.
+
+    Returns
+    -------
+    name_index: NameIndex
+        Shared index. It is created on first use next to the database
+        of the responses cache of the shared client (``wiserep_names.sqlite``),
+        so that it is kept between sessions, or in memory if there is no cache.
+    """
+    global _name_index
+    with _name_index_lock:
+        if _name_index is None:
+            _name_index = NameIndex(_default_path())
+    return _name_index
+
+
+def _default_path():
+    """Path of the shared name index: next to the responses cache, if any."""
+    from wiserep_api.api import get_client
+
+    cache = get_client().cache
+    if cache is None or cache.path == ":memory:":
+        return ":memory:"
+    return os.path.join(os.path.dirname(os.path.abspath(cache.path)), default_filename)
+
+
+def set_name_index(name_index=None):
+    """Replaces the name index shared by all the functions of the package.
+
+    Parameters
+    ----------
+    name_index: NameIndex or str, optional
+        New index, or the path of its database. If not given, a new
+        in-memory index is used.
+
+    Returns
+    -------
+    name_index: NameIndex
+        The new shared index.
+    """
+    global _name_index
+    if name_index is None:
+        name_index = NameIndex()
+    elif isinstance(name_index, str):
+        name_index = NameIndex(name_index)
+    with _name_index_lock:
+        _name_index = name_index
+    return name_index
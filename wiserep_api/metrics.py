@@ -0,0 +1,364 @@
+import json
+import time
+import bisect
+import warnings
+import threading
+import functools
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# endpoint categories of the requests
+categories = ["search", "object", "ascii", "fits", "other"]
+# upper bounds (in seconds) of the latency histogram buckets
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+def endpoint_category(url):
+    """Category of a Wiserep URL: ``search``, ``object``, ``ascii``,
+    ``fits`` or ``other``."""
+    parsed_url = urlparse(url)
+    path = parsed_url.path
+    if path.startswith("/search"):
+        return "search"
+    if path.startswith(("/object/", "/iauname/", "/internal-name/")):
+        return "object"
+    if path.lower().endswith(".fits") or path.lower().endswith(".fits.gz"):
+        return "fits"
+    if "/spectra/" in path or "asciifile=" in parsed_url.query:
+        return "ascii"
+    return "other"
+
+
+class _Histogram:
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self):
+        self.counts = [0] * len(latency_buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(latency_buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(latency_buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return latency_buckets[-1]
+
+
+class Metrics:
+    """Counters and latency histograms of the requests made to Wiserep,
+    and time spent parsing the responses.
+
+    The requests are counted per endpoint category (``search``,
+    ``object``, ``ascii``, ``fits`` and ``other``), with their number of
+    errors, retries, bytes received and cache hits. The parsing time is
+    accumulated per stage (e.g. ``object_page`` or ``ascii_spectrum``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Sets all the counters to zero."""
+        with self._lock:
+            self.requests = {
+                category: {
+                    "count": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "bytes": 0,
+                    "cache_hits": 0,
+                }
+                for category in categories
+            }
+            self.latency = {category: _Histogram() for category in categories}
+            self.parse = {}
+
+    def record_request(self, event):
+        """Adds a request event (see ``add_callback``) to the counters."""
+        with self._lock:
+            counters = self.requests[event["category"]]
+            counters["count"] += 1
+            counters["retries"] += event["retries"]
+            counters["bytes"] += event["bytes"]
+            if event["error"] is not None:
+                counters["errors"] += 1
+            if event["from_cache"] is True:
+                counters["cache_hits"] += 1
+            self.latency[event["category"]].observe(event["elapsed"])
+
+    def record_parse(self, event):
+        """Adds a parsing event (see ``add_callback``) to the counters."""
+        with self._lock:
+            stage = self.parse.setdefault(event["stage"], {"count": 0, "time": 0.0})
+            stage["count"] += 1
+            stage["time"] += event["elapsed"]
+
+    def snapshot(self):
+        """Returns a copy of the metrics as a dictionary.
+
+        Returns
+        -------
+        metrics: dict
+            ``requests`` (counters, cache hit ratio and latency per
+            category) and ``parse`` (number of calls and time per stage).
+        """
+        with self._lock:
+            requests_metrics = {}
+            for category in categories:
+                counters = dict(self.requests[category])
+                histogram = self.latency[category]
+                count = counters["count"]
+                counters["cache_hit_ratio"] = (
+                    counters["cache_hits"] / count if count > 0 else None
+                )
+                counters["latency"] = {
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / count if count > 0 else None,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip(map(str, latency_buckets), histogram.counts)),
+                }
+                requests_metrics[category] = counters
+            parse_metrics = {stage: dict(values) for stage, values in self.parse.items()}
+        return {"requests": requests_metrics, "parse": parse_metrics}
+
+    def to_json(self, path=None):
+        """Exports the metrics in JSON format.
+
+        Parameters
+        ----------
+        path: str, optional
+            If given, the metrics are also saved in this file.
+
+        Returns
+        -------
+        metrics_json: str
+            Metrics in JSON format.
+        """
+        metrics_json = json.dumps(self.snapshot(), indent=2)
+        if path is not None:
+            with open(path, "w") as fp:
+                fp.write(metrics_json)
+        return metrics_json
+
+    def to_prometheus(self):
+        """Exports the metrics in the Prometheus text format.
+
+        Returns
+        -------
+        metrics_text: str
+            Metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        counters = [
+            ("requests_total", "count", "Requests sent to Wiserep."),
+            ("request_errors_total", "errors", "Failed requests."),
+            ("request_retries_total", "retries", "Retries of failed requests."),
+            ("response_bytes_total", "bytes", "Bytes received."),
+            ("cache_hits_total", "cache_hits", "Responses served from the cache."),
+        ]
+        with self._lock:
+            for name, key, description in counters:
+                lines.append(f"# HELP wiserep_{name} {description}")
+                lines.append(f"# TYPE wiserep_{name} counter")
+                for category in categories:
+                    value = self.requests[category][key]
+                    lines.append(f'wiserep_{name}{{category="{category}"}} {value}')
+
+            name = "wiserep_request_duration_seconds"
+            lines.append(f"# HELP {name} Latency of the requests.")
+            lines.append(f"# TYPE {name} histogram")
+            for category in categories:
+                histogram = self.latency[category]
+                cumulative = 0
+                for bound, count in zip(latency_buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'{name}_bucket{{category="{category}",le="{le}"}} {cumulative}'
+                    )
+                lines.append(f'{name}_sum{{category="{category}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{category="{category}"}} {histogram.count}')
+
+            for name, key, description in [
+                ("parse_seconds_total", "time", "Time spent parsing."),
+                ("parse_calls_total", "count", "Parsing calls."),
+            ]:
+                lines.append(f"# HELP wiserep_{name} {description}")
+                lines.append(f"# TYPE wiserep_{name} counter")
+                for stage, values in sorted(self.parse.items()):
+                    lines.append(f'wiserep_{name}{{stage="{stage}"}} {values[key]}')
+
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+_collectors = [_metrics]
+_callbacks = []
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Returns the metrics collected since the package was imported
+    (or since the last ``reset()``).
+
+    Returns
+    -------
+    metrics: Metrics
+        Package-wide metrics.
+    """
+    return _metrics
+
+
+def add_callback(callback):
+    """Registers a function called after every request and parsing step.
+
+    The function receives a dictionary with the event. Request events
+    have ``kind='request'``, ``category``, ``url``, ``method``,
+    ``status`` (None if the request failed), ``elapsed`` (seconds),
+    ``bytes``, ``retries``, ``from_cache`` and ``error``. Parsing events
+    have ``kind='parse'``, ``stage`` and ``elapsed``.
+
+    Callbacks are called from the thread that made the request, so
+    they should be fast and thread-safe.
+
+    Parameters
+    ----------
+    callback: callable
+        Function that takes the event as argument.
+    """
+    with _registry_lock:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """Unregisters a function added with ``add_callback``."""
+    with _registry_lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+def _dispatch(event):
+    """Sends an event to the collectors and callbacks."""
+    for collector in tuple(_collectors):
+        if event["kind"] == "request":
+            collector.record_request(event)
+        else:
+            collector.record_parse(event)
+    for callback in tuple(_callbacks):
+        try:
+            callback(event)
+        except Exception as exc:
+            warnings.warn(f"Metrics callback failed: {exc!r}")
+
+
+def record_request(
+    url,
+    elapsed,
+    status=None,
+    n_bytes=0,
+    retries=0,
+    from_cache=False,
+    error=None,
+    method="GET",
+):
+    """Records a request made to Wiserep.
+
+    Parameters
+    ----------
+    url: str
+        Requested URL.
+    elapsed: float
+        Duration of the request in seconds.
+    status: int, optional
+        HTTP status code. None if the request failed.
+    n_bytes: int, default ``0``
+        Bytes received.
+    retries: int, default ``0``
+        Number of retries.
+    from_cache: bool, default ``False``
+        Whether the response was served from the cache.
+    error: str, optional
+        Error message. Status codes other than 200 and 304 count as errors.
+    method: str, default ``GET``
+        HTTP method.
+    """
+    if error is None and status not in (200, 304):
+        error = f"Error {status}"
+    _dispatch(
+        {
+            "kind": "request",
+            "category": endpoint_category(url),
+            "url": url,
+            "method": method,
+            "status": status,
+            "elapsed": elapsed,
+            "bytes": n_bytes,
+            "retries": retries,
+            "from_cache": from_cache,
+            "error": error,
+        }
+    )
+
+
+def record_parse(stage, elapsed):
+    """Records the time spent on a parsing stage (in seconds)."""
+    _dispatch({"kind": "parse", "stage": stage, "elapsed": elapsed})
+
+
+def timed_stage(stage):
+    """Decorator that records the duration of every call of a function
+    as a parsing stage."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_parse(stage, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def capture_metrics():
+    """Captures the metrics of a block of work.
+
+    The requests and parsing steps of every thread are captured while
+    the block runs.
+
+    Examples
+    --------
+    >>> with capture_metrics() as metrics:
+    ...     download_target_spectra("2004eo")
+    >>> print(metrics.snapshot()["requests"]["ascii"])
+
+    Yields
+    ------
+    metrics: Metrics
+        Metrics of the block.
+    """
+    metrics = Metrics()
+    with _registry_lock:
+        _collectors.append(metrics)
+    try:
+        yield metrics
+    finally:
+        with _registry_lock:
+            _collectors.remove(metrics)
@@ -0,0 +1,338 @@
+import re
+from html import unescape
+from dataclasses import dataclass, field
+
+from wiserep_api.metrics import timed_stage
+
+# all the markers of an object page are found in a single scan
+_page_pattern = re.compile(
+    r'Type</span><div class="value"><b>(?P<type>[^<]*)'
+    r'|Redshift</span><div class="value"><b>(?P<redshift>[^<]*)'
+    r'|Host Name</span><div class="value"><b>(?P<host>[^<]*)'
+    # relatively new targets do not have coordinates epoch
+    r'|RA/DEC \((?:J2000)?\)</span><b><div class="value">(?P<coords>[^<]*)'
+    r'|div class="alter-value">(?P<alter>[^<]*)'
+    r'|Internal Names?</span><div class="value"><b>(?P<internal>[^<]*)'
+    # the page itself gives the object ID, as cached responses keep
+    # the requested URL instead of the redirected one
+    r'|<link rel="canonical" href="[^"]*/object/(?P<obj_id>\d+)'
+    r'|(?P<thead>\n <thead><tr>)'
+    r'|<td class="cell-objtype_name">(?P<objtype>[^<]*)'
+    # the URLs are captured with look-aheads so that markers
+    # inside them are still found
+    r'|asciifile=https%3A//(?=(?P<ascii>(?:(?!asciifile=https%3A//)[^"])*))'
+    r'|https://(?=(?P<url>(?:(?!https://)[^"])*))'
+)
+
+
+@dataclass
+class TargetRecord:
+    """Information extracted from a target's Wiserep webpage.
+
+    Attributes
+    ----------
+    type: str
+        Classification under the "Type" parameter.
+    redshift: float or str
+        Redshift. Empty string if not found, and NaN if it is not a number.
+    host: str
+        Host galaxy name.
+    coords: str
+        Coordinates in sexagesimal format (RA/DEC).
+    coords_deg: str
+        Coordinates in degrees (RA/DEC).
+    tns_classifications: list
+        Classifications from the TNS reports at the bottom of the webpage.
+    internal_names: list
+        Internal (survey) names of the target.
+    obj_id: str
+        Wiserep ID of the target. Empty string if not found.
+    ascii_urls: list
+        URLs (without scheme) of the ASCII spectra.
+    fits_urls: list
+        URLs (without scheme) of the FITS spectra.
+    spectra_table: pandas.DataFrame
+        Table with the spectra information. It is only parsed
+        when first accessed.
+    """
+
+    type: str = ""
+    redshift: object = ""
+    host: str = ""
+    coords: str = ""
+    coords_deg: str = ""
+    tns_classifications: list = field(default_factory=list)
+    internal_names: list = field(default_factory=list)
+    obj_id: str = ""
+    ascii_urls: list = field(default_factory=list)
+    fits_urls: list = field(default_factory=list)
+    html: str = field(default="", repr=False)
+    _spectra_table: object = field(default=None, repr=False)
+
+    def get(self, property_name):
+        """Returns a property as named in ``get_target_property``."""
+        return getattr(self, property_name)
+
+    @property
+    def spectra_table(self):
+        if self._spectra_table is None:
+            self._spectra_table = read_spectra_table(self.html)
+        return self._spectra_table
+
+
+@timed_stage("object_page")
+def parse_target_page(html):
+    """Parses a target's Wiserep webpage in a single pass.
+
+    Parameters
+    ----------
+    html: str
+        Text of the target's webpage.
+
+    Returns
+    -------
+    record: TargetRecord
+        Information of the target.
+    """
+    found = {}
+    objtypes = []
+    ascii_urls, fits_urls = [], []
+    waiting_alter = False
+
+    for match in _page_pattern.finditer(html):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("type", "redshift", "host", "internal", "obj_id"):
+            found.setdefault(kind, value)
+        elif kind == "coords":
+            if "coords" not in found:
+                found["coords"] = value
+                waiting_alter = True
+        elif kind == "alter":
+            # the first alternative value after the coordinates are the
+            # coordinates in degrees
+            if waiting_alter is True:
+                found["coords_deg"] = value
+                waiting_alter = False
+        elif kind == "thead":
+            # only the last table holds the TNS classifications
+            objtypes = []
+        elif kind == "objtype":
+            objtypes.append(value)
+        elif kind == "ascii":
+            if value and (value not in ascii_urls) and ("&amp" not in value):
+                ascii_urls.append(value)
+        elif kind == "url":
+            if (value not in fits_urls) and (".fits" in value) and ("rel-file" not in value):
+                fits_urls.append(value)
+
+    redshift = found.get("redshift", "").strip()
+    if len(redshift) > 0:
+        try:
+            redshift = float(redshift)
+        except ValueError:
+            # e.g. "-" or "0.05?", which should not break the other properties
+            redshift = float("nan")
+    internal_names = [name.strip() for name in unescape(found.get("internal", "")).split(",")]
+
+    record = TargetRecord(
+        type=found.get("type", ""),
+        redshift=redshift,
+        host=found.get("host", ""),
+        coords=found.get("coords", ""),
+        coords_deg=found.get("coords_deg", ""),
+        tns_classifications=objtypes,
+        internal_names=[name for name in internal_names if name != ""],
+        obj_id=found.get("obj_id", ""),
+        ascii_urls=ascii_urls,
+        fits_urls=fits_urls,
+        html=html,
+    )
+    return record
+
+
+_table_tag = re.compile(r"<(/?)table\b", re.IGNORECASE)
+
+
+def _find_tables(html, marker):
+    """Yields the HTML of the (outermost) tables that contain ``marker``."""
+    end = 0
+    for marker_match in re.finditer(re.escape(marker), html):
+        position = marker_match.start()
+        if position < end:
+            continue  # inside the previous table
+        start = html.rfind("<table", end, position)
+        if start < 0:
+            continue
+
+        depth = 0
+        end = len(html)
+        for match in _table_tag.finditer(html, start):
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                end = html.find(">", match.end()) + 1 or len(html)
+                break
+        yield html[start:end]
+
+
+# structural tags of a table, and any other tag (removed from the cell text)
+_cell_pattern = re.compile(
+    r"<(?P<end>/?)(?P<tag>table|thead|tbody|tfoot|tr|td|th)\b(?P<attrs>[^>]*)>|<[^>]*>",
+    re.IGNORECASE,
+)
+_colspan_pattern = re.compile(r'colspan\s*=\s*["\']?(\d+)', re.IGNORECASE)
+
+
+def _read_table_cells(table_html):
+    """Reads the text of the cells of an HTML table in a single scan.
+
+    The rows are split into header and body rows as ``pandas.read_html``
+    does: the rows of ``thead`` are the header, or, without ``thead``,
+    the leading rows with only ``th`` cells. The rows of ``tfoot`` go
+    after the body. Cells spanning several columns are repeated. The
+    cells of nested tables are part of the outer cell text.
+
+    Returns
+    -------
+    header_rows: list
+        Header rows.
+    rows: list
+        Body rows.
+    """
+    # (cells, section, whether all the cells are ``th``) of every row
+    all_rows = []
+    row, cell = None, None
+    colspan, has_data = 1, False
+    section = None
+    depth = 0
+
+    def close_cell():
+        nonlocal cell
+        if cell is not None:
+            text = " ".join(unescape("".join(cell)).split())
+            row.extend([text] * colspan)
+            cell = None
+
+    def close_row():
+        nonlocal row
+        close_cell()
+        if row:
+            all_rows.append((row, section, has_data is False))
+        row = None
+
+    position = 0
+    for match in _cell_pattern.finditer(table_html):
+        if cell is not None:
+            cell.append(table_html[position : match.start()])
+        position = match.end()
+
+        tag = match.group("tag")
+        if tag is None:
+            continue  # other tags, e.g. links
+        tag = tag.lower()
+        closing = match.group("end") == "/"
+
+        if tag == "table":
+            depth += -1 if closing else 1
+            if depth == 0:
+                close_row()
+                break
+        elif depth > 1:
+            continue  # nested tables
+        elif tag in ("thead", "tbody", "tfoot"):
+            close_row()
+            section = None if closing else tag
+        elif closing:
+            if tag == "tr":
+                close_row()
+            else:
+                close_cell()
+        elif tag == "tr":
+            close_row()
+            row, has_data = [], False
+        else:
+            close_cell()
+            if row is None:
+                row, has_data = [], False
+            cell = []
+            colspan_match = _colspan_pattern.search(match.group("attrs"))
+            colspan = int(colspan_match.group(1)) if colspan_match else 1
+            has_data |= tag == "td"
+    close_row()
+
+    header_rows = [row for row, row_section, _ in all_rows if row_section == "thead"]
+    body = [item for item in all_rows if item[1] not in ("thead", "tfoot")]
+    body += [item for item in all_rows if item[1] == "tfoot"]
+    if len(header_rows) == 0:
+        while len(body) > 0 and body[0][2] is True:
+            header_rows.append(body.pop(0)[0])
+    rows = [row for row, _, _ in body]
+
+    return header_rows, rows
+
+
+def _convert_column(values):
+    """Converts a column of strings into numbers or dates, if possible."""
+    import pandas as pd
+
+    series = pd.Series(values, dtype=object).replace("", float("nan"))
+    n_values = series.notna().sum()
+    if n_values == 0:
+        return series
+
+    numbers = pd.to_numeric(series, errors="coerce")
+    if numbers.notna().sum() == n_values:
+        if n_values == len(numbers) and (numbers % 1 == 0).all():
+            return numbers.astype("int64")
+        return numbers.astype("float64")
+    return series
+
+
+@timed_stage("spectra_table")
+def read_spectra_table(html):
+    """Reads the table with the spectra information of a target's webpage.
+
+    Only the region of the table is parsed, in a single scan of its tags.
+    Numeric columns are converted into numbers and the observation
+    dates (``Obs-date``) into datetimes. Columns without name are removed.
+
+    Parameters
+    ----------
+    html: str
+        Text of the target's webpage.
+
+    Returns
+    -------
+    spec_table: pandas.DataFrame
+        Table with the spectra information.
+    """
+    # pandas is only needed (and imported) for the spectra table
+    import pandas as pd
+
+    columns = None
+    for table_html in _find_tables(html, "Spec. ID"):
+        header_rows, rows = _read_table_cells(table_html)
+        # the header row with the column names (other rows might hold filters)
+        for header_row in header_rows:
+            if "Spec. ID" in header_row:
+                columns = header_row
+                break
+        if columns is not None:
+            break
+    if columns is None:
+        raise ValueError("No spectra table found")
+
+    spec_dict = {}
+    for i, column in enumerate(columns):
+        if column == "" or column in spec_dict:
+            continue
+        values = [row[i] if i < len(row) else "" for row in rows]
+        if column == "Obs-date":
+            dates = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce")
+            if dates.notna().sum() == sum(value != "" for value in values):
+                spec_dict[column] = dates
+                continue
+        spec_dict[column] = _convert_column(values)
+
+    spec_table = pd.DataFrame(spec_dict)
+    return spec_table
@@ -0,0 +1,330 @@
+import os
+import time
+import queue
+import threading
+
+from wiserep_api.search import iter_sn_list
+from wiserep_api.properties import get_target_record, valid_properties
+from wiserep_api.spectra import download_target_spectra
+from wiserep_api.snid import run_snid_many
+
+_done = object()  # end-of-stream marker
+
+
+class StageStats:
+    """Throughput statistics of a pipeline stage.
+
+    Attributes
+    ----------
+    name: str
+        Name of the stage.
+    items_in: int
+        Number of items processed.
+    items_out: int
+        Number of items passed to the next stage.
+    errors: list
+        ``(item, error message)`` of the items that failed.
+    busy_time: float
+        Time in seconds spent processing items (summed over workers).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = []
+        self.busy_time = 0.0
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        """Wall time in seconds since the stage started."""
+        if self.start_time is None:
+            return 0.0
+        end_time = self.end_time if self.end_time is not None else time.monotonic()
+        return end_time - self.start_time
+
+    @property
+    def throughput(self):
+        """Processed items per second (wall time)."""
+        if self.elapsed == 0:
+            return 0.0
+        return self.items_in / self.elapsed
+
+    def __repr__(self):
+        return (
+            f"{self.name}: {self.items_in} in, {self.items_out} out, "
+            f"{len(self.errors)} errors, {self.throughput:.2f} items/s"
+        )
+
+
+class Pipeline:
+    """Chain of stages connected by bounded queues.
+
+    Every stage runs in its own thread(s) and passes its outputs to the
+    next stage as soon as they are produced. As the queues are bounded,
+    a fast stage waits for a slow one (backpressure) instead of piling
+    up items in memory, so the total time is set by the slowest stage.
+
+    Parameters
+    ----------
+    queue_size: int, default ``16``
+        Maximum number of items waiting between two stages.
+    """
+
+    def __init__(self, queue_size=16):
+        self.queue_size = queue_size
+        self.stages = []
+        self.stats = {"source": StageStats("source")}
+        self._stop = threading.Event()
+
+    def add_stage(self, name, func, workers=1):
+        """Adds a stage at the end of the pipeline.
+
+        Parameters
+        ----------
+        name: str
+            Name of the stage.
+        func: callable
+            Function that takes an item and returns an iterable with the
+            items for the next stage (e.g. a generator). Exceptions are
+            recorded in the stage statistics and the item is dropped.
+        workers: int, default ``1``
+            Number of threads running the stage.
+
+        Returns
+        -------
+        pipeline: Pipeline
+            The pipeline itself, so calls can be chained.
+        """
+        self.stages.append((name, func, workers))
+        self.stats[name] = StageStats(name)
+        return self
+
+    def _put(self, out_queue, item):
+        """Puts an item in a queue, unless the pipeline is stopped."""
+        while not self._stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, source, out_queue, stats):
+        """Puts the items of the source in the first queue."""
+        stats.start_time = time.monotonic()
+        try:
+            for item in source:
+                stats.items_in += 1
+                if self._put(out_queue, item) is False:
+                    return
+                stats.items_out += 1
+        except Exception as exc:
+            stats.errors.append((None, f"{type(exc).__name__}: {exc}"))
+        finally:
+            stats.end_time = time.monotonic()
+            self._put(out_queue, _done)
+
+    def _work(self, func, in_queue, out_queue, stats, remaining):
+        """Runs a stage on the items of its input queue."""
+        while not self._stop.is_set():
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _done:
+                # let the other workers of the stage know
+                self._put(in_queue, _done)
+                break
+
+            start = time.monotonic()
+            try:
+                for output in func(item):
+                    if self._put(out_queue, output) is False:
+                        break
+                    with stats._lock:
+                        stats.items_out += 1
+            except Exception as exc:
+                with stats._lock:
+                    stats.errors.append((item, f"{type(exc).__name__}: {exc}"))
+            with stats._lock:
+                stats.items_in += 1
+                stats.busy_time += time.monotonic() - start
+
+        with stats._lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker is True:
+            stats.end_time = time.monotonic()
+            self._put(out_queue, _done)
+
+    def run(self, source):
+        """Runs the pipeline.
+
+        Parameters
+        ----------
+        source: iterable
+            Items for the first stage (e.g. a generator of names).
+
+        Yields
+        ------
+        item: any
+            Outputs of the last stage, as soon as they are produced.
+        """
+        self._stop.clear()
+        self.stats["source"] = StageStats("source")
+        in_queue = queue.Queue(self.queue_size)
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(source, in_queue, self.stats["source"]),
+                daemon=True,
+            )
+        ]
+        for name, func, workers in self.stages:
+            out_queue = queue.Queue(self.queue_size)
+            stats = self.stats[name]
+            stats.start_time = time.monotonic()
+            remaining = [workers]
+            for _ in range(workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(func, in_queue, out_queue, stats, remaining),
+                        daemon=True,
+                    )
+                )
+            in_queue = out_queue
+
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = in_queue.get()
+                if item is _done:
+                    break
+                yield item
+        finally:
+            # also reached if the caller stops early
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def report(self):
+        """Prints the statistics of each stage."""
+        for stats in self.stats.values():
+            print(stats)
+
+
+def run_pipeline(
+    spec_type=None,
+    iau_names=None,
+    properties=None,
+    file_type="ascii",
+    snid_command=None,
+    spectra_dir="spectra",
+    workers=None,
+    queue_size=16,
+    pipeline=None,
+    **kwargs,
+):
+    """Search → properties → spectra → SNID, with all the stages running
+    at the same time.
+
+    Each target moves to the next stage as soon as it is ready, e.g.
+    SNID can start on the first targets while the search pages are still
+    being downloaded.
+
+    Parameters
+    ----------
+    spec_type : int or str, optional
+        Spectral type of the targets, e.g. ``SN Ia`` or ``3``.
+    iau_names : iterable, optional
+        Names of the targets, instead of ``spec_type``.
+    properties : list, optional
+        Properties included in the results (see ``get_target_property``).
+        By default, all of them.
+    file_type : str or None, default ``ascii``
+        File format of the spectra (see ``download_target_spectra``).
+    snid_command : str, optional
+        SNID command. If not given, SNID is not run.
+    spectra_dir : str, default ``spectra``
+        Directory where the spectra are saved.
+    workers : dict, optional
+        Number of workers per stage (``properties``, ``spectra``,
+        ``snid``). By default, ``{'properties': 4, 'spectra': 4, 'snid': 1}``.
+    queue_size : int, default ``16``
+        Maximum number of targets waiting between two stages.
+    pipeline : Pipeline, optional
+        Pipeline to which the stages are added, e.g. to read its
+        statistics afterwards. By default, a new one is created.
+    **kwargs:
+        Extra arguments passed to ``download_target_spectra``
+        (e.g. ``exclude=['SEDM']``).
+
+    Yields
+    ------
+    result : dict
+        The target's ``target`` name, properties, downloaded ``spectra``
+        and SNID results (``snid``, list of ``SnidResult``).
+    """
+    assert (spec_type is None) != (iau_names is None), (
+        "Either 'spec_type' or 'iau_names' must be given"
+    )
+    if properties is None:
+        properties = valid_properties
+    stage_workers = {"properties": 4, "spectra": 4, "snid": 1}
+    if workers is not None:
+        stage_workers.update(workers)
+
+    def properties_stage(iau_name):
+        record = get_target_record(iau_name)
+        if record is None:
+            raise LookupError(f"Could not load the webpage of {iau_name}")
+        result = {"target": iau_name}
+        for property in properties:
+            result[property] = record.get(property)
+        yield result, record
+
+    def spectra_stage(item):
+        result, record = item
+        # the downloaded arrays are passed to SNID, which does not
+        # read the files again
+        spectra = {}
+        downloaded_files = download_target_spectra(
+            result["target"],
+            file_type=file_type,
+            record=record,
+            spectra_dir=spectra_dir,
+            spectra=spectra,
+            **kwargs,
+        )
+        result["spectra"] = downloaded_files if downloaded_files is not None else []
+        yield result, spectra
+
+    def snid_stage(item):
+        result, spectra = item
+        if snid_command is not None and len(result["spectra"]) > 0:
+            directory = os.path.join(spectra_dir, result["target"])
+            result["snid"] = run_snid_many(
+                [directory], snid_command, workers=1, spectra=spectra
+            )
+        else:
+            result["snid"] = []
+        yield result
+
+    if pipeline is None:
+        pipeline = Pipeline(queue_size)
+    pipeline.add_stage("properties", properties_stage, stage_workers["properties"])
+    pipeline.add_stage("spectra", spectra_stage, stage_workers["spectra"])
+    pipeline.add_stage("snid", snid_stage, stage_workers["snid"])
+
+    if spec_type is not None:
+        source = iter_sn_list(spec_type)
+    else:
+        source = iau_names
+
+    yield from pipeline.run(source)
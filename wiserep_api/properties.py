@@ -1,4 +1,39 @@
-from wiserep_api.api import get_response, get_target_response
+import os
+from wiserep_api.api import get_target_response, map_targets
+from wiserep_api.parsing import parse_target_page
+from wiserep_api.index import get_name_index
+
+valid_properties = ['type', 'redshift', 'host', 'coords', 'coords_deg']
+
+
+def get_target_record(iau_name, verbose=False):
+    """Obtains the information of a target's Wiserep webpage.
+
+    The webpage is downloaded and parsed only once, so this is the
+    fastest way of getting several properties of the same target.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target (e.g. 2020xne).
+    verbose: bool, default 'False'
+        If True, print some of the intermediate information
+
+    Returns
+    -------
+    record: TargetRecord
+        The target's information. Returns None if the webpage
+        could not be loaded.
+    """
+    response = get_target_response(iau_name, verbose)
+    if response is None:
+        return None
+
+    record = parse_target_page(response.text)
+    # the aliases of the target are found without extra requests
+    get_name_index().add_record(iau_name, record)
+    return record
+
 
 def get_target_property(iau_name, property_name, verbose=False):
     """Obtains the target's properties from Wiserep.
@@ -20,88 +55,47 @@ def get_target_property(iau_name, property_name, verbose=False):
     target_properties: str, float or list
         The values of the target's properties.
     """
-    # target's webpage
-    response = get_target_response(iau_name, verbose)
-    if response is None:
-        return None
-
-    properties_dict = {'type':'Type',
-                       'redshift':'Redshift',
-                       'host':'Host Name',
-                       'coords':'RA/DEC (J2000)',
-                       'coords_deg':'RA/DEC (J2000)',
-                       } 
-    
     if isinstance(property_name, str):
         properties_list = [property_name]
     else:
         properties_list = property_name
 
-    target_properties = []
     for property in properties_list:
-        assert property in properties_dict.keys(), f"Not a valid property: '{property}'"
-        prop_str = properties_dict[property]
-
-        # search for the property
-        if property=='coords':
-            if prop_str not in response.text:
-                prop_str = prop_str.replace('J2000', '')  # relatively new targets do not have coordinates epoch
-            split_text = response.text.split(f'{prop_str}</span><b><div class="value">')
-        elif property=='coords_deg':
-            if prop_str not in response.text:
-                prop_str = prop_str.replace('J2000', '')
-            split_text = response.text.split(f'{prop_str}</span><b><div class="value">')
-            if len(split_text)>1:
-                split_text = split_text[1].split('div class="alter-value">')
-        else:
-            split_text = response.text.split(f'{prop_str}</span><div class="value"><b>')
+        assert property in valid_properties, f"Not a valid property: '{property}'"
 
-        if len(split_text) > 1:
-            target_property = split_text[1].split("<")[0]
-        else:
-            target_property = ''
-            
-        if property=='redshift' and len(target_property)>0:
-            target_property = float(target_property)
+    # target's webpage
+    record = get_target_record(iau_name, verbose)
+    if record is None:
+        return None
 
-        target_properties.append(target_property)
+    target_properties = [record.get(property) for property in properties_list]
 
     if len(target_properties)==1:
         target_properties = target_properties[0]
 
     return target_properties
 
-def get_target_class(iau_name, verbose=False):
-    """Obtains the target's classification (type) from Wiserep.
+
+def get_class_from_record(record):
+    """Obtains the target's classification from its parsed webpage.
 
     Parameters
     ----------
-    iau_name: str
-        IAU name of the target (e.g. 2020xne).
-    verbose: bool, default 'False'
-        If True, print some of the intermediate information
+    record: TargetRecord
+        The target's information.
 
     Returns
     -------
-    target_class: str
-        The target's classification. Returns 'Unknown' if not found.
+    target_class: str or None
+        The target's classification. Returns None if not found.
     """
-    # target's webpage
-    response = get_target_response(iau_name, verbose)
-
-    # search for classification
-    split_text = response.text.split('Type</span><div class="value"><b>')
-    if len(split_text) > 1:
-        # look for classification under "Type" parameter
-        target_class = split_text[1].split("<")[0]
-        if target_class != "SN":
-            return target_class
+    # look for classification under "Type" parameter
+    if len(record.type) > 0 and record.type != "SN":
+        return record.type
 
     # look for classifications in TNS reports at the bottom of the webpage
-    table = response.text.split("\n <thead><tr>")[-1]
     simply_a_SN = False
-    for row in table.split('<td class="cell-objtype_name">'):
-        target_class = row.split("<")[0]
+    for target_class in record.tns_classifications:
         if len(target_class) > 0 and target_class != "SN":
             return target_class
 
@@ -111,6 +105,172 @@ def get_target_class(iau_name, verbose=False):
     if simply_a_SN is True:
         # Some objects just have the classification as "SN"
         return "SN"
-    else:
+    return None
+
+
+def get_target_class(iau_name, verbose=False):
+    """Obtains the target's classification (type) from Wiserep.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target (e.g. 2020xne).
+    verbose: bool, default 'False'
+        If True, print some of the intermediate information
+
+    Returns
+    -------
+    target_class: str
+        The target's classification. Returns 'Unknown' if not found.
+    """
+    # target's webpage
+    record = get_target_record(iau_name, verbose)
+    if record is None:
+        print(f"Could not load the webpage of {iau_name}")
+        return "Unknown"
+
+    target_class = get_class_from_record(record)
+    if target_class is None:
         print(f"Target classification not found: {iau_name}")
         return "Unknown"
+
+    return target_class
+
+
+def _record_to_row(iau_name, record, properties):
+    """Converts a target's record into a row of the properties table."""
+    row = {"target": iau_name}
+    for property in properties:
+        value = record.get(property)
+        if property == "redshift":
+            value = value if value != "" else float("nan")
+        row[property] = value
+    return row
+
+
+def _rows_to_frame(rows, properties):
+    """Converts rows of the properties table into a typed dataframe."""
+    import pandas as pd
+    from wiserep_api.coords import parse_coords_deg
+
+    columns = ["target"] + list(properties)
+    if "coords_deg" in properties:
+        columns += ["ra", "dec"]
+    columns += ["status", "error"]
+
+    properties_df = pd.DataFrame(rows, columns=columns)
+    if "coords_deg" in properties:
+        coords_deg = properties_df["coords_deg"].fillna("").values
+        properties_df["ra"], properties_df["dec"] = parse_coords_deg(coords_deg)
+    for column in columns:
+        if column in ["redshift", "ra", "dec"]:
+            properties_df[column] = properties_df[column].astype(float)
+        else:
+            properties_df[column] = properties_df[column].astype(object)
+    return properties_df
+
+
+def _write_rows(properties_df, output, writer=None):
+    """Appends a chunk of the properties table to a CSV or Parquet file.
+
+    Returns the Parquet writer (if any), so it can be reused.
+    """
+    if output.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        fields = []
+        for column in properties_df.columns:
+            if column in ["redshift", "ra", "dec"]:
+                fields.append((column, pa.float64()))
+            else:
+                fields.append((column, pa.string()))
+        schema = pa.schema(fields)
+        table = pa.Table.from_pandas(
+            properties_df, schema=schema, preserve_index=False
+        )
+        if writer is None:
+            writer = pq.ParquetWriter(output, schema)
+        writer.write_table(table)
+    else:
+        header = os.path.isfile(output) is False
+        properties_df.to_csv(output, mode="a", header=header, index=False)
+    return writer
+
+
+def get_targets_properties(
+    iau_names, properties=None, workers=4, output=None, chunk_size=500, verbose=False
+):
+    """Obtains the properties of multiple targets from Wiserep.
+
+    The webpages are downloaded in parallel and each of them is
+    parsed only once.
+
+    Parameters
+    ----------
+    iau_names: iterable
+        IAU names of the targets (e.g. ['2020xne', '2004eo']).
+    properties: list, optional
+        Names of the properties (see ``get_target_property``). By default,
+        all the properties are retrieved.
+    workers: int, default ``4``
+        Number of targets processed at the same time.
+    output: str, optional
+        CSV or Parquet (``.parquet`` extension, requires ``pyarrow``) file
+        where the results are appended as they come in chunks of
+        ``chunk_size`` targets. An existing CSV file is appended to.
+    chunk_size: int, default ``500``
+        Number of targets per chunk written to ``output``.
+    verbose: bool, default 'False'
+        If True, print some of the intermediate information
+
+    Returns
+    -------
+    properties_df: pandas.DataFrame
+        Table with one row per target. ``redshift`` is given as float,
+        ``coords_deg`` is also split into ``ra`` and ``dec`` floats, and
+        ``type`` is categorical. The ``status`` column is ``ok``,
+        ``not found`` or ``failed`` (with the error in ``error``).
+    """
+    if properties is None:
+        properties = valid_properties
+    for property in properties:
+        assert property in valid_properties, f"Not a valid property: '{property}'"
+    # the names are needed again to sort the results (e.g. for generators)
+    iau_names = list(iau_names)
+
+    rows, chunk, writer = [], [], None
+    for name, record, error, _ in map_targets(
+        get_target_record, iau_names, workers, verbose=verbose
+    ):
+        if error is not None:
+            row = {"target": name, "status": "failed", "error": error}
+        elif record is None:
+            row = {"target": name, "status": "not found", "error": None}
+        else:
+            row = _record_to_row(name, record, properties)
+            row.update({"status": "ok", "error": None})
+        rows.append(row)
+
+        if output is not None:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                chunk_df = _rows_to_frame(chunk, properties)
+                writer = _write_rows(chunk_df, output, writer)
+                chunk = []
+
+    if output is not None:
+        if len(chunk) > 0:
+            chunk_df = _rows_to_frame(chunk, properties)
+            writer = _write_rows(chunk_df, output, writer)
+        if writer is not None:
+            writer.close()
+
+    # keep the order of the input targets
+    order = {name: i for i, name in enumerate(iau_names)}
+    rows.sort(key=lambda row: order[row["target"]])
+    properties_df = _rows_to_frame(rows, properties)
+    if "type" in properties:
+        properties_df["type"] = properties_df["type"].astype("category")
+
+    return properties_df
@@ -1,110 +1,417 @@
 import os
-import glob
 import json
-import numpy as np
+import warnings
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
 import wiserep_api
 from wiserep_api.api import get_response
+from wiserep_api.index import get_name_index
+from wiserep_api.metrics import timed_stage
 
 wiserep_api_path = wiserep_api.__path__[0]
 
 spec_types_file = os.path.join(wiserep_api_path, "static", "spectral_types.json")
-with open(spec_types_file, "r") as fp:
-    spectral_types = json.load(fp)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_spectral_types():
+    """Reads the spectral types as defined by Wiserep (only once)."""
+    with open(spec_types_file, "r") as fp:
+        return json.load(fp)
+
+
+def __getattr__(name):
+    # the spectral types are only read when first needed
+    if name == "spectral_types":
+        return _load_spectral_types()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def print_spectral_types():
     """Prints the spectral types as defined by Wiserep"""
-    global spectral_types
-    print(spectral_types)
+    print(_load_spectral_types())
+
+
+# sorting parameters of the search form (newest objects first)
+newest_first = "&order=id&sort=desc"
+
+
+def _search_url(spec_type, page, sort=""):
+    """Wiserep search URL of a given page for a spectral type."""
+    url = f"https://www.wiserep.org/search?&page={page}&public=all&type[]={spec_type}"
+    return url + sort
+
+
+@timed_stage("search_page")
+def _get_page_entries(text):
+    """Extracts the names and Wiserep IDs of the targets from a search page.
+
+    Parameters
+    ----------
+    text : str
+        Text of the search page.
+
+    Returns
+    -------
+    entries: list
+        ``(name, obj_id)`` tuples. ``obj_id`` is None if not found.
+    """
+    split_text = text.split('Click to Object page">')
+
+    # get names of the SNe
+    entries = []
+    for st in split_text:
+        name = st.split("</a")[0]
+        # alternative name
+        alt_split = st.split('target="_blak">')
+        if len(alt_split) < 2:
+            alt_name = None
+        else:
+            alt_name = alt_split[1].split("</a")[0]
+        # object ID (same convention as in ``_get_object_id``)
+        obj_id = None
+        if 'href="/object/' in st:
+            obj_id = st.split('href="/object/')[1].split('"')[0]
+            obj_id = int(obj_id) if obj_id.isdigit() else None
+
+        if len(name) > 20:
+            continue  # this is just text
+        try:
+            # this avoids some annoying lines
+            # and uses the alternative name if
+            # no IAU name is found
+            _ = float(name)
+            if alt_name is not None:
+                if "," in alt_name:
+                    # Some SNe have 2+ alternative names
+                    alt_name = alt_name.split(",")[0]
+                entries.append((alt_name, obj_id))
+        except:
+            if name.startswith("SN "):
+                # IAU name
+                name = name.replace("SN ", "")
+            entries.append((name, obj_id))
+
+    return entries
+
+
+def _load_manifest(manifest_file):
+    """Loads the checkpoint manifest of a search crawl."""
+    manifest = {"pages": [], "last_page": None, "complete": False}
+    if os.path.isfile(manifest_file) is True:
+        with open(manifest_file, "r") as fp:
+            manifest.update(json.load(fp))
+    return manifest
+
+
+def _save_manifest(manifest, manifest_file):
+    """Saves the checkpoint manifest of a search crawl (atomically)."""
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w") as fp:
+        json.dump(manifest, fp)
+    os.replace(tmp_file, manifest_file)
+
+
+def _index_entries(entries):
+    """Adds the names and IDs of a search page to the name index."""
+    get_name_index().add_many(
+        [(name, obj_id, None) for name, obj_id in entries if obj_id is not None]
+    )
+
+
+def _fetch_page(spec_type, page):
+    """Downloads a search page and extracts the names of the targets."""
+    response = get_response(_search_url(spec_type, page), use_cache=False)
+    if response is None:
+        return None
+    entries = _get_page_entries(response.text)
+    _index_entries(entries)
+    return [name for name, _ in entries]
+
+
+def _start_crawl(spec_type, resume=True):
+    """Prepares the directory and checkpoint manifest of a search crawl.
+
+    Returns the spectral type (as an integer), its directory, the
+    manifest file, the manifest and the set of downloaded pages.
+    """
+    spectral_types = _load_spectral_types()
+    if isinstance(spec_type, str):
+        spec_type = spectral_types[spec_type]
+
+    # create any missing directory
+    spec_directory = os.path.join("wiserep", str(spec_type))
+    os.makedirs(spec_directory, exist_ok=True)
+
+    manifest_file = os.path.join(spec_directory, "manifest.json")
+    manifest = _load_manifest(manifest_file)
+    if resume is False or manifest["complete"] is True:
+        manifest = {"pages": [], "last_page": None, "complete": False}
+    done_pages = set(manifest["pages"])
+
+    return spec_type, spec_directory, manifest_file, manifest, done_pages
+
+
+def _next_pages(manifest, done_pages, n_pages):
+    """Next window of (at most ``n_pages``) missing pages of a crawl."""
+    window = []
+    page = 0
+    last_page = manifest["last_page"]
+    while len(window) < n_pages and page < 999:
+        if last_page is not None and page >= last_page:
+            break
+        if page not in done_pages:
+            window.append(page)
+        page += 1
+    return window
+
+
+def _store_page(spec_directory, manifest, done_pages, page, names):
+    """Saves the names of a downloaded search page."""
+    if len(names) == 0:
+        # no more SNe found
+        if manifest["last_page"] is None or page < manifest["last_page"]:
+            manifest["last_page"] = page
+        return
+
+    # save page data
+    outfile = os.path.join(spec_directory, f"page{page}.txt")
+    with open(outfile, "w") as fp:
+        fp.write("\n".join(names) + "\n")
+    done_pages.add(page)
+
+
+def _merge_pages(spec_type, spec_directory, manifest, manifest_file):
+    """Merges the pages of a completed crawl into the full list."""
+    spectral_types = _load_spectral_types()
+    last_page = manifest["last_page"]
+    if last_page is None:
+        last_page = 999
+    spec_type_str = [
+        key for key, value in spectral_types.items() if value == spec_type
+    ][0]
+    sne_list = []
+    with open(f'{spec_type_str.replace(" ", "")}_wiserep.txt', "w") as out_fp:
+        for i in range(last_page):
+            page_file = os.path.join(spec_directory, f"page{i}.txt")
+            with open(page_file, "r") as page_fp:
+                for line in page_fp:
+                    out_fp.write(line)
+                    sne_list.append(line.rstrip("\n"))
+
+    manifest["complete"] = True
+    _save_manifest(manifest, manifest_file)
+
+    print(f'{len(sne_list)} "{spec_type_str}" objects found!')
+    print(f"URL used: {_search_url(spec_type, last_page)}")
 
+    return sne_list
 
-def download_sn_list(spec_type):
+
+def download_sn_list(spec_type, workers=4, resume=True):
     """Downloads a list of all the targets of a given spectral type.
 
     The spectral types are as defined by Wiserep. To list then,
     you can use ``print_spectral_types()``.
 
+    The search pages are downloaded concurrently, ``workers`` pages at
+    a time, until an empty page is found. The progress is saved in
+    ``wiserep/<spec_type>/manifest.json``, so an interrupted crawl
+    resumes from the missing pages.
+
     Parameters
     ----------
     spec_type : int or str
         Spectral type, e.g. ``SN Ia`` or ``3``.
+    workers : int, default ``4``
+        Number of pages downloaded at the same time.
+    resume : bool, default ``True``
+        Whether to resume an interrupted crawl. A completed crawl is
+        always started from scratch.
+
+    Returns
+    -------
+    sne_list : list
+        Names of the targets. Returns None if the crawl was interrupted.
     """
-    if os.path.isdir("wiserep") is False:
-        os.mkdir("wiserep")
+    spec_type, spec_directory, manifest_file, manifest, done_pages = _start_crawl(
+        spec_type, resume
+    )
+
+    # start download
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            window = _next_pages(manifest, done_pages, workers)
+            if len(window) == 0:
+                break
 
-    global spectral_types
+            pages_names = executor.map(lambda i: _fetch_page(spec_type, i), window)
+            for i, names in zip(window, pages_names):
+                if names is None:
+                    # keep the pages of the window stored before the failed one
+                    manifest["pages"] = sorted(done_pages)
+                    _save_manifest(manifest, manifest_file)
+                    print(f"Could not load the webpage: {_search_url(spec_type, i)}")
+                    print("Run again to resume the search.")
+                    return None
+                _store_page(spec_directory, manifest, done_pages, i, names)
+
+            manifest["pages"] = sorted(done_pages)
+            _save_manifest(manifest, manifest_file)
+
+    # save full list
+    return _merge_pages(spec_type, spec_directory, manifest, manifest_file)
+
+
+def sync_sn_list(spec_type, full=False, max_pages=999):
+    """Updates the list of targets of a given spectral type incrementally.
+
+    The search results are requested newest first and the paging stops
+    as soon as a target from the previous sync is found, so only the
+    targets added since then are downloaded. If the results turn out not
+    to be sorted, every page is downloaded instead (with a warning). The previous result set
+    and its high-water mark (newest Wiserep ID) are stored in
+    ``wiserep/<spec_type>/sync_state.json``.
+
+    Parameters
+    ----------
+    spec_type : int or str
+        Spectral type, e.g. ``SN Ia`` or ``3``.
+    full : bool, default ``False``
+        Whether to download every page. Removed targets can only be
+        found with a full sync. The first sync is always a full one.
+    max_pages : int, default ``999``
+        Maximum number of pages downloaded.
+
+    Returns
+    -------
+    added : list
+        Names of the new targets.
+    removed : list
+        Names of the targets that are not found anymore (only
+        with a full sync).
+    sne_list : list
+        Names of all the targets, newest first.
+
+    None is returned if a search page could not be loaded.
+    """
+    spectral_types = _load_spectral_types()
     if isinstance(spec_type, str):
         spec_type = spectral_types[spec_type]
 
-    # search url
-    url = f"https://www.wiserep.org/search?&page=0&public=all&type[]={spec_type}"
-
     spec_directory = os.path.join("wiserep", str(spec_type))
-    # create any missing directory
-    if os.path.isdir(spec_directory) is False:
-        os.mkdir(spec_directory)
+    os.makedirs(spec_directory, exist_ok=True)
+    state_file = os.path.join(spec_directory, "sync_state.json")
+    state = {"names": [], "high_water": None}
+    if os.path.isfile(state_file) is True:
+        with open(state_file, "r") as fp:
+            state.update(json.load(fp))
+    if state["high_water"] is None:
+        full = True
 
-    # start download
-    for i in range(0, 999):
-        # change page
-        page = f"page{i}"
-        if i > 0:
-            current_page = url.split("page=")[1].split("&")[0]
-            url = url.replace(f"&page={current_page}", f"&page={i}")
-
-        # get page data
-        response = get_response(url)
-        split_text = response.text.split('Click to Object page">')
-
-        # get names of the SNe
-        names = []
-        for st in split_text:
-            name = st.split("</a")[0]
-            # alternative name
-            alt_split = st.split('target="_blak">')
-            if len(alt_split) < 2:
-                alt_name = None
-            else:
-                alt_name = alt_split[1].split("</a")[0]
-
-            if len(name) > 20:
-                continue  # this is just text
-            try:
-                # this avoids some annoying lines
-                # and uses the alternative name if
-                # no IAU name is found
-                _ = float(name)
-                if alt_name is not None:
-                    if "," in alt_name:
-                        # Some SNe have 2+ alternative names
-                        alt_name = alt_name.split(",")[0]
-                    names.append(alt_name)
-            except:
-                if name.startswith("SN "):
-                    # IAU name
-                    name = name.replace("SN ", "")
-                names.append(name)
+    known_names = set(state["names"])
+    high_water = state["high_water"]
 
-        if len(names) == 0:
+    new_entries = []
+    last_id = None
+    for page in range(max_pages):
+        url = _search_url(spec_type, page, sort=newest_first)
+        response = get_response(url, use_cache=False)
+        if response is None:
+            print(f"Could not load the webpage: {url}")
+            print("The previous list was kept.")
+            return None
+        entries = _get_page_entries(response.text)
+        _index_entries(entries)
+        if len(entries) == 0:
             # no more SNe found
             break
+        new_entries += entries
 
-        # save page data
-        outfile = os.path.join("wiserep", str(spec_type), page + ".txt")
-        np.savetxt(outfile, np.array(names).T, fmt="%s")
+        if full is False:
+            # the early stop relies on the results being sorted newest first
+            page_ids = [obj_id for _, obj_id in entries if obj_id is not None]
+            if last_id is not None:
+                page_ids.insert(0, last_id)
+            if any(next_id > obj_id for obj_id, next_id in zip(page_ids, page_ids[1:])):
+                warnings.warn(
+                    "The search results are not sorted by ID (newest first): "
+                    "falling back to a full sync"
+                )
+                full = True
+                continue
+            if len(page_ids) > 0:
+                last_id = page_ids[-1]
+            reached_known = any(
+                (obj_id is not None and obj_id <= high_water) or name in known_names
+                for name, obj_id in entries
+            )
+            if reached_known is True:
+                break
 
-    # save full list
-    sne_list = []
-    files = glob.glob(os.path.join("wiserep", str(spec_type), "*"))
-    for file in files:
-        sne_page = np.genfromtxt(file, dtype=str, delimiter="\n")
-        sne_list = sne_list + list(sne_page)
+    fetched_names = [name for name, _ in new_entries]
+    added = [name for name in fetched_names if name not in known_names]
+    if full is True:
+        fetched_set = set(fetched_names)
+        removed = [name for name in state["names"] if name not in fetched_set]
+        sne_list = fetched_names
+    else:
+        removed = []
+        sne_list = added + state["names"]
+
+    ids = [obj_id for _, obj_id in new_entries if obj_id is not None]
+    if high_water is not None:
+        ids.append(high_water)
+    state = {"names": sne_list, "high_water": max(ids) if len(ids) > 0 else None}
+    _save_manifest(state, state_file)
 
     spec_type_str = [
         key for key, value in spectral_types.items() if value == spec_type
     ][0]
-    np.savetxt(
-        f'{spec_type_str.replace(" ", "")}_wiserep.txt', np.array(sne_list).T, fmt="%s"
-    )
-    print(f'{len(sne_list)} "{spec_type_str}" objects found!')
-    print(f"URL used: {url}")
+    with open(f'{spec_type_str.replace(" ", "")}_wiserep.txt', "w") as fp:
+        for name in sne_list:
+            fp.write(name + "\n")
+    print(f'{len(added)} new and {len(removed)} removed "{spec_type_str}" objects '
+          f'({len(sne_list)} in total)')
+
+    return added, removed, sne_list
+
+
+def iter_sn_list(spec_type, max_pages=999):
+    """Yields the targets of a given spectral type while the search pages
+    are downloaded, one page at a time.
+
+    Nothing is saved to disk, so the first names can be used before the
+    last pages are downloaded.
+
+    Parameters
+    ----------
+    spec_type : int or str
+        Spectral type, e.g. ``SN Ia`` or ``3``.
+    max_pages : int, default ``999``
+        Maximum number of pages downloaded.
+
+    Yields
+    ------
+    name : str
+        Name of a target.
+    """
+    spectral_types = _load_spectral_types()
+    if isinstance(spec_type, str):
+        spec_type = spectral_types[spec_type]
+
+    seen = set()
+    for page in range(max_pages):
+        names = _fetch_page(spec_type, page)
+        if names is None:
+            raise ConnectionError(
+                f"Could not load the webpage: {_search_url(spec_type, page)}"
+            )
+        if len(names) == 0:
+            # no more SNe found
+            break
+        for name in names:
+            if name not in seen:
+                seen.add(name)
+                yield name
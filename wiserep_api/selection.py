@@ -0,0 +1,179 @@
+import os
+import re
+import warnings
+from dataclasses import dataclass
+
+import pandas as pd
+
+# columns of the spectra table with the file names of each format
+file_columns = {"ascii": "Spectrum ascii File", "fits": "Spectrum fits File"}
+
+_wave_min_pattern = re.compile(r"(lambda|wave|wl).*min", re.IGNORECASE)
+_wave_max_pattern = re.compile(r"(lambda|wave|wl).*max", re.IGNORECASE)
+
+
+def _wavelength_columns(spec_table):
+    """Columns with the minimum and maximum wavelength of the spectra
+    (None if not in the table)."""
+    min_column = max_column = None
+    for column in spec_table.columns:
+        if min_column is None and _wave_min_pattern.search(str(column)):
+            min_column = column
+        elif max_column is None and _wave_max_pattern.search(str(column)):
+            max_column = column
+    return min_column, max_column
+
+
+def _matches(values, patterns):
+    """Whether the values are (case-insensitively) in the given list."""
+    patterns = {str(pattern).strip().lower() for pattern in patterns}
+    return values.fillna("").astype(str).str.strip().str.lower().isin(patterns)
+
+
+@dataclass
+class SpectraQuery:
+    """Selection of spectra according to the information of a target's
+    spectra table (see ``get_target_spectra_table``).
+
+    The selection is evaluated on the table, so the spectra can be
+    filtered before they are downloaded. Criteria left as None are
+    not applied.
+
+    Attributes
+    ----------
+    start_date: str or datetime, optional
+        Earliest observation date (``Obs-date``), e.g. ``2020-01-01``.
+    end_date: str or datetime, optional
+        Latest observation date.
+    instruments: list, optional
+        Instruments to keep (case-insensitive), e.g. ``['EFOSC2']``.
+    telescopes: list, optional
+        Telescopes to keep, e.g. ``['ESO-NTT']``.
+    groups: list, optional
+        Groups to keep, e.g. ``['ePESSTO']``.
+    reducers: list, optional
+        Reducers to keep.
+    file_type: str, optional
+        Either 'ascii' or 'fits': only spectra available in this format.
+    min_wave: float, optional
+        The spectra must cover the wavelength range down to this value.
+    max_wave: float, optional
+        The spectra must cover the wavelength range up to this value.
+        The wavelength coverage is only available if the spectra table
+        has the minimum and maximum wavelengths of the spectra.
+    one_per_night: bool, default ``False``
+        If True, only the first selected spectrum of each night
+        (from noon to noon) is kept.
+    predicate: callable, optional
+        Function that takes a row of the spectra table and returns
+        whether to keep the spectrum.
+
+    Examples
+    --------
+    >>> query = SpectraQuery(
+    ...     start_date="2020-01-05", end_date="2020-01-25",
+    ...     instruments=["EFOSC2", "SPRAT"], one_per_night=True,
+    ... )
+    >>> plan = download_target_spectra("2020xne", query=query, dry_run=True)
+    """
+
+    start_date: object = None
+    end_date: object = None
+    instruments: list = None
+    telescopes: list = None
+    groups: list = None
+    reducers: list = None
+    file_type: str = None
+    min_wave: float = None
+    max_wave: float = None
+    one_per_night: bool = False
+    predicate: object = None
+
+    def select(self, spec_table):
+        """Selects the spectra of a spectra table.
+
+        Parameters
+        ----------
+        spec_table: pandas.DataFrame
+            Table with the spectra information.
+
+        Returns
+        -------
+        selected_table: pandas.DataFrame
+            Rows of the selected spectra.
+        """
+        assert self.file_type in [None, "ascii", "fits"], "not a valide file type"
+
+        if len(spec_table) == 0:
+            return spec_table
+        mask = pd.Series(True, index=spec_table.index)
+        empty = pd.Series("", index=spec_table.index)
+
+        dates = pd.to_datetime(spec_table.get("Obs-date", empty), errors="coerce")
+        if self.start_date is not None:
+            mask &= dates >= pd.Timestamp(self.start_date)
+        if self.end_date is not None:
+            mask &= dates <= pd.Timestamp(self.end_date)
+
+        for column, values in [
+            ("Instrument", self.instruments),
+            ("Telescope", self.telescopes),
+            ("Group", self.groups),
+            ("Reducer", self.reducers),
+        ]:
+            if values is not None:
+                mask &= _matches(spec_table.get(column, empty), values)
+
+        if self.file_type is not None:
+            files = spec_table.get(file_columns[self.file_type], empty)
+            mask &= files.fillna("").astype(str).str.strip() != ""
+
+        if self.min_wave is not None or self.max_wave is not None:
+            min_column, max_column = _wavelength_columns(spec_table)
+            if min_column is None or max_column is None:
+                warnings.warn(
+                    "The spectra table has no wavelength coverage: "
+                    "'min_wave' and 'max_wave' are not applied"
+                )
+            else:
+                if self.min_wave is not None:
+                    wave_min = pd.to_numeric(spec_table[min_column], errors="coerce")
+                    mask &= wave_min <= self.min_wave
+                if self.max_wave is not None:
+                    wave_max = pd.to_numeric(spec_table[max_column], errors="coerce")
+                    mask &= wave_max >= self.max_wave
+
+        if self.predicate is not None:
+            mask &= spec_table.apply(self.predicate, axis=1).astype(bool)
+
+        if self.one_per_night is True:
+            nights = (dates - pd.Timedelta(hours=12)).dt.floor("D")
+            # spectra without date are kept
+            first_of_night = ~nights[mask].duplicated(keep="first") | nights[mask].isna()
+            mask &= first_of_night.reindex(mask.index, fill_value=False)
+
+        return spec_table[mask]
+
+
+def select_urls(urls, spec_table, file_type):
+    """Selects the URLs of the spectra in a (selected) spectra table.
+
+    Parameters
+    ----------
+    urls: list
+        URLs of the spectra.
+    spec_table: pandas.DataFrame
+        Table with the selected spectra.
+    file_type: str
+        Either 'ascii' or 'fits'.
+
+    Returns
+    -------
+    selected_urls: list
+        URLs whose file names are in the table.
+    """
+    column = file_columns[file_type]
+    if column not in spec_table.columns:
+        return []
+    basenames = set(spec_table[column].dropna().astype(str).str.strip())
+    return [url for url in urls if os.path.basename(url) in basenames]
@@ -1,43 +1,351 @@
 import os
 import glob
+import time
+import shlex
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from wiserep_api.metrics import timed_stage
 
-def create_snid_inputs(directory):
-    """Creates input files with the spectra for SNID.
 
-    Parameters
-    ----------
-    directory : str
-        Target's directory, e.g. ``spectra/2004eo``.
-    """
+def _get_spectrum_files(directory):
+    """Returns the files with spectra (as saved by the downloader) of a
+    directory."""
     # get every single file for this SN
     all_directory_files = glob.glob(os.path.join(directory, "*"))
 
     # get only the text files, excluding SNID outputs from previous runs
+    # (only the file names are checked, not their directories)
     sn_files = [
         file
         for file in all_directory_files
         if file.endswith(".fits") is False
-        and "snid" not in file
-        and "output" not in file
+        and "snid" not in os.path.basename(file)
+        and "output" not in os.path.basename(file)
     ]
 
-    # create a new file in the format that SNID likes
+    spectrum_files = []
     for file in sn_files:
+        # only the header is read
         with open(file, 'r') as f:
-            first_line = f.readlines()[0]
-            if 'wave' not in first_line or 'flux' not in first_line:
-                # this is not a spectrum
-                continue
-            
-        sn_df = pd.read_csv(file)
-        snid_df = sn_df[["wave", "flux"]]
+            first_line = f.readline()
+        if 'wave' not in first_line or 'flux' not in first_line:
+            # this is not a spectrum
+            continue
+        spectrum_files.append(file)
+
+    return spectrum_files
+
+
+def read_spectrum(spectrum_file):
+    """Reads the wavelength and flux of a spectrum saved by the downloader.
+
+    Parameters
+    ----------
+    spectrum_file : str
+        CSV file with ``wave`` and ``flux`` columns.
+
+    Returns
+    -------
+    wave: numpy.ndarray
+        Wavelength.
+    flux: numpy.ndarray
+        Flux.
+    """
+    spec_df = pd.read_csv(spectrum_file, usecols=["wave", "flux"], dtype=float)
+
+    return spec_df["wave"].to_numpy(), spec_df["flux"].to_numpy()
+
+
+def write_snid_input(outfile, wave, flux):
+    """Writes a spectrum in the format that SNID likes.
+
+    Rows with non-finite values are removed.
+
+    Parameters
+    ----------
+    outfile : str
+        SNID input file.
+    wave : array
+        Wavelength.
+    flux : array
+        Flux.
+    """
+    data = np.column_stack([wave, flux])
+    data = data[np.isfinite(data).all(axis=1)]
+    np.savetxt(outfile, data, delimiter="\t", fmt="%.10g")
+
+
+def create_snid_inputs(directory):
+    """Creates input files with the spectra for SNID.
+
+    Parameters
+    ----------
+    directory : str
+        Target's directory, e.g. ``spectra/2004eo``.
+    """
+    # create a new file in the format that SNID likes
+    for file in _get_spectrum_files(directory):
         outfile = os.path.splitext(file)[0] + ".snid"
-        snid_df.to_csv(outfile, header=False, index=False, sep="\t")
+        write_snid_input(outfile, *read_spectrum(file))
+
+
+@dataclass
+class SnidResult:
+    """Result of running SNID on a single spectrum.
+
+    Attributes
+    ----------
+    spectrum: str
+        Spectrum file.
+    output: str or None
+        SNID output file (with only the "good" fits). None if SNID failed.
+    returncode: int or None
+        Return code of SNID. None if it timed out.
+    stdout: str
+        Standard output of SNID.
+    stderr: str
+        Standard error of SNID.
+    elapsed: float
+        Time in seconds spent running SNID.
+    error: str or None
+        Description of the failure, if any.
+    matches: pandas.DataFrame or None
+        Table with the "good" fits.
+    """
+
+    spectrum: str
+    output: str = None
+    returncode: int = None
+    stdout: str = ""
+    stderr: str = ""
+    elapsed: float = 0.0
+    error: str = None
+    matches: object = None
+
+
+@timed_stage("snid_output")
+def clean_snid_output(snid_output):
+    """Keeps only the table of "good" fits in a SNID output file.
+
+    Parameters
+    ----------
+    snid_output : str
+        SNID output file. It is overwritten.
+
+    Returns
+    -------
+    output_df: pandas.DataFrame
+        Table with the "good" fits.
+    """
+    with open(snid_output) as f:
+        # only the lines up to the table header are read
+        for line in f:
+            if line.startswith("#no. sn type"):
+                break
+        else:
+            raise ValueError(f"No table of fits found in {snid_output}")
+        columns = line.split()
+        output_df = pd.read_csv(f, names=columns, sep=r"\s+")
+
+    output_df = output_df[output_df.grade == "good"]  # keep only the good fits
+    output_df.to_csv(snid_output, index=False)
+
+    return output_df
+
+
+def _run_snid_job(
+    spectrum_file, command, timeout=None, scratch_dir=None, spectrum=None
+):
+    """Runs SNID on a single spectrum in its own scratch directory.
+
+    The SNID input file is written directly into the scratch directory.
+
+    Parameters
+    ----------
+    spectrum_file : str
+        Spectrum file (as saved by the downloader).
+    command : str
+        SNID command.
+    timeout : float, optional
+        Maximum time in seconds for SNID to run.
+    scratch_dir : str, optional
+        Directory where the scratch directories are created
+        (e.g. ``/dev/shm`` to keep the inputs in memory). By default,
+        the system's temporary directory.
+    spectrum : tuple, optional
+        Wavelength and flux arrays (see ``run_snid_many``). If given,
+        ``spectrum_file`` is not read.
+
+    Returns
+    -------
+    result: SnidResult
+        Result of the job.
+    """
+    directory = os.path.dirname(spectrum_file)
+    print_file = os.path.splitext(os.path.basename(spectrum_file))[0]
+    basename = f"{print_file}.snid"
+    output_name = f"{print_file}_snid.output"
+    result = SnidResult(spectrum=spectrum_file)
+
+    job_dir = tempfile.mkdtemp(prefix="snid_", dir=scratch_dir)
+    start = time.monotonic()
+    try:
+        if spectrum is None:
+            spectrum = read_spectrum(spectrum_file)
+        write_snid_input(os.path.join(job_dir, basename), *spectrum[:2])
+        process = subprocess.run(
+            shlex.split(command) + [basename],
+            cwd=job_dir,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        result.returncode = process.returncode
+        result.stdout, result.stderr = process.stdout, process.stderr
+
+        job_output = os.path.join(job_dir, output_name)
+        if os.path.isfile(job_output) is False:
+            result.error = "no SNID output found (probably a failed fit)"
+        else:
+            snid_output = os.path.join(directory, output_name)
+            shutil.move(job_output, snid_output)
+            result.matches = clean_snid_output(snid_output)
+            result.output = snid_output
+    except subprocess.TimeoutExpired as exc:
+        result.error = f"SNID timed out after {timeout} s"
+        result.stdout = exc.stdout or ""
+        result.stderr = exc.stderr or ""
+    except Exception as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+    finally:
+        result.elapsed = time.monotonic() - start
+        shutil.rmtree(job_dir, ignore_errors=True)
 
+    return result
 
-def run_snid(directory, command=None, skip_fits=False):
+
+def _has_snid_output(spectrum_file, skip_fits=False):
+    """Whether a spectrum is skipped because it was already fitted."""
+    print_file = os.path.splitext(os.path.basename(spectrum_file))[0]
+    snid_output = os.path.join(os.path.dirname(spectrum_file), f"{print_file}_snid.output")
+    return skip_fits is True and os.path.isfile(snid_output) is True
+
+
+def _get_snid_jobs(directory, skip_fits=False):
+    """Returns the spectrum files of a directory to run SNID on."""
+    jobs = []
+    for file in _get_spectrum_files(directory):
+        if _has_snid_output(file, skip_fits) is True:
+            # skip this file that was previously fitted with SNID
+            continue
+        jobs.append(file)
+
+    return jobs
+
+
+def run_snid_many(
+    directories,
+    command=None,
+    skip_fits=False,
+    workers=None,
+    timeout=None,
+    scratch_dir=None,
+    results_db=None,
+    top_n=5,
+    spectra=None,
+):
+    """Runs SNID on multiple directories in parallel.
+
+    Each spectrum is fitted by a separate SNID process, in its own
+    scratch directory, so several fits can run at the same time.
+
+    Parameters
+    ----------
+    directories : list
+        Targets' directories, e.g. ``['spectra/2004eo', 'spectra/2011fe']``.
+    command : str, optional
+        SNID command. By default, ``snid inter=0 plot=0 aband=0`` is used.
+    skip_fits: bool, ``False``
+        Whether to skip files that were already run with SNID.
+    workers : int, optional
+        Number of SNID processes running at the same time. By default,
+        the number of CPUs.
+    timeout : float, optional
+        Maximum time in seconds for each SNID fit.
+    scratch_dir : str, optional
+        Directory where the scratch directories are created
+        (e.g. ``/dev/shm`` to keep the inputs in memory). By default,
+        the system's temporary directory.
+    results_db : str, optional
+        sqlite database where the best ``top_n`` "good" matches of each
+        spectrum are also stored (see ``store_snid_results``).
+    top_n : int, default ``5``
+        Number of matches per spectrum stored in ``results_db``.
+    spectra : dict, optional
+        Wavelength and flux arrays of spectrum files, e.g.
+        ``{'spectra/2004eo/file.dat': (wave, flux)}`` as given by
+        ``download_target_spectra``. These files are not read from disk,
+        and the ones outside ``directories`` are also fitted.
+
+    Returns
+    -------
+    results: list
+        List of ``SnidResult``, one per spectrum.
+    """
+    if command is None:
+        command = "snid inter=0 plot=0 aband=0"
+    if workers is None:
+        workers = os.cpu_count()
+
+    spectra = {os.path.normpath(file): spectrum for file, spectrum in (spectra or {}).items()}
+
+    jobs = []
+    for directory in directories:
+        jobs += _get_snid_jobs(directory, skip_fits)
+    listed = {os.path.normpath(file) for file in jobs}
+    for file in spectra:
+        if file in listed or _has_snid_output(file, skip_fits) is True:
+            continue
+        jobs.append(file)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                lambda file: _run_snid_job(
+                    file, command, timeout, scratch_dir, spectra.get(os.path.normpath(file))
+                ),
+                jobs,
+            )
+        )
+
+    for result in results:
+        if result.error is not None:
+            print_file = os.path.splitext(os.path.basename(result.spectrum))[0]
+            print(f"\nNo SNID output found for {print_file}! ({result.error})")
+
+    if results_db is not None:
+        store_snid_results(results_db, results, top_n)
+
+    return results
+
+
+def run_snid(
+    directory,
+    command=None,
+    skip_fits=False,
+    workers=1,
+    timeout=None,
+    scratch_dir=None,
+    results_db=None,
+):
     """Runs SNID on the given directory.
 
     SNID is run on all the files with spectra in the given directory.
@@ -52,51 +360,161 @@ def run_snid(directory, command=None, skip_fits=False):
         SNID command. By default, ``snid inter=0 plot=0 aband=0`` is used.
     skip_fits: bool, ``False``
         Whether to skip files that were already run with SNID.
+    workers : int, default ``1``
+        Number of SNID processes running at the same time.
+    timeout : float, optional
+        Maximum time in seconds for each SNID fit.
+    scratch_dir : str, optional
+        Directory where the scratch directories are created
+        (e.g. ``/dev/shm`` to keep the inputs in memory). By default,
+        the system's temporary directory.
+    results_db : str, optional
+        sqlite database where the best "good" matches of each spectrum
+        are also stored (see ``store_snid_results``).
+
+    Returns
+    -------
+    results: list
+        List of ``SnidResult``, one per spectrum.
     """
-    create_snid_inputs(directory)
+    return run_snid_many(
+        [directory],
+        command,
+        skip_fits,
+        workers=workers,
+        timeout=timeout,
+        scratch_dir=scratch_dir,
+        results_db=results_db,
+    )
 
-    if command is None:
-        command = "snid inter=0 plot=0 aband=0"
 
-    # get SNID input files
-    all_directory_files = glob.glob(os.path.join(directory, "*"))
-    snid_files = [file for file in all_directory_files if file.endswith(".snid")]
-
-    for file in snid_files:
-        # get output file name
-        basename = os.path.basename(file)
-        print_file = os.path.splitext(basename)[0]
-        snid_output = os.path.join(directory, f"{print_file}_snid.output")
-        
-        if skip_fits is True and os.path.isfile(snid_output) is True:
-            # skip this file that was previously fitted with SNID
-            continue
+snid_columns = [
+    "target",
+    "spectrum",
+    "rank",
+    "template",
+    "type",
+    "rlap",
+    "z",
+    "zerr",
+    "age",
+    "grade",
+]
+
+
+def _connect_results_db(results_db):
+    """Connects to the SNID results database, creating the table if needed."""
+    conn = sqlite3.connect(results_db)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS snid_matches (
+            target TEXT,
+            spectrum TEXT,
+            rank INTEGER,
+            template TEXT,
+            type TEXT,
+            rlap REAL,
+            z REAL,
+            zerr REAL,
+            age REAL,
+            grade TEXT,
+            PRIMARY KEY (target, spectrum, rank)
+        )"""
+    )
+    return conn
+
+
+def store_snid_results(results_db, results, top_n=5):
+    """Stores the best SNID matches in a consolidated sqlite table.
 
-        # go to the SN directory, run SNID and come back
-        os.chdir(directory)
-        os.system(f"{command} {basename}")
-        os.chdir("../..")
-
-        # remove temporary files
-        os.remove(file) 
-        snid_param_file = os.path.join(directory, "snid.param")
-        os.remove(snid_param_file)
-        
-        # check SNID output file
-        if os.path.isfile(snid_output) is False:
-            print(f"\nNo SNID output found for {print_file}! Probably a failed fit...")
-            
+    The target is taken from the name of the spectrum's directory.
+    Previous matches of the same spectra are replaced.
+
+    Parameters
+    ----------
+    results_db : str
+        sqlite database.
+    results : list
+        List of ``SnidResult``.
+    top_n : int, default ``5``
+        Number of matches stored per spectrum (highest ``rlap`` first).
+    """
+    rows, spectra = [], []
+    for result in results:
+        if result.matches is None:
             continue
+        target = os.path.basename(os.path.dirname(result.spectrum))
+        spectrum = os.path.splitext(os.path.basename(result.spectrum))[0]
+        spectra.append((target, spectrum))
+
+        matches = result.matches.sort_values("rlap", ascending=False).head(top_n)
+        for rank, (_, match) in enumerate(matches.iterrows(), start=1):
+            rows.append(
+                (
+                    target,
+                    spectrum,
+                    rank,
+                    match["sn"],
+                    match["type"],
+                    float(match["rlap"]),
+                    float(match["z"]),
+                    float(match["zerr"]),
+                    float(match["age"]),
+                    match["grade"],
+                )
+            )
+
+    conn = _connect_results_db(results_db)
+    with conn:
+        conn.executemany("DELETE FROM snid_matches WHERE target = ? AND spectrum = ?", spectra)
+        conn.executemany(
+            "INSERT INTO snid_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    conn.close()
+
 
-        # get SNID output and "clean" it
-        with open(snid_output) as f:
-            skiprows = 0
-            for i, line in enumerate(f.readlines()):
-                if line.startswith("#no. sn type"):
-                    break
-                skiprows += 1
-
-        # save new output
-        output_df = pd.read_csv(snid_output, skiprows=skiprows, delim_whitespace=True)
-        output_df = output_df[output_df.grade == "good"]  # keep only the good fits
-        output_df.to_csv(snid_output, index=False)
+def _query_best(results_db, partition):
+    """Best SNID match (highest ``rlap``) per group of rows."""
+    conn = _connect_results_db(results_db)
+    query = f"""
+        SELECT {", ".join(snid_columns)} FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY {partition} ORDER BY rlap DESC
+            ) AS best
+            FROM snid_matches
+        ) WHERE best = 1 ORDER BY target, spectrum
+    """
+    best_df = pd.read_sql_query(query, conn)
+    conn.close()
+    return best_df
+
+
+def best_snid_per_spectrum(results_db):
+    """Obtains the best SNID match of each spectrum.
+
+    Parameters
+    ----------
+    results_db : str
+        sqlite database with the SNID matches.
+
+    Returns
+    -------
+    best_df: pandas.DataFrame
+        Best match (highest ``rlap``) of each spectrum.
+    """
+    return _query_best(results_db, "target, spectrum")
+
+
+def best_snid_per_target(results_db):
+    """Obtains the best SNID match of each target.
+
+    Parameters
+    ----------
+    results_db : str
+        sqlite database with the SNID matches.
+
+    Returns
+    -------
+    best_df: pandas.DataFrame
+        Best match (highest ``rlap``) among all the spectra of each target.
+    """
+    return _query_best(results_db, "target")
@@ -1,8 +1,13 @@
 import os
+import csv
+import hashlib
+import warnings
+import numpy as np
 import pandas as pd
-from io import StringIO
-from astropy.io import fits
-from wiserep_api.api import get_response, get_target_response
+from wiserep_api.api import get_response, get_remote_info, download_file, map_targets
+from wiserep_api.properties import get_target_record
+from wiserep_api.metrics import timed_stage
+from wiserep_api.selection import select_urls
 
 
 def exclude_include(url, exclude=None, include=None):
@@ -47,8 +52,463 @@ def exclude_include(url, exclude=None, include=None):
     return skip
 
 
+# columns of the download plans (see ``download_target_spectra``)
+plan_columns = ["target", "file", "file_type", "url", "size", "up_to_date"]
+
+
+def _iter_lines(response, chunk_size=2**16):
+    """Iterates over the decoded lines of a streamed response."""
+    for line in response.iter_lines(chunk_size=chunk_size):
+        yield line.decode("utf-8", errors="replace")
+
+
+def _numeric_values(line, ncols=2):
+    """Returns the first ``ncols`` values of a line as floats, or None."""
+    split_line = line.split()
+    if len(split_line) < ncols:
+        return None
+    try:
+        return [float(value) for value in split_line[:ncols]]
+    except ValueError:
+        return None
+
+
+@timed_stage("ascii_spectrum")
+def _parse_block(block, ncols, dtype):
+    """Parses a block of lines into an array of ``ncols`` columns.
+
+    Lines that cannot be parsed (e.g. comments or text) are skipped.
+    Lines with only wavelength and flux get a NaN flux error.
+    """
+    try:
+        with warnings.catch_warnings():
+            # blocks with only blank lines or comments are valid
+            warnings.simplefilter("ignore", UserWarning)
+            data = np.loadtxt(
+                block, usecols=range(ncols), comments="#", dtype=dtype, ndmin=2
+            )
+        return data.reshape(-1, ncols)
+    except (ValueError, IndexError):
+        # slow path, line by line
+        rows = []
+        for line in block:
+            line = line.split("#")[0]
+            values = _numeric_values(line, ncols)
+            if values is None and ncols == 3:
+                values = _numeric_values(line, 2)
+                if values is not None:
+                    values.append(np.nan)
+            if values is not None:
+                rows.append(values)
+        return np.array(rows, dtype=dtype).reshape(-1, ncols)
+
+
+def read_ascii_spectrum(lines, dtype=np.float64, block_size=50000):
+    """Reads a spectrum from the lines of an ASCII file.
+
+    Any header (e.g. a FITS-like header starting with ``SIMPLE`` or
+    ``BITPIX``) is skipped up to the first line with two numeric values.
+    Only the first three columns are used (wavelength, flux and flux error).
+
+    Parameters
+    ----------
+    lines: iterable
+        Lines of the file. They are consumed only once, so a generator
+        over a streamed download can be used.
+    dtype: data-type, default ``numpy.float64``
+        Data type of the arrays.
+    block_size: int, default ``50000``
+        Number of lines parsed at a time.
+
+    Returns
+    -------
+    wave: numpy.ndarray
+        Wavelength.
+    flux: numpy.ndarray
+        Flux.
+    flux_err: numpy.ndarray
+        Flux error. NaN values if not included in the file.
+    """
+    lines = iter(lines)
+    # find where the data starts
+    first_line = None
+    for line in lines:
+        if line.lstrip().startswith("#"):
+            continue
+        if _numeric_values(line) is not None:
+            first_line = line
+            break
+    if first_line is None:
+        empty = np.array([], dtype=dtype)
+        return empty, empty.copy(), empty.copy()
+
+    ncols = min(len(first_line.split("#")[0].split()), 3)
+    blocks, block = [], [first_line]
+    for line in lines:
+        block.append(line)
+        if len(block) == block_size:
+            blocks.append(_parse_block(block, ncols, dtype))
+            block = []
+    if len(block) > 0:
+        blocks.append(_parse_block(block, ncols, dtype))
+    data = np.concatenate(blocks)
+
+    wave, flux = data[:, 0], data[:, 1]
+    if ncols == 3:
+        flux_err = data[:, 2]
+    else:
+        flux_err = np.full(len(wave), np.nan, dtype=dtype)
+
+    return wave, flux, flux_err
+
+
+def write_spectrum(outfile, wave, flux, flux_err):
+    """Writes a spectrum as a CSV file with ``wave``, ``flux`` and
+    ``flux_err`` columns."""
+    spec_df = pd.DataFrame({"wave": wave, "flux": flux, "flux_err": flux_err})
+    # the file is replaced (not overwritten) as it might be hard-linked
+    tmp_file = outfile + ".part"
+    spec_df.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, outfile)
+
+
+def download_ascii_spectrum(url, outfile, dtype=np.float64, verbose=False):
+    """Downloads an ASCII spectrum and saves it in a normalised CSV format.
+
+    The file is streamed and parsed on the fly, and the output is
+    written only once.
+
+    Parameters
+    ----------
+    url: str
+        URL of the spectrum.
+    outfile: str
+        Output file.
+    dtype: data-type, default ``numpy.float64``
+        Data type of the arrays.
+    verbose: bool, default 'False'
+        If 'True', print some of the extra information.
+
+    Returns
+    -------
+    spectrum: tuple
+        Wavelength, flux and flux error arrays. Returns None if the
+        file could not be downloaded or has no data (e.g. an error page).
+    """
+    response = get_response(url, verbose, use_cache=False, stream=True)
+    if response is None:
+        return None
+
+    with response:
+        spectrum = read_ascii_spectrum(_iter_lines(response), dtype=dtype)
+    if len(spectrum[0]) == 0:
+        if verbose is True:
+            print("No data found in the file", url)
+        return None
+    write_spectrum(outfile, *spectrum)
+
+    return spectrum
+
+
+def open_fits_spectrum(fits_file):
+    """Opens a downloaded FITS spectrum.
+
+    The file is memory-mapped, so the data of each HDU is only
+    read from disk when accessed.
+
+    Parameters
+    ----------
+    fits_file: str
+        Path of the FITS file, e.g. ``spectra/2004eo/file.fits``.
+
+    Returns
+    -------
+    hdul: astropy.io.fits.HDUList
+        List of HDUs.
+    """
+    from astropy.io import fits
+
+    return fits.open(fits_file, memmap=True, lazy_load_hdus=True)
+
+
+manifest_columns = ["file", "url", "size", "sha256", "etag", "remote_size"]
+
+
+def _load_download_manifest(obj_dir):
+    """Loads the manifest with the files downloaded for a target."""
+    manifest_file = os.path.join(obj_dir, "download_manifest.csv")
+    if os.path.isfile(manifest_file) is False:
+        return {}
+
+    manifest = {}
+    with open(manifest_file, "r", newline="") as fp:
+        for row in csv.DictReader(fp):
+            for key in ["size", "remote_size"]:
+                row[key] = int(row[key]) if row[key] != "" else None
+            row["etag"] = row["etag"] if row["etag"] != "" else None
+            manifest[row.pop("file")] = row
+    return manifest
+
+
+def _save_download_manifest(manifest, obj_dir):
+    """Saves the manifest with the files downloaded for a target."""
+    manifest_file = os.path.join(obj_dir, "download_manifest.csv")
+    tmp_file = manifest_file + ".part"
+    with open(tmp_file, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=manifest_columns)
+        writer.writeheader()
+        for basename, entry in manifest.items():
+            writer.writerow({"file": basename, **entry})
+    os.replace(tmp_file, manifest_file)
+
+
+def _file_sha256(path):
+    """SHA-256 checksum of a file."""
+    checksum = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(2**16), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _is_up_to_date(entry, outfile, remote_info):
+    """Whether a previously downloaded file is still valid."""
+    if entry is None or remote_info is None or os.path.isfile(outfile) is False:
+        return False
+    if os.path.getsize(outfile) != entry["size"]:
+        return False
+    if remote_info["etag"] is not None or entry["etag"] is not None:
+        return remote_info["etag"] == entry["etag"]
+    # fall back to the size of the remote file
+    return remote_info["size"] is not None and remote_info["size"] == entry["remote_size"]
+
+
+def _link_duplicate(outfile, sha256, manifest):
+    """Replaces a file by a hard link to an identical file, if any."""
+    obj_dir = os.path.dirname(outfile)
+    basename = os.path.basename(outfile)
+    for other_basename, entry in manifest.items():
+        other_file = os.path.join(obj_dir, other_basename)
+        if other_basename == basename or entry["sha256"] != sha256:
+            continue
+        if os.path.isfile(other_file) is False or os.path.samefile(other_file, outfile):
+            continue
+        tmp_file = outfile + ".link"
+        try:
+            os.link(other_file, tmp_file)
+        except OSError:
+            # hard links not supported
+            return
+        os.replace(tmp_file, outfile)
+        return
+
+
+def _fetch_spectrum(
+    url, outfile, file_kind, manifest, skip_existing=False, verbose=False, spectra=None
+):
+    """Downloads a spectrum (ASCII or FITS), unless it is up to date.
+
+    Parameters
+    ----------
+    url: str
+        URL of the spectrum (without scheme).
+    outfile: str
+        Output file.
+    file_kind: str
+        Either 'ascii' or 'fits'.
+    manifest: dict
+        Manifest of the target's downloads. It is updated in place.
+    skip_existing: bool, default 'False'
+        Whether to skip the file if it was already downloaded and has not
+        changed in Wiserep (according to its ``ETag`` or size).
+    verbose: bool, default 'False'
+        If 'True', print some of the extra information.
+    spectra: dict, optional
+        Where the wavelength and flux arrays of a downloaded ASCII
+        spectrum are added, keyed by ``outfile``.
+
+    Returns
+    -------
+    available: bool
+        Whether the file is available in ``outfile``.
+    """
+    basename = os.path.basename(outfile)
+    remote_info = None
+    if skip_existing is True:
+        remote_info = get_remote_info("http://" + url, verbose)
+        if _is_up_to_date(manifest.get(basename), outfile, remote_info) is True:
+            if verbose is True:
+                print(f"Already downloaded: {basename}")
+            return True
+
+    if file_kind == "ascii":
+        downloaded = download_ascii_spectrum("http://" + url, outfile, verbose=verbose)
+    else:
+        downloaded = download_file("http://" + url, outfile, verbose=verbose)
+    if downloaded is None:
+        return False
+    if file_kind == "ascii" and spectra is not None:
+        spectra[outfile] = downloaded[:2]
+
+    sha256 = _file_sha256(outfile)
+    _link_duplicate(outfile, sha256, manifest)
+    if remote_info is None:
+        remote_info = {"etag": None, "size": None}
+    manifest[basename] = {
+        "url": url,
+        "size": os.path.getsize(outfile),
+        "sha256": sha256,
+        "etag": remote_info["etag"],
+        "remote_size": remote_info["size"],
+    }
+    return True
+
+
+def _filter_urls(urls, exclude=None, include=None, verbose=False):
+    """Selects the URLs according to the ``exclude``/``include`` patterns."""
+    selected_urls = []
+    for url in urls:
+        skip = exclude_include(url, exclude, include)
+        if skip is True:
+            if verbose is True:
+                print(f"Skipping {url}")
+            continue
+        selected_urls.append(url)
+    return selected_urls
+
+
+def _save_spectra_info(obj_dir, manifest, spec_table, ascii_files=None, fits_files=None):
+    """Saves the manifest and the information of the downloaded spectra.
+
+    Parameters
+    ----------
+    obj_dir: str
+        Directory of the target's spectra.
+    manifest: dict
+        Manifest of the target's downloads.
+    spec_table: pandas.DataFrame
+        Table with the spectra information.
+    ascii_files: list, optional
+        Downloaded ASCII files (None if they were not requested).
+    fits_files: list, optional
+        Downloaded FITS files (None if they were not requested).
+
+    Returns
+    -------
+    downloaded_files: list
+        Names of the downloaded files.
+    """
+    if ascii_files is not None:
+        # update table with the extracted files online
+        spec_table = spec_table[spec_table['Spectrum ascii File'].isin(ascii_files)]
+    elif fits_files is not None:
+        # The fits files are not always available, so only update the table
+        # according to these if the ascii files were not downloaded
+        spec_table = spec_table[spec_table['Spectrum fits File'].isin(fits_files)]
+
+    # save spectra information
+    # if the directory does not exist, it means that no spectrum was
+    # downloaded
+    if os.path.isdir(obj_dir) is True:
+        _save_download_manifest(manifest, obj_dir)
+        spec_file = os.path.join(obj_dir, 'downloaded_spectra_info.csv') 
+        # remove crap | sort_index is to avoid warning
+        spec_table = spec_table.drop(columns=['Select']) 
+        spec_table.to_csv(spec_file, index=False)
+
+    downloaded_files = (ascii_files or []) + (fits_files or [])
+    return downloaded_files
+
+
+def _plan_downloads(iau_name, urls, obj_dir, manifest, skip_existing=False, verbose=False):
+    """Lists the spectra that would be downloaded, with their sizes.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target.
+    urls: dict
+        Selected URLs (without scheme) of each file type.
+    obj_dir: str
+        Directory of the target's spectra.
+    manifest: dict
+        Manifest of the target's downloads.
+    skip_existing: bool, default 'False'
+        Whether the files that are up to date would be skipped.
+    verbose: bool, default 'False'
+        Whether to print the errors.
+
+    Returns
+    -------
+    plan: pandas.DataFrame
+        ``target``, ``file``, ``file_type``, ``url``, remote ``size``
+        in bytes (None if unknown) and whether the file would be
+        skipped as ``up_to_date``.
+    """
+    plan = []
+    for file_kind, kind_urls in urls.items():
+        for url in kind_urls:
+            basename = os.path.basename(url)
+            remote_info = get_remote_info("http://" + url, verbose)
+            up_to_date = skip_existing is True and _is_up_to_date(
+                manifest.get(basename), os.path.join(obj_dir, basename), remote_info
+            )
+            plan.append(
+                {
+                    "target": iau_name,
+                    "file": basename,
+                    "file_type": file_kind,
+                    "url": url,
+                    "size": None if remote_info is None else remote_info["size"],
+                    "up_to_date": up_to_date,
+                }
+            )
+    return pd.DataFrame(plan, columns=plan_columns)
+
+
+def get_target_spectra_table(iau_name, verbose=False):
+    """Obtains the table with the target's spectra information,
+    without downloading the spectra.
+
+    Parameters
+    ----------
+    iau_name: str
+        IAU name of the target (e.g. 2020xne).
+    verbose: bool, default 'False'
+        If True, print some of the intermediate information
+
+    Returns
+    -------
+    spec_table: pandas.DataFrame
+        Spec. ID, observation date, telescope, instrument, group,
+        reducer and file names of the spectra (empty if the target has
+        no spectra). Returns None if the webpage could not be loaded.
+    """
+    record = get_target_record(iau_name, verbose)
+    if record is None:
+        print(f"Could not load the webpage of {iau_name}")
+        return None
+
+    try:
+        return record.spectra_table
+    except ValueError:
+        if verbose is True:
+            print(f"No spectra found for {iau_name}")
+        return pd.DataFrame()
+
+
 def download_target_spectra(
-    iau_name, file_type=None, exclude=None, include=None, verbose=False
+    iau_name,
+    file_type=None,
+    exclude=None,
+    include=None,
+    skip_existing=False,
+    verbose=False,
+    record=None,
+    spectra_dir="spectra",
+    query=None,
+    dry_run=False,
+    spectra=None,
 ):
     """Downloads the target's spectra from Wiserep.
 
@@ -65,151 +525,181 @@ def download_target_spectra(
     include: list, default 'None'
         Files with the given string patterns are inxcluded.
         Cannot be given together with 'exclude'.
+    skip_existing: bool, default 'False'
+        If 'True', files that were already downloaded are skipped, unless
+        they changed in Wiserep (according to their ``ETag`` or size).
+        The downloads are recorded in ``download_manifest.csv`` (with
+        their SHA-256 checksums) and identical files are stored only
+        once, through hard links.
     verbose: bool, default 'False'
         If 'True', print some of the extra information.
+    record: TargetRecord, optional
+        The target's parsed webpage (see ``get_target_record``). If given,
+        the webpage is not downloaded again.
+    spectra_dir: str, default ``spectra``
+        Directory where the spectra are saved, under a directory
+        for each target.
+    query: SpectraQuery, optional
+        Selection of the spectra according to the spectra table (dates,
+        instruments, etc.), applied before any file is downloaded.
+        Its ``file_type`` is used if ``file_type`` is not given.
+    dry_run: bool, default 'False'
+        If 'True', nothing is downloaded and the plan is returned instead.
+    spectra: dict, optional
+        If given, the wavelength and flux arrays of the ASCII spectra
+        downloaded by this call are added to it, keyed by file path,
+        so they can be used without reading the files again (see
+        ``run_snid_many``).
 
     Returns
     -------
-    target_class: str
-        The target's classification. Returns 'Unknown' if not found.
+    downloaded_files: list
+        Names of the downloaded (or already present) files. Returns
+        None if the target's webpage could not be loaded. With
+        ``dry_run=True``, a table with the files that would be
+        downloaded and their ``size`` in bytes (see ``plan_columns``).
     """
-    if os.path.isdir("spectra") is False:
-        os.mkdir("spectra")
-
+    if query is not None and file_type is None:
+        file_type = query.file_type
     assert file_type in [None, "ascii", "fits"], "not a valide file type"
 
-    # target's url
-    response = get_target_response(iau_name, verbose)
-
-    # search for spectra URLs
-    # ASCII
-    txt_urls = []
-    split_text = response.text.split("asciifile=https%3A//")
-    for st in split_text:
-        url = st.split('"')[0]
-        if (url not in txt_urls) and ("&amp" not in url) and ("DOCTYPE" not in url):
-            txt_urls.append(url)
+    # target's webpage
+    if record is None:
+        record = get_target_record(iau_name, verbose)
+    if record is None:
+        print(f"Could not load the webpage of {iau_name}")
+        return None
+
+    # spectra URLs
+    txt_urls = record.ascii_urls
     if verbose is True:
         print(f"Found {len(txt_urls)} URLs with spectra (ASCII): {txt_urls}")
-        
-    # FITS
-    fits_urls = []
-    split_text = response.text.split("https://")
-    for st in split_text:
-        url = st.split('"')[0]
-        if (url not in fits_urls) and (".fits" in url) and ("rel-file" not in url):
-            fits_urls.append(url)
+    fits_urls = record.fits_urls
     if verbose is True:
         print(f"Found {len(fits_urls)} URLs with spectra (FITS): {fits_urls}")
 
-    # retrieve table with spectra information
-    spec_table = pd.read_html(StringIO(response.text), match='Spec. ID')[0]
-    if isinstance(spec_table['Spec. ID'], pd.core.frame.DataFrame) is True:
-        # from multi-index to the usual dataframe
-        spec_dict = {col[0]:None for col in spec_table.columns}
-
-        for col in spec_dict.keys():
-            series = spec_table[col].copy()
-            for sub_col in spec_table[col].columns:
-                series = series[sub_col]
-            spec_dict[col] = series.values
-
-        spec_table = pd.DataFrame(spec_dict)
-        # remove extra columns
-        columns = [col for col in spec_table.columns if 'Unnamed' not in col]
-        spec_table = spec_table[columns]
-    
+    # table with spectra information
+    spec_table = record.spectra_table
+
+    if query is not None:
+        spec_table = query.select(spec_table)
+        txt_urls = select_urls(txt_urls, spec_table, "ascii")
+        fits_urls = select_urls(fits_urls, spec_table, "fits")
+        if verbose is True:
+            print(f"Selected {len(spec_table)} spectra")
+    txt_urls = _filter_urls(txt_urls, exclude, include, verbose)
+    fits_urls = _filter_urls(fits_urls, exclude, include, verbose)
+
+    obj_dir = os.path.join(spectra_dir, iau_name)
+    manifest = _load_download_manifest(obj_dir)
+
+    if dry_run is True:
+        urls = {}
+        if file_type == "ascii" or file_type is None:
+            urls["ascii"] = txt_urls
+        if file_type == "fits" or file_type is None:
+            urls["fits"] = fits_urls
+        return _plan_downloads(iau_name, urls, obj_dir, manifest, skip_existing, verbose)
+
+    os.makedirs(spectra_dir, exist_ok=True)
+
     # download ASCII spectra
+    ascii_files = None
     if file_type == "ascii" or file_type is None:
         ascii_files = []
         for url in txt_urls:
-            # skip filesspec_df = spec_df[::2]  # every other row is just crap
-
-            skip = exclude_include(url, exclude, include)
-            if skip is True:
-                if verbose is True:
-                    print(f"Skipping {url}")
-                continue
-
-            # check url
-            response = get_response("http://" + url)
-            if response is None:
-                print(f"Nothing found in {url}")
-
             # get spectrum
             basename = os.path.basename(url)
-            obj_dir = os.path.join("spectra", iau_name)
-            if os.path.isdir(obj_dir) is False:
-                os.mkdir(obj_dir)
+            os.makedirs(obj_dir, exist_ok=True)
             outfile = os.path.join(obj_dir, basename)
 
-            with open(outfile, "w") as file:
-                file.write(response.text)
-
-            if response.text.startswith("BITPIX") or response.text.startswith("SIMPLE"):
-                # file includes header
-                for i, line in enumerate(response.text.split("\n")):
-                    split_line = line.split()
-                    try:
-                        _ = float(split_line[0])
-                        _ = float(split_line[1])
-                        skiprows = i
-                        break
-                    except:
-                        continue
-            else:
-                skiprows = None
-            spec_df = pd.read_csv(
-                outfile,
-                sep='\s+',
-                names=["wave", "flux", "flux_err"],
-                comment="#",
-                skiprows=skiprows,
+            available = _fetch_spectrum(
+                url, outfile, "ascii", manifest, skip_existing, verbose, spectra
             )
-            spec_df.to_csv(outfile, index=False)
+            if available is False:
+                print(f"Nothing found in {url}")
+                continue
 
             ascii_files.append(basename)
-        # update table with the extracted files online
-        spec_table = spec_table[spec_table['Spectrum ascii File'].isin(ascii_files)]
 
     # download FITS spectra
+    fits_files = None
     if file_type == "fits" or file_type is None:
         fits_files = []
         for url in fits_urls:
-            # skip files
-            skip = exclude_include(url, exclude, include)
-            if skip is True:
-                if verbose is True:
-                    print(f"Skipping {url}")
-                continue
-
             # download file
-            print(url)
-            hdu = fits.open("http://" + url)
-
+            if verbose is True:
+                print(url)
             basename = os.path.basename(url)
-            obj_dir = os.path.join("spectra", iau_name)
-            if os.path.isdir(obj_dir) is False:
-                os.mkdir(obj_dir)
+            os.makedirs(obj_dir, exist_ok=True)
             outfile = os.path.join(obj_dir, basename)
-            if os.path.isfile(outfile) is True:
-                overwrite = True
-            else:
-                overwrite = False
 
-            hdu.writeto(outfile, overwrite=overwrite, output_verify="ignore")
+            available = _fetch_spectrum(
+                url, outfile, "fits", manifest, skip_existing, verbose
+            )
+            if available is False:
+                print(f"Nothing found in {url}")
+                continue
 
             fits_files.append(basename)
-        # The fits files are not always available, so only update the table
-        # according to these if the ascii files were not downloaded
-        if 'ascii_files' not in locals():
-            spec_table = spec_table[spec_table['Spectrum fits File'].isin(fits_files)]
 
-    # save spectra information
-    # if 'obj_dir' variable is not defined, it means that no spectrum was
-    # downloaded
-    if 'obj_dir' in locals():
-        spec_file = os.path.join(obj_dir, 'downloaded_spectra_info.csv') 
-        # remove crap | sort_index is to avoid warning
-        spec_table = spec_table.drop(columns=['Select'], axis=1) 
-        spec_table.to_csv(spec_file, index=False)
+    return _save_spectra_info(obj_dir, manifest, spec_table, ascii_files, fits_files)
+
+
+def download_many_target_spectra(iau_names, workers=4, **kwargs):
+    """Downloads the spectra of multiple targets from Wiserep in parallel.
+
+    The targets are processed by a bounded pool of threads. The number
+    of simultaneous connections to Wiserep is further limited by the
+    shared client (see ``WiserepClient``).
+
+    Parameters
+    ----------
+    iau_names: list
+        IAU names of the targets (e.g. ['2020xne', '2004eo']).
+    workers: int, default ``4``
+        Number of targets processed at the same time.
+    **kwargs:
+        Extra arguments passed to ``download_target_spectra``
+        (e.g. ``file_type='ascii'``).
+
+    Returns
+    -------
+    results: pandas.DataFrame
+        Table with the ``status`` (``ok``, ``not found`` or ``failed``),
+        number of downloaded files, error message and elapsed time
+        for each target. With ``dry_run=True``, the plans of all the
+        targets in a single table instead.
+    """
+    results = []
+    plans = []
+    for name, output, error, elapsed in map_targets(
+        download_target_spectra, iau_names, workers, **kwargs
+    ):
+        if error is not None:
+            status, n_files = "failed", 0
+        elif output is None:
+            status, n_files = "not found", 0
+        else:
+            status, n_files = "ok", len(output)
+            if kwargs.get("dry_run") is True and len(output) > 0:
+                plans.append(output)
+        results.append(
+            {
+                "target": name,
+                "status": status,
+                "n_files": n_files,
+                "error": error,
+                "elapsed": elapsed,
+            }
+        )
+
+    if kwargs.get("dry_run") is True:
+        if len(plans) == 0:
+            return pd.DataFrame(columns=plan_columns)
+        return pd.concat(plans, ignore_index=True)
+
+    results_df = pd.DataFrame(
+        results, columns=["target", "status", "n_files", "error", "elapsed"]
+    )
+    return results_df